@@ -0,0 +1,333 @@
+"""
+Benchmarks the ingestion and output hot paths on synthetic Alpaca pages of 10, 1,000
+and 10,000 symbols and saves the results for comparison with later runs.
+
+    python -m benchmarks.bench_hot_paths --output benchmarks/results/before.json
+    python -m benchmarks.bench_hot_paths --compare benchmarks/results/before.json
+
+Each case is timed as the best of --repeat runs and then run once more under
+tracemalloc for its peak memory. tracemalloc sees the Python objects and numpy arrays,
+but not the buffers arrow allocates in its own memory pool.
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer, decode_bars_page
+from data_gathering.models.symbol_registry import SymbolRegistry
+from data_gathering.models.symbols import Symbol
+from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+from data_gathering.utils.output_utils.historical_data.historical_data_output_utils import (
+    HistoricalDataOutputUtils as hdou,
+)
+from data_gathering.utils.output_utils.historical_data.historical_json_exporter import (
+    HistoricalJSONExporter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_parquet_writer import (
+    HistoricalParquetWriter,
+)
+
+from .payloads import bars_page, symbol_names
+
+SIZES = (10, 1_000, 10_000)
+
+# a case prepares its input once per size and returns a function that runs the hot
+# path on it once, and the number of items (bars or symbols) that run handles
+Case = Callable[[int, int, str], Tuple[Callable[[], Any], int]]
+
+
+@functools.lru_cache(maxsize=None)
+def page(symbols: int, bars: int) -> bytes:
+    # building the payload takes longer than most cases, so each size is built once
+    return bars_page(symbols, bars)
+
+
+def decoded_buffer(symbols: int, bars: int) -> BarBuffer:
+    buffer = BarBuffer()
+    buffer.extend(decode_bars_page(page(symbols, bars))["bars"])
+    return buffer
+
+
+def decode_case(symbols: int, bars: int, work_dir: str):
+    # replaces rename_columns/format_data: a page is decoded straight into columns
+    body = page(symbols, bars)
+
+    def run():
+        BarBuffer().extend(decode_bars_page(body)["bars"])
+
+    return run, symbols * bars
+
+
+def to_arrow_case(symbols: int, bars: int, work_dir: str):
+    buffer = decoded_buffer(symbols, bars)
+    return buffer.to_arrow, symbols * bars
+
+
+def combine_dataframes_case(symbols: int, bars: int, work_dir: str):
+    buffer = decoded_buffer(symbols, bars)
+    return lambda: hdou.combine_dataframes(buffer), symbols * bars
+
+
+def parquet_write_case(symbols: int, bars: int, work_dir: str):
+    table = decoded_buffer(symbols, bars).to_arrow()
+    path = os.path.join(work_dir, "bars.parquet")
+
+    def run():
+        writer = HistoricalParquetWriter(path)
+        writer.write(table)
+        writer.close()
+
+    return run, symbols * bars
+
+
+def json_export_case(symbols: int, bars: int, work_dir: str):
+    source = os.path.join(work_dir, "export.parquet")
+    writer = HistoricalParquetWriter(source)
+    writer.write(decoded_buffer(symbols, bars).to_arrow())
+    writer.close()
+    exporter = HistoricalJSONExporter(os.path.join(work_dir, "bars.ndjson"))
+    return lambda: exporter.export(source), symbols * bars
+
+
+def blacklist_lookup_case(symbols: int, bars: int, work_dir: str):
+    names = symbol_names(symbols)
+    # every other symbol is blacklisted and already written to the database
+    cache = BlacklistSymbolCache(cache_dir=os.path.join(work_dir, f"cache{symbols}"))
+    for name in names[::2]:
+        cache.add_symbol(name)
+    cache.flush()
+
+    def run():
+        for name in names:
+            cache.is_blacklisted(name)
+
+    return run, symbols
+
+
+def blacklist_filter_case(symbols: int, bars: int, work_dir: str):
+    names = symbol_names(symbols)
+    cache = BlacklistSymbolCache(cache_dir=os.path.join(work_dir, f"cache{symbols}"))
+    for name in names[::2]:
+        cache.add_symbol(name)
+    cache.flush()
+    return lambda: cache.filter_blacklisted_symbols(names), symbols
+
+
+def calendar_symbols(symbols: int) -> List[str]:
+    # the calendar lists a symbol for every report, one in four is international
+    names = symbol_names(symbols)
+    return [
+        f"{name}.TO" if index % 4 == 3 else name for index, name in enumerate(names)
+    ]
+
+
+def symbol_create_case(symbols: int, bars: int, work_dir: str):
+    names = calendar_symbols(symbols) * 2
+
+    def run():
+        for name in names:
+            Symbol.create(name)
+
+    return run, len(names)
+
+
+def registry_symbol_case(symbols: int, bars: int, work_dir: str):
+    # the calendar and the bar pages look up symbols the registry already holds, so
+    # this is the lookup of a warm registry; registry_register is the first call
+    names = calendar_symbols(symbols) * 2
+    registry = SymbolRegistry()
+    for name in names:
+        registry.symbol(name)
+
+    def run():
+        for name in names:
+            registry.symbol(name)
+
+    return run, len(names)
+
+
+def registry_register_case(symbols: int, bars: int, work_dir: str):
+    # the first call for a string does what Symbol.create does and also assigns the
+    # ID, so it is expected to be slower than symbol_create
+    names = calendar_symbols(symbols)
+
+    def run():
+        registry = SymbolRegistry()
+        for name in names:
+            registry.symbol(name)
+
+    return run, len(names)
+
+
+CASES: Dict[str, Case] = {
+    "decode": decode_case,
+    "to_arrow": to_arrow_case,
+    "combine_dataframes": combine_dataframes_case,
+    "parquet_write": parquet_write_case,
+    "json_export": json_export_case,
+    "blacklist_lookup": blacklist_lookup_case,
+    "blacklist_filter": blacklist_filter_case,
+    "symbol_create": symbol_create_case,
+    "registry_symbol": registry_symbol_case,
+    "registry_register": registry_register_case,
+}
+
+
+def measure(run: Callable[[], Any], items: int, repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def run_cases(
+    cases: List[str], sizes: List[int], bars: int, repeat: int
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Returns the measurements of every case by case name and symbol count.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in cases:
+            results[name] = {}
+            for symbols in sizes:
+                run, items = CASES[name](symbols, bars, work_dir)
+                results[name][str(symbols)] = measure(run, items, repeat)
+                print_result(name, symbols, results[name][str(symbols)])
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    # what the numbers depend on besides the code
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def print_result(name: str, symbols: int, result: Dict[str, float]):
+    print(
+        f"{name:<20} {symbols:>6} symbols {result['seconds'] * 1000:10.2f} ms "
+        f"{result['items_per_second']:14,.0f} items/s "
+        f"{result['peak_bytes'] / 1024**2:9.1f} MiB peak"
+    )
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    threshold: float,
+) -> List[str]:
+    """
+    Prints the speedup of every case and size measured in both runs.
+
+    Returns:
+        List[str]: The cases and sizes that got slower by more than threshold.
+    """
+    regressions = []
+    print(f"\n{'case':<20} {'symbols':>6} {'speedup':>9} {'peak memory':>12}")
+    for name, sizes in results.items():
+        for symbols, result in sizes.items():
+            if (before := baseline.get(name, {}).get(symbols)) is None:
+                continue
+            speedup = before["seconds"] / result["seconds"]
+            memory = result["peak_bytes"] / max(before["peak_bytes"], 1)
+            flag = ""
+            if speedup < 1 / (1 + threshold):
+                flag = "  regression"
+                regressions.append(f"{name}/{symbols}")
+            print(f"{name:<20} {symbols:>6} {speedup:8.2f}x {memory:11.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=" ".join(__doc__.split("\n\n")[0].split())
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--bars", type=int, default=20, help="bars per symbol")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="results of an earlier run to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown against --compare reported as a regression",
+    )
+    args = parser.parse_args()
+
+    results = run_cases(args.cases, args.sizes, args.bars, args.repeat)
+
+    if args.output:
+        if directory := os.path.dirname(args.output):
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "settings": {"bars": args.bars, "repeat": args.repeat},
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline["settings"]["bars"] != args.bars:
+            print("warning: the baseline used a different number of bars per symbol")
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares decoding pages of bars into a BarBuffer with every installed JSON decoder
+against the previous path of json.loads into a dict per bar.
+
+    python -m benchmarks.bench_json_decoding --symbols 50 --bars 250
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer
+from data_gathering.utils.json_decoding import available_decoders, get_decoder
+
+from .payloads import bars_page
+
+
+def dict_path(body: bytes, bars: BarBuffer):
+    # json.loads into a dict per bar, then copied column by column
+    for symbol, symbol_bars in json.loads(body)["bars"].items():
+        bars.append(symbol, symbol_bars)
+
+
+def decoder_path(name: str) -> Callable[[bytes, BarBuffer], None]:
+    decoder = get_decoder(name)
+
+    def decode(body: bytes, bars: BarBuffer):
+        bars.append_page(decoder.decode_bars(body)["bars"])
+
+    return decode
+
+
+def best_time(path, body: bytes, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        bars = BarBuffer()
+        start = time.perf_counter()
+        path(body, bars)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(symbols: int, bars: int, repeat: int) -> Dict[str, float]:
+    """
+    Returns the best time in seconds of each path for one page.
+    """
+    body = bars_page(symbols, bars)
+    paths = {"json dicts (previous)": dict_path}
+    for name in available_decoders():
+        paths[f"{name} columns"] = decoder_path(name)
+    return {name: best_time(path, body, repeat) for name, path in paths.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=250, help="bars per symbol")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = args.symbols * args.bars
+    results = run(args.symbols, args.bars, args.repeat)
+    baseline = results["json dicts (previous)"]
+    print(f"{rows} bars per page, best of {args.repeat}")
+    for name, seconds in results.items():
+        print(
+            f"{name:<24} {seconds * 1000:8.2f} ms {rows / seconds:12,.0f} bars/s "
+            f"{baseline / seconds:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
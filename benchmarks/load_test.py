@@ -0,0 +1,201 @@
+"""
+Runs the whole fetch_all_data pipeline against the local mock server and reports the
+throughput and request latencies, so changes to concurrency, batching or rate
+limiting can be measured offline.
+
+    python -m benchmarks.load_test --universe 2000 --hist-workers 4 --batch-size 100
+
+Every run starts with empty caches in a temporary directory.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import aiohttp
+import numpy as np
+import pyarrow.parquet as pq
+
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.data.gather_all_data import DataFetcher
+
+from .mock_server import MockAPIServer, add_server_arguments, server_from_arguments
+
+
+def latency_trace(latencies: Dict[str, List[float]]) -> aiohttp.TraceConfig:
+    """
+    Returns request hooks that record the seconds of every request by endpoint.
+    """
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        endpoint = params.url.path.rsplit("/", 1)[-1]
+        latencies[endpoint].append(time.perf_counter() - context.start)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    p50, p99 = np.percentile(seconds, [50, 99])
+    return {
+        "requests": len(seconds),
+        "p50_ms": p50 * 1000,
+        "p99_ms": p99 * 1000,
+        "max_ms": max(seconds) * 1000,
+    }
+
+
+async def run_load_test(
+    server: MockAPIServer, work_dir: str, **config: Any
+) -> Dict[str, Any]:
+    """
+    Fetches the upcoming earnings of the mock server's universe with a DataFetcher.
+
+    Args:
+        server (MockAPIServer): The server, it is started and closed here.
+        work_dir (str): The directory of the caches and the output.
+        **config: PipelineConfig settings of the run.
+
+    Returns:
+        Dict[str, Any]: The throughput, the responses by endpoint and status, and the
+            latency percentiles by endpoint.
+    """
+    api_keys = APIKeys(
+        fmp_api_key="mock",
+        finnhub_api_key=None,
+        alpha_vantage_api_key=None,
+        apca_key_id="mock",
+        apca_api_secret_key="mock",
+    )
+    latencies = defaultdict(list)
+
+    async with server:
+        data_fetcher = DataFetcher(
+            PipelineConfig(
+                **{
+                    "alpaca_base_url": server.alpaca_base_url,
+                    "fmp_base_url": server.fmp_base_url,
+                    "fmp_bulk_base_url": server.fmp_bulk_base_url,
+                    "fundamentals_path": os.path.join(work_dir, "fundamentals"),
+                    "estimates_path": os.path.join(work_dir, "analyst_estimates"),
+                    "features_path": os.path.join(work_dir, "features.parquet"),
+                    "cache_dir": os.path.join(work_dir, "cache"),
+                    "hist_parquet_path": os.path.join(work_dir, "bars.parquet"),
+                    "hist_incremental": False,
+                    **config,
+                }
+            ),
+            api_keys,
+        )
+        # the sessions are created on the first request and pick the hooks up
+        data_fetcher.http.trace_configs = [latency_trace(latencies)]
+
+        start = time.perf_counter()
+        await data_fetcher.fetch_all_data()
+        seconds = time.perf_counter() - start
+
+    parquet_path = data_fetcher.config.hist_parquet_path
+    bars = (
+        pq.read_metadata(parquet_path).num_rows if os.path.exists(parquet_path) else 0
+    )
+    symbols = len(server.requested_symbols)
+    return {
+        "seconds": seconds,
+        "symbols": symbols,
+        "symbols_per_second": symbols / seconds,
+        "bars": bars,
+        "bars_per_second": bars / seconds,
+        # symbols without bars, or whose request failed, end up on the blacklist
+        "blacklisted": sum(
+            data_fetcher.cache.is_blacklisted(symbol)
+            for symbol in server.requested_symbols
+        ),
+        "responses": {
+            f"{endpoint} {status}": count
+            for (endpoint, status), count in sorted(server.requests.items())
+        },
+        "latency": {
+            endpoint: latency_summary(seconds)
+            for endpoint, seconds in sorted(latencies.items())
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"{report['symbols']} symbols in {report['seconds']:.2f}s: "
+        f"{report['symbols_per_second']:,.1f} symbols/s, "
+        f"{report['bars_per_second']:,.0f} bars/s, "
+        f"{report['blacklisted']} blacklisted"
+    )
+    for response, count in report["responses"].items():
+        print(f"  {response:<24} {count:>8}")
+    for endpoint, latency in report["latency"].items():
+        print(
+            f"  {endpoint:<24} p50 {latency['p50_ms']:8.1f} ms "
+            f"p99 {latency['p99_ms']:8.1f} ms max {latency['max_ms']:8.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_server_arguments(parser)
+    parser.add_argument("--hist-workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--alpaca-concurrency", type=int, default=4)
+    parser.add_argument("--fmp-concurrency", type=int, default=4)
+    parser.add_argument("--transform-executor", default="auto")
+    parser.add_argument("--json-decoder", default="auto")
+    parser.add_argument("--max-symbols", type=int)
+    parser.add_argument(
+        "--fundamentals", action="store_true", help="refresh the bulk fundamentals"
+    )
+    parser.add_argument(
+        "--analyst-estimates", action="store_true", help="fetch the analyst estimates"
+    )
+    parser.add_argument(
+        "--features", action="store_true", help="compute the volatility features"
+    )
+    parser.add_argument("--output", help="save the report as JSON")
+    args = parser.parse_args()
+
+    config = {
+        "hist_workers": args.hist_workers,
+        "hist_batch_size": args.batch_size,
+        "provider_concurrency": {
+            "alpaca": args.alpaca_concurrency,
+            "fmp": args.fmp_concurrency,
+        },
+        "transform_executor": args.transform_executor,
+        "json_decoder": args.json_decoder,
+        "max_symbols": args.max_symbols,
+        "fundamentals": args.fundamentals,
+        "analyst_estimates": args.analyst_estimates,
+        "features": args.features,
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = asyncio.run(
+            run_load_test(server_from_arguments(args), work_dir, **config)
+        )
+
+    print_report(report)
+    if args.output:
+        if directory := os.path.dirname(args.output):
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump({"settings": vars(args), "report": report}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
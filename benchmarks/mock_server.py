@@ -0,0 +1,357 @@
+"""
+A local stand-in for the Alpaca bars endpoint, the FMP earnings calendar, the FMP bulk
+fundamentals and the FMP analyst estimates, so the whole pipeline can be load tested
+without spending quota.
+
+    python -m benchmarks.mock_server --port 8080 --latency 0.05 --error-rate 0.01
+
+Point PipelineConfig.alpaca_base_url, fmp_base_url and fmp_bulk_base_url at the
+printed urls.
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import time
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from .payloads import (
+    BULK_COLUMNS,
+    analyst_estimates,
+    bulk_csv,
+    make_bars,
+    symbol_names,
+)
+
+BARS_PATH = "/v2/stocks/bars"
+FMP_PATH = "/api/v3"
+FMP_BULK_PATH = "/api/v4"
+
+
+class MockAPIServer:
+    """
+    Serves synthetic bars and earnings with the shape, pagination and rate limit
+    headers of the real APIs.
+
+    Every symbol of the universe reports once every calendar_period_days days and has
+    bars_per_symbol daily bars starting 2020-01-01. The bars are generated from the
+    symbol, so every request for a symbol returns the same bars.
+
+    Attributes:
+        symbols (int): The size of the symbol universe.
+        bars_per_symbol (int): Bars of every symbol, decides the payload size.
+        page_limit (int): The most bars per page, the smaller of it and the request's
+            limit is used.
+        latency (float): Mean seconds before a response is sent.
+        latency_jitter (float): Standard deviation of the latency.
+        error_rate (float): Fraction of requests answered with a 500.
+        throttle_rate (float): Fraction of requests answered with a 429 on top of the
+            ones over the quota.
+        empty_rate (float): Fraction of symbols without bars.
+        international_rate (float): Fraction of calendar symbols on a foreign exchange.
+        rate_limit (int): Requests per provider and rate_limit_period, sent in the
+            X-RateLimit-* headers.
+        rate_limit_period (float): Seconds of a quota window.
+        calendar_period_days (int): Days between two reports of a symbol, by default
+            the length of DataFetcher's upcoming window so each symbol reports once.
+        requests (Counter): Responses sent by endpoint and status.
+        requested_symbols (Set[str]): Every symbol bars were requested for.
+        estimate_revisions (Counter): How often the analyst estimates of a symbol
+            were revised, a revision changes all of its estimates.
+    """
+
+    def __init__(
+        self,
+        symbols: int = 1_000,
+        bars_per_symbol: int = 250,
+        page_limit: int = 10_000,
+        latency: float = 0.05,
+        latency_jitter: float = 0.01,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        empty_rate: float = 0.0,
+        international_rate: float = 0.05,
+        rate_limit: int = 10_000,
+        rate_limit_period: float = 60.0,
+        calendar_period_days: int = 15,
+        seed: int = 0,
+    ) -> None:
+        self.symbols = symbols
+        self.bars_per_symbol = bars_per_symbol
+        self.page_limit = page_limit
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.empty_rate = empty_rate
+        self.international_rate = international_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_period = rate_limit_period
+        self.calendar_period_days = calendar_period_days
+        self.requests = Counter()
+        self.requested_symbols: Set[str] = set()
+        self.estimate_revisions = Counter()
+
+        self._rng = random.Random(seed)
+        self._universe = self.make_universe(seed)
+        self._bars: Dict[str, List[Dict[str, Any]]] = {}
+        # requests of the current quota window of each provider
+        self._windows: Dict[str, List[float]] = {}  # [start, count]
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def make_universe(self, seed: int) -> List[str]:
+        rng = random.Random(seed)
+        return [
+            f"{name}.TO" if rng.random() < self.international_rate else name
+            for name in symbol_names(self.symbols)
+        ]
+
+    @property
+    def alpaca_base_url(self) -> str:
+        return f"{self.url}{BARS_PATH}"
+
+    @property
+    def fmp_base_url(self) -> str:
+        return f"{self.url}{FMP_PATH}"
+
+    @property
+    def fmp_bulk_base_url(self) -> str:
+        return f"{self.url}{FMP_BULK_PATH}"
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(BARS_PATH, self.handle_bars)
+        app.router.add_get(f"{FMP_PATH}/earning_calendar", self.handle_calendar)
+        app.router.add_get(
+            f"{FMP_PATH}/analyst-estimates/{{symbol}}", self.handle_estimates
+        )
+        for endpoint in ("price-target-consensus", "upgrades-downgrades-consensus"):
+            app.router.add_get(f"{FMP_BULK_PATH}/{endpoint}", self.handle_estimates)
+        app.router.add_get(f"{FMP_BULK_PATH}/{{endpoint}}", self.handle_bulk)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Starts serving, on a free port unless one is given.
+
+        Returns:
+            str: The url of the server.
+        """
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockAPIServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def bars(self, symbol: str) -> List[Dict[str, Any]]:
+        if symbol not in self._bars:
+            rng = random.Random(symbol)
+            empty = rng.random() < self.empty_rate
+            self._bars[symbol] = [] if empty else make_bars(self.bars_per_symbol, rng)
+        return self._bars[symbol]
+
+    def take_quota(self, provider: str) -> Tuple[Dict[str, str], bool]:
+        """
+        Counts a request against the provider's quota window.
+
+        Returns:
+            Tuple[Dict[str, str], bool]: The X-RateLimit-* headers and whether the
+                request is over the quota.
+        """
+        # a fixed window per provider like the real APIs
+        now = time.time()
+        window_start = now - now % self.rate_limit_period
+        window = self._windows.setdefault(provider, [window_start, 0])
+        if window[0] != window_start:
+            window[:] = [window_start, 0]
+        window[1] += 1
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(self.rate_limit - window[1], 0)),
+            "X-RateLimit-Reset": str(int(window_start + self.rate_limit_period)),
+        }
+        return headers, window[1] > self.rate_limit
+
+    async def respond(self, endpoint: str, provider: str, payload_func):
+        """
+        Waits out the latency, then answers with the payload or an injected error.
+        """
+        if self.latency:
+            await asyncio.sleep(
+                max(self._rng.gauss(self.latency, self.latency_jitter), 0)
+            )
+
+        headers, over_quota = self.take_quota(provider)
+        if over_quota or self._rng.random() < self.throttle_rate:
+            reset = float(headers["X-RateLimit-Reset"]) - time.time()
+            headers["Retry-After"] = str(max(int(reset), 1) if over_quota else 1)
+            response = web.json_response(
+                {"message": "too many requests."}, status=429, headers=headers
+            )
+        elif self._rng.random() < self.error_rate:
+            response = web.json_response(
+                {"message": "internal server error"}, status=500, headers=headers
+            )
+        elif isinstance(payload := payload_func(), str):
+            # the bulk endpoints answer with CSV
+            response = web.Response(
+                text=payload, content_type="text/csv", headers=headers
+            )
+        else:
+            response = web.json_response(payload, headers=headers)
+
+        self.requests[endpoint, response.status] += 1
+        return response
+
+    async def handle_bars(self, request: web.Request) -> web.Response:
+        query = request.query
+        symbols = sorted(set(query["symbols"].split(",")))
+        self.requested_symbols.update(symbols)
+        start = query.get("start", "")
+        limit = min(int(query.get("limit", 1000)), self.page_limit)
+        offset = (
+            int(base64.b64decode(query["page_token"])) if "page_token" in query else 0
+        )
+        return await self.respond(
+            "bars", "alpaca", lambda: self.bars_page(symbols, start, limit, offset)
+        )
+
+    def bars_page(
+        self, symbols: List[str], start: str, limit: int, offset: int
+    ) -> Dict[str, Any]:
+        # the bars of all symbols form one stream the pages are cut from
+        end = offset + limit
+        page, position, next_page_token = {}, 0, None
+        for symbol in symbols:
+            bars = [bar for bar in self.bars(symbol) if bar["t"][:10] >= start]
+            if position < end and position + len(bars) > offset:
+                page[symbol] = bars[max(offset - position, 0) : end - position]
+            position += len(bars)
+            if position > end:
+                next_page_token = base64.b64encode(str(end).encode()).decode()
+                break
+        return {"bars": page, "next_page_token": next_page_token}
+
+    async def handle_calendar(self, request: web.Request) -> web.Response:
+        from_date = date.fromisoformat(request.query["from"])
+        to_date = date.fromisoformat(request.query["to"])
+        return await self.respond(
+            "earning_calendar", "fmp", lambda: self.calendar(from_date, to_date)
+        )
+
+    async def handle_bulk(self, request: web.Request) -> web.Response:
+        endpoint = request.match_info["endpoint"]
+        year = int(request.query["year"])
+        if endpoint not in BULK_COLUMNS:
+            # FMP answers unknown endpoints with a 200 and an error message
+            return await self.respond(
+                endpoint, "fmp", lambda: {"Error Message": "Invalid endpoint."}
+            )
+        return await self.respond(
+            endpoint, "fmp", lambda: bulk_csv(endpoint, self._universe, year)
+        )
+
+    async def handle_estimates(self, request: web.Request) -> web.Response:
+        symbol = request.match_info.get("symbol") or request.query["symbol"]
+        endpoint = request.path.split("/")[3]
+        return await self.respond(
+            endpoint,
+            "fmp",
+            lambda: analyst_estimates(
+                symbol, date.today(), self.estimate_revisions[symbol]
+            )[endpoint],
+        )
+
+    def calendar(self, from_date: date, to_date: date) -> List[Dict[str, Any]]:
+        earnings = []
+        for ordinal in range(from_date.toordinal(), to_date.toordinal() + 1):
+            day = date.fromordinal(ordinal)
+            # the symbols whose turn it is on this day
+            for symbol in self._universe[
+                ordinal % self.calendar_period_days :: self.calendar_period_days
+            ]:
+                earnings.append(
+                    {
+                        "date": day.isoformat(),
+                        "symbol": symbol,
+                        "eps": None,
+                        "epsEstimated": 1.23,
+                        "time": "amc",
+                        "revenue": None,
+                        "revenueEstimated": 1.5e9,
+                        "fiscalDateEnding": day.isoformat(),
+                    }
+                )
+        return earnings
+
+
+async def serve(server: MockAPIServer, host: str, port: int):
+    await server.start(host, port)
+    print(f"Alpaca bars: {server.alpaca_base_url}")
+    print(f"FMP:         {server.fmp_base_url}")
+    print(f"FMP bulk:    {server.fmp_bulk_base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    # shared with the load test
+    parser.add_argument("--universe", type=int, default=1_000, help="symbols")
+    parser.add_argument("--bars", type=int, default=250, help="bars per symbol")
+    parser.add_argument("--page-limit", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=10_000, help="per minute")
+
+
+def server_from_arguments(args: argparse.Namespace) -> MockAPIServer:
+    return MockAPIServer(
+        symbols=args.universe,
+        bars_per_symbol=args.bars,
+        page_limit=args.page_limit,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        empty_rate=args.empty_rate,
+        rate_limit=args.rate_limit,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(server_from_arguments(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+
+def symbol_names(count: int) -> List[str]:
+    # AAAA, AAAB, ... so every count gets distinct, realistic looking tickers
+    names = []
+    for index in range(count):
+        name = ""
+        for _ in range(4):
+            index, letter = divmod(index, 26)
+            name = chr(ord("A") + letter) + name
+        names.append(name)
+    return names
+
+
+def make_bars(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    start = datetime(2020, 1, 1, 5, tzinfo=timezone.utc)
+    price = rng.uniform(5, 500)
+    bars = []
+    for day in range(count):
+        open_price = price
+        price = max(0.5, price * (1 + rng.gauss(0, 0.02)))
+        high = max(open_price, price) * (1 + rng.random() * 0.01)
+        low = min(open_price, price) * (1 - rng.random() * 0.01)
+        bars.append(
+            {
+                "t": (start + timedelta(days=day)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "o": round(open_price, 4),
+                "h": round(high, 4),
+                "l": round(low, 4),
+                "c": round(price, 4),
+                "v": rng.randint(1_000, 50_000_000),
+                "n": rng.randint(10, 500_000),
+                "vw": round((high + low + price) / 3, 4),
+            }
+        )
+    return bars
+
+
+def bars_page(symbols: int, bars_per_symbol: int, seed: int = 0) -> bytes:
+    """
+    Returns a synthetic page of the Alpaca bars endpoint as raw JSON.
+    """
+    rng = random.Random(seed)
+    return json.dumps(
+        {
+            "bars": {
+                symbol: make_bars(bars_per_symbol, rng)
+                for symbol in symbol_names(symbols)
+            },
+            "next_page_token": None,
+        }
+    ).encode()
+
+
+# the columns of FMP's bulk fundamentals files, a subset of the real ones
+BULK_COLUMNS = {
+    "income-statement-bulk": [
+        "date",
+        "symbol",
+        "reportedCurrency",
+        "calendarYear",
+        "period",
+        "revenue",
+        "eps",
+        "epsdiluted",
+    ],
+    "ratios-bulk": [
+        "symbol",
+        "date",
+        "calendarYear",
+        "period",
+        "netProfitMargin",
+        "priceEarningsRatio",
+        "debtEquityRatio",
+        "returnOnEquity",
+        "dividendYield",
+    ],
+}
+
+
+def bulk_csv(endpoint: str, symbols: List[str], year: int) -> str:
+    """
+    Returns a synthetic bulk fundamentals file with the quarterly reports of every
+    symbol for a year. Revenue grows by 10% a year, so the growth is known.
+    """
+    lines = [",".join(BULK_COLUMNS[endpoint])]
+    for symbol in symbols:
+        rng = random.Random(f"{symbol}{year}")
+        base_revenue = random.Random(symbol).uniform(1e7, 1e10)
+        for quarter in range(1, 5):
+            revenue = base_revenue * quarter * 1.1 ** (year - 2020)
+            values = {
+                "date": f"{year}-{quarter * 3:02d}-{30 if quarter in (2, 3) else 31}",
+                "symbol": symbol,
+                "reportedCurrency": "USD",
+                "calendarYear": year,
+                "period": f"Q{quarter}",
+                "revenue": round(revenue, 2),
+                "eps": round(rng.uniform(-1, 5), 2),
+                "epsdiluted": round(rng.uniform(-1, 5), 2),
+                "netProfitMargin": round(rng.uniform(-0.2, 0.4), 4),
+                "priceEarningsRatio": round(rng.uniform(5, 60), 2),
+                "debtEquityRatio": round(rng.uniform(0, 3), 4),
+                "returnOnEquity": round(rng.uniform(-0.1, 0.5), 4),
+                # companies without dividends leave the field empty
+                "dividendYield": (
+                    round(rng.uniform(0, 0.05), 4) if rng.random() < 0.5 else ""
+                ),
+            }
+            lines.append(
+                ",".join(str(values[column]) for column in BULK_COLUMNS[endpoint])
+            )
+    return "\n".join(lines) + "\n"
+
+
+def analyst_estimates(
+    symbol: str, today: date, revision: int = 0
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Returns synthetic analyst estimates, price targets and ratings of a symbol, by
+    endpoint. The estimates cover the quarters of the year before and after today,
+    and every revision of a symbol has different ones.
+    """
+    rng = random.Random(f"{symbol}/{revision}" if revision else symbol)
+    price = rng.uniform(5, 500)
+    estimates = []
+    for quarter in range(-4, 5):
+        year, month = divmod(today.year * 12 + today.month - 1 + quarter * 3, 12)
+        eps = rng.uniform(-1, 5)
+        revenue = rng.uniform(1e7, 1e10)
+        analysts = rng.randint(1, 40)
+        estimates.append(
+            {
+                "symbol": symbol,
+                "date": date(year, month + 1, 1).isoformat(),
+                "estimatedRevenueLow": round(revenue * 0.9, 2),
+                "estimatedRevenueHigh": round(revenue * 1.1, 2),
+                "estimatedRevenueAvg": round(revenue, 2),
+                "estimatedEpsAvg": round(eps, 2),
+                "estimatedEpsHigh": round(eps * 1.2, 2),
+                "estimatedEpsLow": round(eps * 0.8, 2),
+                "numberAnalystEstimatedRevenue": analysts,
+                "numberAnalystsEstimatedEps": analysts,
+            }
+        )
+    ratings = [rng.randint(0, 15) for _ in range(5)]
+    return {
+        # latest first like FMP
+        "analyst-estimates": estimates[::-1],
+        "price-target-consensus": [
+            {
+                "symbol": symbol,
+                "targetHigh": round(price * 1.5, 2),
+                "targetLow": round(price * 0.7, 2),
+                "targetConsensus": round(price * 1.1, 2),
+                "targetMedian": round(price * 1.08, 2),
+            }
+        ],
+        "upgrades-downgrades-consensus": [
+            {
+                "symbol": symbol,
+                "strongBuy": ratings[0],
+                "buy": ratings[1],
+                "hold": ratings[2],
+                "sell": ratings[3],
+                "strongSell": ratings[4],
+                "consensus": "Buy" if ratings[0] + ratings[1] > ratings[2] else "Hold",
+            }
+        ],
+    }
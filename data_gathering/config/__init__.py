@@ -1,3 +1,4 @@
 from .api_keys import APIKeys
+from .pipeline_config import PipelineConfig
 
-__all__ = ["APIKeys"]
+__all__ = ["APIKeys", "PipelineConfig"]
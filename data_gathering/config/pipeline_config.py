@@ -0,0 +1,220 @@
+from typing import Mapping, Optional
+
+
+class PipelineConfig:
+    """
+    Settings of a DataFetcher run.
+
+    The fetch runs as a pipeline of stages connected by bounded queues. The queue sizes
+    decide how much work may pile up in front of a stage before the stages feeding it
+    wait, and the worker counts decide how many items a stage handles at once.
+
+    Attributes:
+        provider_concurrency (Mapping[str, int]): Requests each provider may have in
+            flight at once. Missing providers use DEFAULT_CONCURRENCY.
+        alpaca_base_url (str): The Alpaca bars endpoint, e.g. a local mock server.
+        fmp_base_url (str): The url the FMP endpoints are relative to.
+        calendar_chunk_days (int): Days of the earnings calendar in each of the
+            concurrent calendar requests.
+        symbol_queue_size (int): Symbols buffered between the earnings calendar and the
+            fetch workers.
+        batch_queue_size (int): Symbol batches waiting for a historical bars worker.
+        page_queue_size (int): Pages of bars waiting to be added to the column buffers.
+        write_queue_size (int): Flushed tables of bars waiting to be written.
+        hist_workers (int): Batches of historical bars fetched at once.
+        other_workers (int): Symbols whose other data is fetched at once.
+        hist_batch_size (int): Symbols sent in each historical bars request, 1 disables
+            batching.
+        hist_batch_timeout (float): Seconds to wait for a batch to fill up before it is
+            sent anyway.
+        hist_memory_limit (int): Bytes of buffered bars that trigger a flush.
+        hist_json (bool): Export the stored bars to JSON at the end of the run.
+        hist_json_path (str): The JSON export, compressed if it ends in .gz or .zst.
+        hist_json_format (str): "ndjson" for one bar per line or "json" for a single
+            object nested by symbol and timestamp.
+        hist_json_max_rows (int): Bars held in memory at once while exporting.
+        hist_parquet (bool): Write the bars to a single parquet file.
+        hist_dataset (bool): Write the bars to a hive partitioned dataset
+            (symbol=.../year=...) for fast single symbol reads.
+        hist_parquet_path (str): The parquet file the bars are written to.
+        hist_dataset_path (str): The directory of the partitioned dataset.
+        hist_incremental (bool): Only fetch the bars after the last stored one and
+            append them to the stored output.
+        json_decoder (str): The JSON decoder of the responses, "msgspec", "orjson",
+            "json" or "auto" for the fastest one installed.
+        transform_executor (str): Where the pages are decoded into column buffers,
+            "process", "thread", "inline" on the event loop, or "auto" for a process
+            pool on machines with more than one core.
+        transform_workers (int): The size of the transform pool. Defaults to the
+            number of cores.
+        max_symbols (int): Optional cap on the number of symbols fetched per run.
+        offline (bool): Replay every request from the on-disk response cache without
+            the network.
+        response_cache (bool): Store the successful responses on disk and serve the
+            fresh ones back, for development runs. Always on when offline.
+        cache_dir (str): The directory of the caches. Defaults to the package's .cache.
+        journal (bool): Record which symbols were fetched and stored in the run journal
+            and store the bars fetched before a failure instead of discarding them.
+        resume (bool): Continue the last run if it failed, skipping the symbols it
+            stored. Appends to the stored output even without hist_incremental.
+        metrics (str): Record the stage latencies, queue depths, bytes downloaded, rows
+            and rate limit sleeps and report them at the end of the run as "json",
+            "prometheus" or "log". None records nothing.
+        metrics_path (str): The file of the json and prometheus reports. Defaults to
+            output/metrics.json or output/metrics.prom.
+        metrics_interval (float): Seconds between two samples of the queue depths.
+        shard_index (int): The shard of the symbol universe this run fetches, None
+            fetches every symbol.
+        shard_count (int): The number of shards the universe is split into by a
+            stable hash of the symbol.
+        quota_share (float): The fraction of each provider's quota this run may use,
+            e.g. 1/4 for one of four shards sharing the API keys.
+        shard_dir (str): The directory of the shards' output, merged into the
+            hist_*_path outputs once every shard finished.
+        fundamentals (bool): Refresh the fundamentals of every company from FMP's bulk
+            endpoints.
+        fundamentals_path (str): The directory of the fundamentals dataset.
+        fundamentals_years (int): Calendar years of fundamentals each refresh fetches,
+            counting back from the current one.
+        fundamentals_period (str): "quarter" or "annual" reports.
+        fmp_bulk_base_url (str): The url the FMP bulk and other v4 endpoints are
+            relative to.
+        analyst_estimates (bool): Refresh the analyst estimates, price targets and
+            ratings of the upcoming earnings whose stored ones are stale.
+        estimates_path (str): The directory of the analyst estimates dataset, which
+            only gets the estimates that changed.
+        estimates_ttl (float): Seconds the estimates of a symbol stay fresh after
+            they changed.
+        estimates_max_ttl (float): The most seconds unchanged estimates stay fresh,
+            the TTL doubles every time a refetch finds them unchanged.
+        estimates_near_earnings_days (int): Days before its earnings date a symbol's
+            estimates are refreshed after estimates_near_earnings_ttl, ahead of the
+            other symbols.
+        estimates_near_earnings_ttl (float): Seconds the estimates of a symbol near
+            its earnings stay fresh.
+        estimates_max_symbols (int): The most symbols whose estimates a run fetches,
+            None fetches every stale one.
+        estimates_workers (int): Symbols whose estimates are fetched at once.
+        features (bool): Compute volatility and volume features of every symbol from
+            the stored bars once they are written.
+        features_path (str): The parquet file of the features.
+        features_window (int): Bars in the rolling window of every feature.
+    """
+
+    def __init__(
+        self,
+        provider_concurrency: Optional[Mapping[str, int]] = None,
+        alpaca_base_url: str = "https://data.alpaca.markets/v2/stocks/bars",
+        fmp_base_url: str = "https://financialmodelingprep.com/api/v3",
+        calendar_chunk_days: int = 3,
+        symbol_queue_size: int = 100,
+        batch_queue_size: int = 2,
+        page_queue_size: int = 8,
+        write_queue_size: int = 2,
+        hist_workers: int = 2,
+        other_workers: int = 4,
+        hist_batch_size: int = 50,
+        hist_batch_timeout: float = 1.0,
+        hist_memory_limit: int = 256 * 1024**2,
+        hist_json: bool = False,
+        hist_json_path: str = "output/historical_data.ndjson",
+        hist_json_format: str = "ndjson",
+        hist_json_max_rows: int = 1_000_000,
+        hist_parquet: bool = True,
+        hist_dataset: bool = False,
+        hist_parquet_path: str = "output/historical_data.parquet",
+        hist_dataset_path: str = "output/historical_data",
+        hist_incremental: bool = True,
+        json_decoder: str = "auto",
+        transform_executor: str = "auto",
+        transform_workers: Optional[int] = None,
+        max_symbols: Optional[int] = None,
+        offline: bool = False,
+        response_cache: bool = False,
+        cache_dir: Optional[str] = None,
+        journal: bool = True,
+        resume: bool = False,
+        metrics: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        metrics_interval: float = 0.5,
+        shard_index: Optional[int] = None,
+        shard_count: int = 1,
+        quota_share: float = 1.0,
+        shard_dir: str = "output/shards",
+        fundamentals: bool = False,
+        fundamentals_path: str = "output/fundamentals",
+        fundamentals_years: int = 2,
+        fundamentals_period: str = "quarter",
+        fmp_bulk_base_url: str = "https://financialmodelingprep.com/api/v4",
+        analyst_estimates: bool = False,
+        estimates_path: str = "output/analyst_estimates",
+        estimates_ttl: float = 24 * 3600,
+        estimates_max_ttl: float = 7 * 24 * 3600,
+        estimates_near_earnings_days: int = 3,
+        estimates_near_earnings_ttl: float = 6 * 3600,
+        estimates_max_symbols: Optional[int] = None,
+        estimates_workers: int = 4,
+        features: bool = False,
+        features_path: str = "output/volatility_features.parquet",
+        features_window: int = 20,
+    ):
+        self.provider_concurrency = provider_concurrency
+        self.alpaca_base_url = alpaca_base_url
+        self.fmp_base_url = fmp_base_url
+        self.calendar_chunk_days = calendar_chunk_days
+        self.symbol_queue_size = symbol_queue_size
+        self.batch_queue_size = batch_queue_size
+        self.page_queue_size = page_queue_size
+        self.write_queue_size = write_queue_size
+        self.hist_workers = hist_workers
+        self.other_workers = other_workers
+        self.hist_batch_size = hist_batch_size
+        self.hist_batch_timeout = hist_batch_timeout
+        self.hist_memory_limit = hist_memory_limit
+        self.hist_json = hist_json
+        self.hist_json_path = hist_json_path
+        self.hist_json_format = hist_json_format
+        self.hist_json_max_rows = hist_json_max_rows
+        self.hist_parquet = hist_parquet
+        self.hist_dataset = hist_dataset
+        self.hist_parquet_path = hist_parquet_path
+        self.hist_dataset_path = hist_dataset_path
+        self.hist_incremental = hist_incremental
+        self.json_decoder = json_decoder
+        self.transform_executor = transform_executor
+        self.transform_workers = transform_workers
+        self.max_symbols = max_symbols
+        self.offline = offline
+        self.response_cache = response_cache or offline
+        self.cache_dir = cache_dir
+        self.journal = journal
+        self.resume = resume
+        self.metrics = metrics
+        self.metrics_path = metrics_path or (
+            "output/metrics.prom" if metrics == "prometheus" else "output/metrics.json"
+        )
+        self.metrics_interval = metrics_interval
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.quota_share = quota_share
+        self.shard_dir = shard_dir
+        self.fundamentals = fundamentals
+        self.fundamentals_path = fundamentals_path
+        self.fundamentals_years = fundamentals_years
+        self.fundamentals_period = fundamentals_period
+        self.fmp_bulk_base_url = fmp_bulk_base_url
+        self.analyst_estimates = analyst_estimates
+        self.estimates_path = estimates_path
+        self.estimates_ttl = estimates_ttl
+        self.estimates_max_ttl = estimates_max_ttl
+        self.estimates_near_earnings_days = estimates_near_earnings_days
+        self.estimates_near_earnings_ttl = estimates_near_earnings_ttl
+        self.estimates_max_symbols = estimates_max_symbols
+        self.estimates_workers = estimates_workers
+        self.features = features
+        self.features_path = features_path
+        self.features_window = features_window
+
+    @property
+    def sharded(self) -> bool:
+        return self.shard_index is not None and self.shard_count > 1
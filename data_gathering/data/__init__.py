@@ -1,10 +1,13 @@
+from data_gathering.config.pipeline_config import PipelineConfig
+
 from .gather_all_data import DataFetcher
+from .shard_coordinator import fetch_all_shards, merge_shards, run_shard
 
 
-async def fetch_all_data():
+async def fetch_all_data(config: PipelineConfig = None):
     # Create an instance of DataFetcher within the function
-    data_fetcher = DataFetcher()
+    data_fetcher = DataFetcher(config)
     await data_fetcher.fetch_all_data()
 
 
-__all__ = ["fetch_all_data"]
+__all__ = ["fetch_all_data", "fetch_all_shards", "merge_shards", "run_shard"]
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import pyarrow as pa
+
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.data.fmp_client import BASE_URL, BULK_BASE_URL, FMPClient
+from data_gathering.models.mappings import analyst_estimates_mapping
+from data_gathering.utils import get_logger
+from data_gathering.utils.cache.analyst_estimates_cache import AnalystEstimatesCache
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.json_decoding import JSONDecoder
+from data_gathering.utils.metrics import Metrics, NullMetrics
+from data_gathering.utils.rate_limiter import RateLimiter
+
+logger = get_logger(__name__)
+
+# the types of the columns that are not float64
+COLUMN_TYPES = {
+    "estimate_date": pa.date32(),
+    "eps_analysts": pa.int32(),
+    "revenue_analysts": pa.int32(),
+    "strong_buy": pa.int32(),
+    "buy": pa.int32(),
+    "hold": pa.int32(),
+    "sell": pa.int32(),
+    "strong_sell": pa.int32(),
+    "consensus": pa.string(),
+}
+
+
+def analyst_estimates_schema() -> pa.Schema:
+    return pa.schema(
+        [
+            ("symbol", pa.string()),
+            ("fetched_at", pa.timestamp("s", tz="UTC")),
+            *(
+                (name, COLUMN_TYPES.get(name, pa.float64()))
+                for columns in analyst_estimates_mapping.values()
+                for name in columns.values()
+            ),
+        ]
+    )
+
+
+def row_digest(row: Mapping[str, Any]) -> str:
+    # the estimates without the symbol and the time they were fetched
+    values = {
+        key: value for key, value in row.items() if key not in ("symbol", "fetched_at")
+    }
+    return hashlib.blake2b(
+        json.dumps(values, sort_keys=True, default=str).encode(), digest_size=16
+    ).hexdigest()
+
+
+def reported_period(
+    estimates: List[Dict[str, Any]], earnings_date: str
+) -> Optional[Dict[str, Any]]:
+    # the latest fiscal period that ended before the earnings date is the one reported
+    periods = [
+        estimate for estimate in estimates if estimate.get("date", "") <= earnings_date
+    ]
+    return max(periods, key=lambda estimate: estimate["date"], default=None)
+
+
+class AnalystEstimates:
+    """
+    Fetches the consensus estimates, price targets and analyst ratings of the symbols
+    with upcoming earnings, and tells which ones changed since they were last fetched.
+
+    Estimates move slowly, so a symbol is only fetched again once its entry in the
+    cache is stale. Symbols reporting within near_earnings_days are fetched again
+    after the shorter near_earnings_ttl and go first.
+
+    Attributes:
+        cache (AnalystEstimatesCache): The fetch times, digests and TTLs by symbol.
+        client (FMPClient): The client of the FMP endpoints.
+        near_earnings_days (int): Days before an earnings date a symbol is near it.
+        near_earnings_ttl (float): Seconds the estimates of a symbol near its earnings
+            stay fresh.
+    """
+
+    def __init__(
+        self,
+        api_keys: APIKeys,
+        cache: AnalystEstimatesCache,
+        rate_limiter: RateLimiter = None,
+        response_cache: ResponseCache = None,
+        http: ProviderSessions = None,
+        decoder: JSONDecoder = None,
+        base_url: str = BASE_URL,
+        bulk_base_url: str = BULK_BASE_URL,
+        near_earnings_days: int = 3,
+        near_earnings_ttl: float = 6 * 3600,
+        metrics: Metrics = None,
+    ):
+        self.cache = cache
+        self.client = FMPClient(
+            api_keys.fmp_api_key,
+            http,
+            rate_limiter or RateLimiter.from_api_keys(api_keys),
+            response_cache,
+            base_url=base_url,
+            decoder=decoder,
+            metrics=metrics,
+            bulk_base_url=bulk_base_url,
+        )
+        self.metrics = metrics or NullMetrics()
+        self.near_earnings_days = near_earnings_days
+        self.near_earnings_ttl = near_earnings_ttl
+
+    def due(
+        self, earnings_dates: Mapping[str, str], now: Optional[float] = None
+    ) -> List[str]:
+        """
+        Returns the symbols whose estimates are stale: those near their earnings by
+        earnings date first, then the rest, never fetched and most overdue first.
+
+        Args:
+            earnings_dates (Mapping[str, str]): The earnings date (YYYY-MM-DD) of
+                every symbol.
+            now (float, optional): The current time. Defaults to now.
+        """
+        now = time.time() if now is None else now
+        today = date.fromtimestamp(now)
+        entries = self.cache.entries()
+        near, stale = [], []
+        for symbol, earnings_date in earnings_dates.items():
+            entry = entries.get(symbol)
+            age = now - entry.fetched_at if entry is not None else math.inf
+            days = (date.fromisoformat(earnings_date) - today).days
+            if days <= self.near_earnings_days and age >= self.near_earnings_ttl:
+                near.append((earnings_date, symbol))
+            elif entry is None or age >= entry.ttl:
+                stale.append((-(age - (entry.ttl if entry else 0)), symbol))
+        return [symbol for _, symbol in sorted(near)] + [
+            symbol for _, symbol in sorted(stale)
+        ]
+
+    async def fetch_symbol(
+        self, symbol: str, earnings_date: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Fetches the estimates of the period a symbol reports next, its price targets
+        and its ratings.
+
+        Returns:
+            Dict[str, Any]: A row with analyst_estimates_schema, the fields FMP has no
+                data for are None.
+            None: If a request failed.
+        """
+        with self.metrics.time("stage_seconds", stage="estimates"):
+            estimates, targets, ratings = await asyncio.gather(
+                self.client.analyst_estimates(symbol),
+                self.client.price_target_consensus(symbol),
+                self.client.upgrades_downgrades_consensus(symbol),
+            )
+        if estimates is None or targets is None or ratings is None:
+            return None
+
+        row = {"symbol": symbol, "fetched_at": datetime.now(timezone.utc)}
+        for endpoint, data in (
+            ("analyst-estimates", reported_period(estimates, earnings_date)),
+            ("price-target-consensus", targets[0] if targets else None),
+            ("upgrades-downgrades-consensus", ratings[0] if ratings else None),
+        ):
+            for column, name in analyst_estimates_mapping[endpoint].items():
+                row[name] = data.get(column) if data else None
+        if row["estimate_date"] is not None:
+            row["estimate_date"] = date.fromisoformat(row["estimate_date"][:10])
+        return row
+
+    async def fetch(
+        self,
+        earnings_dates: Mapping[str, str],
+        max_symbols: Optional[int] = None,
+        workers: int = 4,
+    ) -> Tuple[pa.Table, Dict[str, str]]:
+        """
+        Fetches the estimates of the symbols that are due.
+
+        Nothing is recorded in the cache, the caller records the digests once the
+        changed rows are stored, so a failed write fetches them again next time.
+
+        Args:
+            earnings_dates (Mapping[str, str]): The earnings date of every symbol.
+            max_symbols (int, optional): The most symbols to fetch, the ones due first
+                are fetched. Defaults to every due symbol.
+            workers (int, optional): Symbols fetched at once. Defaults to 4.
+
+        Returns:
+            pa.Table: The rows of the symbols whose estimates are new or changed.
+            Dict[str, str]: The digest of every fetched symbol's estimates, for
+                AnalystEstimatesCache.record.
+        """
+        due = self.due(earnings_dates)[:max_symbols]
+        rows: Dict[str, Dict[str, Any]] = {}
+        symbols = iter(due)
+
+        async def worker():
+            # the workers share the iterator, so the symbols are fetched in order
+            for symbol in symbols:
+                row = await self.fetch_symbol(symbol, earnings_dates[symbol])
+                if row is not None:
+                    rows[symbol] = row
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        digests = {symbol: row_digest(row) for symbol, row in rows.items()}
+        changed = self.cache.changed(digests)
+        self.metrics.increment("symbols", len(rows), stage="estimates")
+        self.metrics.increment("changed", len(changed), stage="estimates")
+        logger.info(
+            f"Fetched the estimates of {len(rows)} of {len(due)} due symbols, "
+            f"{len(changed)} changed"
+        )
+        table = pa.Table.from_pylist(
+            [rows[symbol] for symbol in due if symbol in changed],
+            schema=analyst_estimates_schema(),
+        )
+        return table, digests
@@ -0,0 +1,262 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.http_sessions import RETRYABLE_ERRORS, ProviderSessions
+from data_gathering.utils.json_decoding import JSONDecoder, get_decoder
+from data_gathering.utils.logging import get_logger
+from data_gathering.utils.metrics import Metrics, NullMetrics
+from data_gathering.utils.rate_limiter import RateLimiter
+
+logger = get_logger(__name__)
+
+BASE_URL = "https://financialmodelingprep.com/api/v3"
+# the bulk endpoints answer with one CSV file for every company
+BULK_BASE_URL = "https://financialmodelingprep.com/api/v4"
+
+
+class FMPClient:
+    """
+    An asyncio client for the Financial Modeling Prep API.
+
+    Requests go through the shared fmp session, its concurrency budget and the fmp
+    token bucket, and successful responses are stored in the response cache.
+
+    Attributes:
+        api_key (str): The FMP API key, sent with every request.
+        base_url (str): The url every path is relative to.
+        bulk_base_url (str): The url the v4 endpoints, e.g. the bulk ones, are
+            relative to.
+        max_retries (int): Retries of a request that was rate limited, timed out or
+            failed with a server error.
+        metrics (Metrics): Records the request latencies, bytes and rate limit sleeps.
+    """
+
+    provider = "fmp"
+
+    def __init__(
+        self,
+        api_key: str,
+        http: Optional[ProviderSessions] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        response_cache: Optional[ResponseCache] = None,
+        base_url: str = BASE_URL,
+        max_retries: int = 3,
+        decoder: Optional[JSONDecoder] = None,
+        metrics: Optional[Metrics] = None,
+        bulk_base_url: str = BULK_BASE_URL,
+    ) -> None:
+        self.api_key = api_key
+        self.http = http or ProviderSessions()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.response_cache = response_cache
+        self.base_url = base_url.rstrip("/")
+        self.bulk_base_url = bulk_base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.decoder = decoder or get_decoder()
+        self.metrics = metrics or NullMetrics()
+
+    async def get(
+        self,
+        path: str,
+        params: Optional[Mapping[str, str]] = None,
+        base_url: Optional[str] = None,
+    ) -> Optional[bytes]:
+        """
+        Requests an endpoint and returns the raw response body.
+
+        Args:
+            path (str): The endpoint relative to base_url, e.g. "earning_calendar".
+            params (Mapping[str, str], optional): Query parameters without the API key.
+            base_url (str, optional): The url path is relative to. Defaults to
+                self.base_url.
+
+        Returns:
+            bytes: The body of a successful response.
+            None: If the request failed or stayed rate limited.
+
+        Raises:
+            OfflineCacheMiss: If the response is not cached in offline mode.
+        """
+        url = f"{base_url or self.base_url}/{path}"
+        params = dict(params or {})
+
+        if (
+            self.response_cache
+            and (body := self.response_cache.get(url, params)) is not None
+        ):
+            return body
+
+        metrics = self.metrics
+        for attempt in range(self.max_retries + 1):
+            waited = await self.rate_limiter.acquire(self.provider)
+            metrics.increment(
+                "rate_limit_sleep_seconds", waited, provider=self.provider
+            )
+            async with self.http.limit(self.provider):
+                session = self.http.session(self.provider)
+                with metrics.time("http_request_seconds", provider=self.provider):
+                    try:
+                        async with session.get(
+                            url, params={**params, "apikey": self.api_key}
+                        ) as response:
+                            retry_after = self.rate_limiter.update_from_headers(
+                                self.provider, response.headers, response.status
+                            )
+                            status = response.status
+                            metrics.increment(
+                                "requests", provider=self.provider, status=status
+                            )
+                            if retry_after is not None:
+                                continue
+                            if status >= 500:
+                                logger.warning(f"{path} returned status {status}")
+                                self.rate_limiter.backoff(self.provider, attempt)
+                                continue
+
+                            body = await response.read()
+                    except RETRYABLE_ERRORS as error:
+                        logger.warning(f"{path} request failed: {error!r}")
+                        metrics.increment("request_errors", provider=self.provider)
+                        self.rate_limiter.backoff(self.provider, attempt)
+                        continue
+            metrics.increment("bytes_downloaded", len(body), provider=self.provider)
+
+            if status != 200:
+                logger.warning(f"{path} returned status {status}")
+                return None
+
+            if self.response_cache:
+                self.response_cache.set(url, body, params)
+            return body
+
+        return None
+
+    async def get_json(
+        self,
+        path: str,
+        params: Optional[Mapping[str, str]] = None,
+        base_url: Optional[str] = None,
+    ):
+        body = await self.get(path, params, base_url)
+        if body is None:
+            return None
+        try:
+            return self.decoder.loads(body)
+        except ValueError:
+            logger.warning(f"{path} returned a body that is not JSON")
+            return None
+
+    async def earning_calendar(
+        self, from_date: str, to_date: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the earnings calendar between two dates (YYYY-MM-DD, both inclusive).
+        """
+        with self.metrics.time("stage_seconds", stage="calendar"):
+            data = await self.get_json(
+                "earning_calendar", {"from": from_date, "to": to_date}
+            )
+        if not isinstance(data, list):
+            # errors come back as an object with an "Error Message"
+            logger.warning(f"No earnings calendar for {from_date} to {to_date}: {data}")
+            return []
+        return data
+
+    async def analyst_estimates(
+        self, symbol: str, period: str = "quarter"
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the consensus estimates of a symbol's fiscal periods, or None if the
+        request failed.
+        """
+        data = await self.get_json(f"analyst-estimates/{symbol}", {"period": period})
+        return data if isinstance(data, list) else None
+
+    async def price_target_consensus(
+        self, symbol: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        # the consensus, median, high and low price target of the analysts
+        data = await self.get_json(
+            "price-target-consensus", {"symbol": symbol}, self.bulk_base_url
+        )
+        return data if isinstance(data, list) else None
+
+    async def upgrades_downgrades_consensus(
+        self, symbol: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        # the number of strong buy, buy, hold, sell and strong sell ratings
+        data = await self.get_json(
+            "upgrades-downgrades-consensus", {"symbol": symbol}, self.bulk_base_url
+        )
+        return data if isinstance(data, list) else None
+
+    async def bulk(
+        self, endpoint: str, year: int, period: str = "quarter"
+    ) -> Optional[bytes]:
+        """
+        Requests a bulk endpoint, e.g. "ratios-bulk", which returns the reports of
+        every company for one year as a single CSV file.
+
+        Args:
+            endpoint (str): The bulk endpoint relative to bulk_base_url.
+            year (int): The calendar year of the reports.
+            period (str, optional): "quarter" or "annual". Defaults to "quarter".
+
+        Returns:
+            bytes: The CSV file, or an error message as JSON.
+            None: If the request failed.
+        """
+        with self.metrics.time("stage_seconds", stage="bulk"):
+            return await self.get(
+                endpoint,
+                {"year": str(year), "period": period},
+                base_url=self.bulk_base_url,
+            )
+
+    async def iter_earning_calendar(
+        self, from_date: str, to_date: str, chunk_days: int = 3
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Fetches the earnings calendar in chunks of chunk_days concurrently and yields
+        each chunk as soon as it arrives, whatever its position in the date range.
+
+        Args:
+            from_date (str): The first date (YYYY-MM-DD).
+            to_date (str): The last date (YYYY-MM-DD).
+            chunk_days (int, optional): The number of days in each request. Defaults to 3.
+
+        Yields:
+            List[Dict[str, Any]]: The earnings of one chunk.
+        """
+        tasks = [
+            asyncio.ensure_future(self.earning_calendar(chunk_from, chunk_to))
+            for chunk_from, chunk_to in self.date_chunks(from_date, to_date, chunk_days)
+        ]
+        try:
+            for next_chunk in asyncio.as_completed(tasks):
+                yield await next_chunk
+        finally:
+            # the caller stopped early, e.g. at max_symbols
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def date_chunks(
+        from_date: str, to_date: str, chunk_days: int
+    ) -> List[Tuple[str, str]]:
+        """
+        Splits a date range into consecutive ranges of at most chunk_days days.
+        """
+        start = date.fromisoformat(from_date)
+        end = date.fromisoformat(to_date)
+        chunks = []
+        while start <= end:
+            chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+            chunks.append((start.isoformat(), chunk_end.isoformat()))
+            start = chunk_end + timedelta(days=1)
+        return chunks
+
+    async def close(self):
+        await self.http.close()
@@ -0,0 +1,234 @@
+import asyncio
+from typing import Dict, List, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.data.fmp_client import BULK_BASE_URL, FMPClient
+from data_gathering.models.mappings import (
+    fundamentals_key_mapping,
+    fundamentals_mapping,
+)
+from data_gathering.utils import get_logger
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.metrics import Metrics
+from data_gathering.utils.rate_limiter import RateLimiter
+
+logger = get_logger(__name__)
+
+KEY_COLUMNS = list(fundamentals_key_mapping.values())
+KEY_TYPES = {
+    "symbol": pa.string(),
+    "date": pa.date32(),
+    "calendarYear": pa.int16(),
+    "period": pa.string(),
+}
+
+
+def fundamentals_schema() -> pa.Schema:
+    # the key columns, then the metrics of every endpoint and the revenue growth
+    return pa.schema(
+        [
+            *(
+                (name, KEY_TYPES[column])
+                for column, name in fundamentals_key_mapping.items()
+            ),
+            *(
+                (name, pa.float64())
+                for columns in fundamentals_mapping.values()
+                for name in columns.values()
+            ),
+            ("revenue_growth", pa.float64()),
+        ]
+    )
+
+
+def parse_bulk_csv(body: bytes, columns: Mapping[str, str]) -> Optional[pa.Table]:
+    """
+    Parses a bulk CSV file into a table of the key columns and the given columns.
+
+    Only the needed columns are converted, and columns the file lacks are null, so the
+    table has the same schema whatever FMP sends.
+
+    Args:
+        body (bytes): The response of a bulk endpoint.
+        columns (Mapping[str, str]): Our names of the FMP columns to keep.
+
+    Returns:
+        pa.Table: The reports with our column names.
+        None: If the body is an error message instead of a CSV file.
+    """
+    # errors, e.g. an endpoint missing from the plan, come back as JSON
+    if body.lstrip()[:1] in (b"{", b"["):
+        return None
+
+    names = {**fundamentals_key_mapping, **columns}
+    table = pacsv.read_csv(
+        pa.BufferReader(body),
+        convert_options=pacsv.ConvertOptions(
+            column_types={
+                **KEY_TYPES,
+                **{column: pa.float64() for column in columns},
+            },
+            include_columns=list(names),
+            include_missing_columns=True,
+        ),
+    )
+    return table.rename_columns([names[column] for column in table.column_names])
+
+
+def combine_fundamentals(tables: Mapping[str, pa.Table], years: List[int]) -> pa.Table:
+    """
+    Joins the reports of the endpoints by symbol and report period and adds the
+    revenue growth over the same period of the year before.
+
+    Args:
+        tables (Mapping[str, pa.Table]): The parsed reports by endpoint, including the
+            year before the first of years.
+        years (List[int]): The calendar years to keep.
+
+    Returns:
+        pa.Table: The fundamentals with fundamentals_schema, sorted by symbol and date.
+    """
+    schema = fundamentals_schema()
+    combined = None
+    for table in tables.values():
+        combined = (
+            table
+            if combined is None
+            else combined.join(table, KEY_COLUMNS, join_type="full outer")
+        )
+    if combined is None:
+        return schema.empty_table()
+
+    # the metrics of endpoints that failed are null
+    for field in schema:
+        if field.name not in combined.column_names and field.name != "revenue_growth":
+            combined = combined.append_column(
+                field, pa.nulls(combined.num_rows, field.type)
+            )
+
+    previous = combined.select(["symbol", "period", "calendar_year", "revenue"])
+    previous = previous.set_column(
+        2,
+        "calendar_year",
+        pc.add(previous.column("calendar_year"), 1).cast(pa.int16()),
+    ).rename_columns(["symbol", "period", "calendar_year", "previous_revenue"])
+    combined = combined.join(
+        previous, ["symbol", "period", "calendar_year"], join_type="left outer"
+    )
+    # no growth from a period without revenue
+    previous_revenue = combined.column("previous_revenue")
+    previous_revenue = pc.if_else(
+        pc.greater(previous_revenue, 0), previous_revenue, None
+    )
+    combined = combined.append_column(
+        "revenue_growth",
+        pc.subtract(pc.divide(combined.column("revenue"), previous_revenue), 1),
+    )
+
+    combined = combined.filter(
+        pc.is_in(
+            combined.column("calendar_year"),
+            value_set=pa.array(years, pa.int16()),
+        )
+    )
+    return (
+        combined.select(schema.names)
+        .cast(schema)
+        .sort_by([("symbol", "ascending"), ("date", "ascending")])
+    )
+
+
+class Fundamentals:
+    """
+    Fetches the fundamental metrics of every company from FMP's bulk endpoints.
+
+    Each bulk request returns the reports of every company for one endpoint and year,
+    so a refresh of the whole universe takes two requests per year however many
+    symbols there are.
+
+    Attributes:
+        client (FMPClient): The client of the bulk endpoints.
+        period (str): "quarter" or "annual" reports.
+    """
+
+    def __init__(
+        self,
+        api_keys: APIKeys,
+        rate_limiter: RateLimiter = None,
+        response_cache: ResponseCache = None,
+        http: ProviderSessions = None,
+        base_url: str = BULK_BASE_URL,
+        period: str = "quarter",
+        metrics: Metrics = None,
+    ):
+        self.client = FMPClient(
+            api_keys.fmp_api_key,
+            http,
+            rate_limiter or RateLimiter.from_api_keys(api_keys),
+            response_cache,
+            metrics=metrics,
+            bulk_base_url=base_url,
+        )
+        self.period = period
+
+    async def fetch_endpoint(self, endpoint: str, year: int) -> Optional[pa.Table]:
+        body = await self.client.bulk(endpoint, year, self.period)
+        if body is None:
+            return None
+        # parsing a year of every company takes a while, keep it off the event loop
+        table = await asyncio.to_thread(
+            parse_bulk_csv, body, fundamentals_mapping[endpoint]
+        )
+        if table is None:
+            logger.warning(f"FMP returned an error for {endpoint} of {year}")
+        return table
+
+    async def fetch(self, years: List[int]) -> pa.Table:
+        """
+        Fetches the fundamentals of every company for the given calendar years.
+
+        The year before the first one is fetched too, for the revenue growth of the
+        first year's periods. A year is left out if any endpoint failed for it or for
+        the year before, since its stored partition would be replaced by nulls.
+
+        Args:
+            years (List[int]): The calendar years.
+
+        Returns:
+            pa.Table: The fundamentals keyed by symbol and report period, see
+                combine_fundamentals.
+        """
+        requests = [
+            (endpoint, year)
+            for endpoint in fundamentals_mapping
+            for year in [min(years) - 1, *years]
+        ]
+        results = await asyncio.gather(
+            *(self.fetch_endpoint(endpoint, year) for endpoint, year in requests)
+        )
+
+        tables: Dict[str, List[pa.Table]] = {}
+        failed_years = set()
+        for (endpoint, year), table in zip(requests, results):
+            if table is None:
+                failed_years.add(year)
+            else:
+                tables.setdefault(endpoint, []).append(table)
+
+        skipped = [year for year in years if {year, year - 1} & failed_years]
+        if skipped:
+            logger.warning(f"Not refreshing the fundamentals of {skipped}")
+            years = [year for year in years if year not in skipped]
+        return await asyncio.to_thread(
+            combine_fundamentals,
+            {
+                endpoint: pa.concat_tables(endpoint_tables)
+                for endpoint, endpoint_tables in tables.items()
+            },
+            years,
+        )
@@ -1,24 +1,126 @@
 import asyncio
+import os
+import threading
+from datetime import date
+from typing import Dict, List, NamedTuple, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from tqdm.asyncio import tqdm
 
 from data_gathering.config.api_keys import APIKeys
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.data.analyst_estimates.get_analyst_estimates import (
+    AnalystEstimates,
+)
+from data_gathering.data.fundamentals.get_fundamentals import Fundamentals
 from data_gathering.data.upcoming_earnings.get_upcoming_earnings import UpcomingEarnings
-from data_gathering.utils import DateUtils
+from data_gathering.utils import DateUtils, get_logger
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.json_decoding import get_decoder
+from data_gathering.utils.metrics import Metrics, NullMetrics
+from data_gathering.utils.transform_executor import TransformExecutor
+from data_gathering.utils.rate_limiter import RateLimiter
+from data_gathering.utils.sharding import shard_name, shard_of
 from data_gathering.utils.output_utils.historical_data.historical_data_output_utils import (
     HistoricalDataOutputUtils as hdou,
 )
+from data_gathering.utils.output_utils.historical_data.historical_parquet_writer import (
+    HistoricalParquetWriter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_dataset_writer import (
+    HistoricalDatasetWriter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_features import (
+    HistoricalFeatures,
+)
+from data_gathering.utils.output_utils.historical_data.historical_json_exporter import (
+    HistoricalJSONExporter,
+)
+from data_gathering.utils.output_utils.fundamentals.fundamentals_dataset_writer import (
+    FundamentalsDatasetWriter,
+)
+from data_gathering.utils.output_utils.analyst_estimates.analyst_estimates_writer import (
+    AnalystEstimatesWriter,
+)
+from data_gathering.utils.cache.analyst_estimates_cache import AnalystEstimatesCache
 from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+from data_gathering.utils.cache.high_water_marks import HighWaterMarkCache
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.cache.run_journal import RunJournal
 
 from .historical_prices.upcoming_earnings_history import HistoricalData
 
+logger = get_logger(__name__)
+
+
+# marks the end of a queue, every consumer puts it back for the other consumers
+DONE = object()
+
+
+async def drain(queue: asyncio.Queue):
+    # yields the items of a queue until it is DONE
+    while (item := await queue.get()) is not DONE:
+        yield item
+    queue.put_nowait(DONE)
+
+
+def drain_nowait(queue: asyncio.Queue) -> list:
+    # the items left on a queue once its consumers are gone
+    items = []
+    while not queue.empty():
+        if (item := queue.get_nowait()) is not DONE:
+            items.append(item)
+    return items
+
+
+class FetchedBatch(NamedTuple):
+    # follows the pages of a batch through the page queue, once it arrives the bars
+    # of its symbols are all buffered
+    symbols: List[str]
+
 
 class DataFetcher:
-    def __init__(self):
-        self.api_keys = APIKeys.from_config_file()
-        self.semaphore = asyncio.Semaphore(4)
-        self.cache = BlacklistSymbolCache()
+    def __init__(self, config: PipelineConfig = None, api_keys: APIKeys = None):
+        self.config = config or PipelineConfig()
+        self.api_keys = api_keys or APIKeys.from_config_file()
+        # records nothing unless the run's metrics are enabled
+        self.metrics = Metrics() if self.config.metrics else NullMetrics()
+        self.http = ProviderSessions(self.config.provider_concurrency)
+        self.decoder = get_decoder(self.config.json_decoder)
+        self.transform_executor = TransformExecutor(
+            self.config.transform_executor, self.config.transform_workers
+        )
+        self.rate_limiter = RateLimiter.from_api_keys(
+            self.api_keys, share=self.config.quota_share
+        )
+        self.cache = BlacklistSymbolCache(cache_dir=self.config.cache_dir)
+        # the shards of a run share the caches but each keeps its own progress
+        state_suffix = (
+            f"_{shard_name(self.config.shard_index, self.config.shard_count)}"
+            if self.config.sharded
+            else ""
+        )
+        self.response_cache = (
+            ResponseCache(cache_dir=self.config.cache_dir, offline=self.config.offline)
+            if self.config.response_cache
+            else None
+        )
+        # the progress of the run, lets a failed run be resumed
+        self.journal = (
+            RunJournal(
+                cache_dir=self.config.cache_dir,
+                db_file=f"run_journal{state_suffix}.sqlite3",
+            )
+            if self.config.journal
+            else None
+        )
+        # symbols stored by the run that is resumed, they are not fetched again
+        self.skip_symbols = set()
+        # the earnings date of every symbol put on the queues
+        self.earnings_dates: Dict[str, str] = {}
 
         # Initialize date ranges
         self.history_dates = DateUtils.get_dates(
@@ -31,9 +133,35 @@ class DataFetcher:
             init_offset=1, date_window=14, date_window_unit="days", init_unit="days"
         )
 
-        # TODO: later add config option for this
-        self.hist_json = False
-        self.hist_parquet = True
+        self.hist_writers = []
+        if self.config.hist_parquet:
+            self.hist_writers.append(
+                HistoricalParquetWriter(
+                    self.config.hist_parquet_path,
+                    append=self.config.hist_incremental or self.config.resume,
+                )
+            )
+        if self.config.hist_dataset:
+            self.hist_writers.append(
+                HistoricalDatasetWriter(self.config.hist_dataset_path)
+            )
+
+        self.high_water_marks = HighWaterMarkCache(
+            cache_dir=self.config.cache_dir,
+            pickle_file=os.path.join(
+                self.cache.cache_dir, f"high_water_marks{state_suffix}.pkl"
+            ),
+        )
+        self.load_high_water_marks()
+        # marks of the written bars, bars arrive in ascending order so later writes win
+        self.new_high_water_marks = {}
+        # symbols whose bars are all buffered, and those whose bars are all written
+        # but only stored once the writers are closed
+        self.buffered_symbols: List[str] = []
+        self.stored_symbols: List[str] = []
+        # held while a table is written, a failed run waits for the write in flight
+        self.write_lock = threading.Lock()
+        self.write_failed = False
 
         # Instantiate classes
         self.historical_data = HistoricalData(
@@ -42,69 +170,474 @@ class DataFetcher:
             self.history_dates.to_date,
             self.cache,
             self,
+            self.high_water_marks,
+            self.decoder,
+            self.transform_executor,
+            self.config.alpaca_base_url,
+            self.metrics,
+        )
+        self.upcoming_earnings = UpcomingEarnings(
+            self.api_keys,
+            self.cache,
+            self.rate_limiter,
+            self.response_cache,
+            self.http,
+            self.config.calendar_chunk_days,
+            self.decoder,
+            base_url=self.config.fmp_base_url,
+            metrics=self.metrics,
+        )
+        self.fundamentals = Fundamentals(
+            self.api_keys,
+            self.rate_limiter,
+            self.response_cache,
+            self.http,
+            base_url=self.config.fmp_bulk_base_url,
+            period=self.config.fundamentals_period,
+            metrics=self.metrics,
         )
-        self.upcoming_earnings = UpcomingEarnings(self.api_keys, self.cache)
+        self.analyst_estimates = None
+        if self.config.analyst_estimates:
+            self.analyst_estimates = AnalystEstimates(
+                self.api_keys,
+                AnalystEstimatesCache(
+                    cache_dir=self.config.cache_dir,
+                    ttl=self.config.estimates_ttl,
+                    max_ttl=self.config.estimates_max_ttl,
+                ),
+                self.rate_limiter,
+                self.response_cache,
+                self.http,
+                self.decoder,
+                base_url=self.config.fmp_base_url,
+                bulk_base_url=self.config.fmp_bulk_base_url,
+                near_earnings_days=self.config.estimates_near_earnings_days,
+                near_earnings_ttl=self.config.estimates_near_earnings_ttl,
+                metrics=self.metrics,
+            )
 
     async def fetch_all_data(self):
+        """
+        Fetches the data of every upcoming earning as a pipeline of stages:
+
+            earnings calendar -> symbol batches -> historical bars workers
+                -> column buffers -> writers
+            earnings calendar -> other data workers
+            earnings calendar -> stale analyst estimates -> estimates dataset
+            bulk fundamentals -> fundamentals dataset
 
-        async def fetch_with_semaphore(symbol, func, **kwargs):
-            async with self.semaphore:
-                await func(symbol, **kwargs)
+        Once the bars are stored, the volatility features of every symbol are
+        computed from them if config.features is set.
+
+        The stages are connected by bounded queues, so a slow stage makes the stages
+        in front of it wait instead of letting the buffered data grow.
+
+        If a stage fails, the bars fetched so far are stored and the run is marked
+        failed in the journal, a run with config.resume set then only fetches the
+        symbols that were not stored.
+        """
+        config = self.config
+        symbol_queue = asyncio.Queue(config.symbol_queue_size)
+        other_queue = asyncio.Queue(config.symbol_queue_size)
+        batch_queue = asyncio.Queue(config.batch_queue_size)
+        page_queue = asyncio.Queue(config.page_queue_size)
+        write_queue = asyncio.Queue(config.write_queue_size)
+        # the estimates stage takes every symbol before it starts, so it never
+        # holds the other stages back
+        estimates_queue = asyncio.Queue()
+
+        sampler = None
+        if self.metrics.enabled:
+            sampler = asyncio.create_task(
+                self.sample_queues(
+                    symbols=symbol_queue,
+                    other=other_queue,
+                    batches=batch_queue,
+                    pages=page_queue,
+                    writes=write_queue,
+                    estimates=estimates_queue,
+                )
+            )
+
+        if self.journal is not None:
+            self.journal.start_run(resume=config.resume)
+            if self.journal.resumed:
+                self.skip_symbols = self.journal.symbols("written")
+                logger.info(
+                    f"Resuming run {self.journal.run_id}, "
+                    f"{len(self.skip_symbols)} symbols are already stored"
+                )
 
         try:
-            # Get upcoming earnings with generator
-            async for upcoming_earning in tqdm(
-                self.upcoming_earnings.get_upcoming_earnings(
-                    self.upcoming_dates.from_date, self.upcoming_dates.to_date
-                ),
-                desc="Fetching data",
-                unit=" symbols",
-                leave=False,
-            ):
-                symbol = str(upcoming_earning.symbol)
-                if self.cache.is_blacklisted(symbol):
-                    continue
-
-                # Fetch all types of data for the symbol concurrently
-                await asyncio.gather(
-                    fetch_with_semaphore(
-                        symbol,
+            # an error in any stage cancels the others
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(
+                    self.produce_symbols(
+                        symbol_queue,
+                        other_queue,
+                        *([estimates_queue] if self.analyst_estimates else []),
+                    )
+                )
+                task_group.create_task(self.batch_symbols(symbol_queue, batch_queue))
+                task_group.create_task(
+                    self.run_workers(
                         self.fetch_historical_data,
-                        historical_data=self.historical_data,
-                    ),
-                    fetch_with_semaphore(symbol, self.fetch_fundamental_metrics),
-                    fetch_with_semaphore(symbol, self.fetch_analyst_estimates),
-                    fetch_with_semaphore(
-                        symbol, self.fetch_market_sentiment_indicators
-                    ),
-                    fetch_with_semaphore(symbol, self.fetch_industry_sector_data),
-                    fetch_with_semaphore(symbol, self.fetch_company_news_events),
-                    fetch_with_semaphore(symbol, self.fetch_volatility_trading_volume),
-                    fetch_with_semaphore(symbol, self.fetch_earnings_call_transcripts),
+                        config.hist_workers,
+                        batch_queue,
+                        page_queue,
+                    )
                 )
-
-                if len(self.historical_data.data_by_symbol) >= 150:
-                    break
+                task_group.create_task(
+                    self.run_workers(
+                        self.fetch_other_data, config.other_workers, other_queue
+                    )
+                )
+                task_group.create_task(self.buffer_bars(page_queue, write_queue))
+                task_group.create_task(self.write_bars(write_queue))
+                if config.fundamentals:
+                    task_group.create_task(self.fetch_fundamental_metrics())
+                if self.analyst_estimates is not None:
+                    task_group.create_task(
+                        self.fetch_analyst_estimates(estimates_queue)
+                    )
 
             await self.process_historical_data()
+            if config.features:
+                await self.compute_features()
+            if self.journal is not None:
+                self.journal.finish_run()
+
+        except BaseException:
+            self.save_partial_bars(page_queue, write_queue)
+            if self.journal is not None:
+                self.journal.finish_run("failed")
+                logger.warning(
+                    f"Run {self.journal.run_id} failed, "
+                    f"{dict(self.journal.counts())}, resume it to fetch the rest"
+                )
+            raise
 
         finally:
-            pass
+            # symbols blacklisted since the last batch are kept even if the run failed
+            self.cache.flush()
+            await self.http.close()
+            self.transform_executor.shutdown()
+            if sampler is not None:
+                sampler.cancel()
+                self.metrics.report(config.metrics, config.metrics_path)
 
-            # if self.hist_json:
-            #    await self.write_json_files()
+    async def sample_queues(self, **queues: asyncio.Queue):
+        # a full queue sits in front of the bottleneck, an empty one behind it
+        while True:
+            for name, queue in queues.items():
+                self.metrics.set_gauge("queue_depth", queue.qsize(), queue=name)
+            await asyncio.sleep(self.config.metrics_interval)
 
-    async def fetch_historical_data(self, symbol, historical_data):
-        await historical_data.fetch_historical_data(symbol)
-        # await self.process_historical_data(symbol, symbol_historical_data)
+    async def produce_symbols(self, *queues: asyncio.Queue):
+        """
+        Puts the symbol of every upcoming earning that is not blacklisted on the queues,
+        only the symbols of its shard if the run is sharded.
+        """
+        config = self.config
+        shard_index, shard_count = config.shard_index, config.shard_count
+        symbol_count = 0
+        async for upcoming_earning in tqdm(
+            self.upcoming_earnings.get_upcoming_earnings(
+                self.upcoming_dates.from_date, self.upcoming_dates.to_date
+            ),
+            desc="Fetching data",
+            unit=" symbols",
+            leave=False,
+        ):
+            symbol = str(upcoming_earning.symbol)
+            # the other shards fetch the rest of the universe
+            if config.sharded and shard_of(symbol, shard_count) != shard_index:
+                continue
+            if symbol in self.skip_symbols or self.cache.is_blacklisted(symbol):
+                continue
 
-    async def fetch_fundamental_metrics(self, symbol):
-        # Fetch fundamental metrics data and process it
-        pass
+            self.earnings_dates[symbol] = upcoming_earning.earnings_date
+            for queue in queues:
+                await queue.put(symbol)
 
-    async def fetch_analyst_estimates(self, symbol):
-        # Fetch analyst estimates data and process it
-        pass
+            symbol_count += 1
+            self.metrics.increment("symbols")
+            if config.max_symbols and symbol_count >= config.max_symbols:
+                break
+
+        for queue in queues:
+            await queue.put(DONE)
+
+    async def batch_symbols(
+        self, symbol_queue: asyncio.Queue, batch_queue: asyncio.Queue
+    ):
+        """
+        Groups the symbols into batches for the historical bars requests.
+
+        A batch is sent once it is full, or once no symbol arrived for
+        hist_batch_timeout seconds so a stalled producer does not hold it back.
+        """
+        batch = []
+        while True:
+            try:
+                symbol = await asyncio.wait_for(
+                    symbol_queue.get(),
+                    self.config.hist_batch_timeout if batch else None,
+                )
+            except asyncio.TimeoutError:
+                await batch_queue.put(batch)
+                batch = []
+                continue
+
+            if symbol is DONE:
+                break
+
+            batch.append(symbol)
+            if len(batch) >= self.config.hist_batch_size:
+                await batch_queue.put(batch)
+                batch = []
+
+        if batch:
+            await batch_queue.put(batch)
+        await batch_queue.put(DONE)
+
+    async def run_workers(
+        self,
+        worker,
+        worker_count: int,
+        in_queue: asyncio.Queue,
+        out_queue: asyncio.Queue = None,
+    ):
+        """
+        Runs worker_count copies of a worker on a queue and ends the out queue once
+        they are all done.
+        """
+        async with asyncio.TaskGroup() as task_group:
+            for _ in range(worker_count):
+                task_group.create_task(worker(in_queue, out_queue))
+
+        if out_queue is not None:
+            await out_queue.put(DONE)
+
+    async def fetch_historical_data(
+        self, batch_queue: asyncio.Queue, page_queue: asyncio.Queue
+    ):
+        failed_symbols = self.historical_data.failed_symbols
+        async for symbols in drain(batch_queue):
+            async for page in self.historical_data.iter_batch_pages(symbols):
+                await page_queue.put(page)
+
+            fetched = [symbol for symbol in symbols if symbol not in failed_symbols]
+            if self.journal is not None:
+                if failed := [symbol for symbol in symbols if symbol in failed_symbols]:
+                    self.journal.set_status(failed, "failed")
+                if fetched:
+                    self.journal.set_status(fetched, "fetched")
+            await page_queue.put(FetchedBatch(fetched))
+
+    async def fetch_other_data(self, symbol_queue: asyncio.Queue, _=None):
+        async for symbol in drain(symbol_queue):
+            # Fetch all other types of data for the symbol concurrently
+            await asyncio.gather(
+                self.fetch_market_sentiment_indicators(symbol),
+                self.fetch_industry_sector_data(symbol),
+                self.fetch_company_news_events(symbol),
+                self.fetch_earnings_call_transcripts(symbol),
+            )
+
+    async def buffer_bars(self, page_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        """
+        Adds the pages to the column buffers and hands them to the writers as a table
+        whenever they grow past hist_memory_limit.
+        """
+        bars = self.historical_data.bars
+        async for page in drain(page_queue):
+            if isinstance(page, FetchedBatch):
+                self.buffered_symbols.extend(page.symbols)
+                continue
+
+            with self.metrics.time("stage_seconds", stage="buffer"):
+                bars.extend(page)
+            self.metrics.increment("rows", len(page), stage="buffer")
+            self.metrics.set_gauge("buffer_bytes", bars.nbytes)
+            if self.hist_writers and bars.nbytes >= self.config.hist_memory_limit:
+                await write_queue.put(await self.take_bars())
+
+        if self.hist_writers and (len(bars) or self.buffered_symbols):
+            await write_queue.put(await self.take_bars())
+        await write_queue.put(DONE)
+
+    async def take_bars(self) -> Tuple[pa.Table, List[str]]:
+        # moves the buffered bars into a table, nothing else touches the buffers
+        # meanwhile and arrow builds the columns without the GIL
+        bars = self.historical_data.bars
+        if len(bars):
+            logger.debug(
+                f"Flushing {len(bars)} bars held in {bars.nbytes / 1024**2:.1f} MiB, "
+                f"{bars.nbytes / len(bars):.0f} bytes per bar"
+            )
+        with self.metrics.time("stage_seconds", stage="combine"):
+            table = await asyncio.to_thread(bars.to_arrow)
+        return self.clear_bars(table)
+
+    def clear_bars(self, table: pa.Table) -> Tuple[pa.Table, List[str]]:
+        """
+        Empties the buffers once their bars were moved into table.
+
+        Returns:
+            Tuple[pa.Table, List[str]]: The table and the symbols whose last bars it
+                holds.
+        """
+        self.historical_data.bars.clear()
+        symbols, self.buffered_symbols = self.buffered_symbols, []
+        return table, symbols
+
+    async def write_bars(self, write_queue: asyncio.Queue):
+        async for table, symbols in drain(write_queue):
+            # arrow releases the GIL while writing so the fetches keep going
+            await asyncio.to_thread(self.write_table, table, symbols)
+
+    def write_table(self, table: pa.Table, symbols: List[str]):
+        """
+        Writes a table with every writer, then records the marks of its bars and the
+        symbols whose bars are now all written.
+
+        Args:
+            table (pa.Table): The bars.
+            symbols (List[str]): The symbols whose last bars are in the table.
+        """
+        # a cancelled run does not stop the thread, the lock makes it wait for it
+        with self.write_lock:
+            try:
+                for writer in self.hist_writers:
+                    with self.metrics.time(
+                        "stage_seconds", stage="write", writer=type(writer).__name__
+                    ):
+                        writer.write(table)
+            except BaseException:
+                self.write_failed = True
+                raise
+            self.new_high_water_marks.update(hdou.last_timestamps(table))
+            self.stored_symbols.extend(symbols)
+        self.metrics.increment("rows", table.num_rows, stage="write")
+
+    def save_partial_bars(self, page_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        """
+        Stores the bars fetched before a failure so a resumed run does not fetch them
+        again: the tables waiting to be written, the buffered bars and the pages still
+        queued are written and the writers closed.
+
+        Without a journal, or if writing itself failed, the writers are aborted instead
+        and the stored output is left as it was.
+        """
+        if self.journal is None or self.write_failed:
+            for writer in self.hist_writers:
+                writer.abort()
+            return
+        if not self.hist_writers:
+            return
+
+        try:
+            # the queued tables were taken from the buffers before the buffered bars
+            for table, symbols in drain_nowait(write_queue):
+                self.write_table(table, symbols)
+            bars = self.historical_data.bars
+            for page in drain_nowait(page_queue):
+                if isinstance(page, FetchedBatch):
+                    self.buffered_symbols.extend(page.symbols)
+                else:
+                    bars.extend(page)
+            self.write_table(*self.clear_bars(bars.to_arrow()))
+
+            for writer in self.hist_writers:
+                writer.close()
+            self.record_stored_bars()
+            logger.info(
+                f"Stored the bars of {len(self.journal.symbols('written'))} symbols "
+                "fetched before the failure"
+            )
+        except Exception:
+            logger.exception("Could not store the bars fetched before the failure")
+            for writer in self.hist_writers:
+                writer.abort()
+
+    def record_stored_bars(self):
+        # only move the marks and the journal once the writers are closed
+        self.high_water_marks.update(self.new_high_water_marks)
+        self.high_water_marks.save_marks_to_pickle()
+        self.new_high_water_marks = {}
+        if self.journal is not None and self.stored_symbols:
+            self.journal.set_status(self.stored_symbols, "written")
+        self.stored_symbols = []
+
+    def load_high_water_marks(self):
+        # the marks describe the stored bars, so every enabled output has to exist
+        stored_outputs = []
+        if self.config.hist_parquet:
+            stored_outputs.append(self.config.hist_parquet_path)
+        if self.config.hist_dataset:
+            stored_outputs.append(
+                os.path.join(self.config.hist_dataset_path, "_metadata")
+            )
+
+        if not (
+            (self.config.hist_incremental or self.config.resume)
+            and stored_outputs
+            and all(os.path.exists(path) for path in stored_outputs)
+        ):
+            # without them everything is fetched again
+            self.high_water_marks.clear()
+        elif not self.high_water_marks.marks:
+            # rebuild lost marks from the stored bars so they are not appended twice
+            if self.config.hist_parquet:
+                stored_bars = pq.read_table(
+                    self.config.hist_parquet_path, columns=["symbol", "timestamp"]
+                )
+            else:
+                stored_bars = HistoricalDatasetWriter.dataset(
+                    self.config.hist_dataset_path
+                ).to_table(columns=["symbol", "timestamp"])
+            self.high_water_marks.update(hdou.last_timestamps(stored_bars))
+
+    async def fetch_fundamental_metrics(self):
+        """
+        Refreshes the fundamentals of every company from FMP's bulk endpoints, a few
+        requests per year however many symbols there are, and writes them to
+        config.fundamentals_path.
+        """
+        this_year = date.today().year
+        years = list(
+            range(this_year - self.config.fundamentals_years + 1, this_year + 1)
+        )
+        with self.metrics.time("stage_seconds", stage="fundamentals"):
+            fundamentals = await self.fundamentals.fetch(years)
+            writer = FundamentalsDatasetWriter(self.config.fundamentals_path)
+            await asyncio.to_thread(writer.write, fundamentals)
+        self.metrics.increment("rows", fundamentals.num_rows, stage="fundamentals")
+        logger.info(
+            f"Wrote {fundamentals.num_rows} fundamentals of "
+            f"{len(pc.unique(fundamentals.column('symbol')))} symbols to "
+            f"{self.config.fundamentals_path}"
+        )
+
+    async def fetch_analyst_estimates(self, symbol_queue: asyncio.Queue):
+        """
+        Refreshes the analyst estimates of the upcoming earnings whose stored ones
+        are stale, those reporting soonest first, and appends the ones that changed
+        to config.estimates_path.
+        """
+        # the due symbols are ordered across the whole calendar
+        symbols = [symbol async for symbol in drain(symbol_queue)]
+        changed, digests = await self.analyst_estimates.fetch(
+            {symbol: self.earnings_dates[symbol] for symbol in symbols},
+            self.config.estimates_max_symbols,
+            self.config.estimates_workers,
+        )
+        writer = AnalystEstimatesWriter(self.config.estimates_path)
+        await asyncio.to_thread(writer.write, changed)
+        # only stored estimates count as seen, a failed write leaves them due
+        self.analyst_estimates.cache.record(digests)
+        self.metrics.increment("rows", changed.num_rows, stage="estimates")
 
     async def fetch_market_sentiment_indicators(self, symbol):
         # Fetch market sentiment indicators data and process it
@@ -118,9 +651,33 @@ class DataFetcher:
         # Fetch company news and events data for the symbol and process it
         pass
 
-    async def fetch_volatility_trading_volume(self, symbol):
-        # Fetch volatility and trading volume data for the symbol and process it
-        pass
+    async def compute_features(self):
+        """
+        Computes the volatility and volume features of every symbol from the stored
+        bars, the whole history and not only the bars of this run, and writes them to
+        config.features_path.
+        """
+        if self.config.hist_parquet:
+            source = self.config.hist_parquet_path
+        elif self.config.hist_dataset:
+            source = self.config.hist_dataset_path
+        else:
+            source = await asyncio.to_thread(self.historical_data.bars.to_arrow)
+        if isinstance(source, str) and not os.path.exists(source):
+            logger.warning(f"No bars stored in {source}, skipping the features")
+            return
+
+        with self.metrics.time("stage_seconds", stage="features"):
+            features = await asyncio.to_thread(
+                HistoricalFeatures.compute, source, self.config.features_window
+            )
+            await asyncio.to_thread(
+                HistoricalFeatures.write, features, self.config.features_path
+            )
+        self.metrics.increment("rows", len(features), stage="features")
+        logger.info(
+            f"Wrote the features of {len(features)} bars to {self.config.features_path}"
+        )
 
     async def fetch_earnings_call_transcripts(self, symbol):
         # Fetch earnings call transcripts for the symbol and process them
@@ -128,22 +685,37 @@ class DataFetcher:
 
     # Define a function to process historical data
     async def process_historical_data(self):
-        # Concatenate all DataFrames into a single DataFrame, with a multiindex of Datetime and Symbol
-        combined_historical_df = hdou.combine_dataframes(
-            self.historical_data.data_by_symbol
-        )
+        self.cache.flush()
 
-        print(combined_historical_df.info(verbose=True))
-        # print(combined_hist_df.info(show_counts=True))
-        # pickle for testing
-        # combined_historical_df.to_pickle("output/output_dataframe.pkl")
+        if self.hist_writers:
+            for writer in self.hist_writers:
+                await asyncio.to_thread(writer.close)
+                logger.info(
+                    f"Wrote {writer.rows_written} bars with {type(writer).__name__}"
+                )
 
-        if self.hist_json:
-            hdou.output_combined_symbol_df_to_json(
-                combined_historical_df, "output.json"
-            )
+            self.record_stored_bars()
 
-        if self.hist_parquet:
-            combined_historical_df.to_parquet(
-                "output/historical_data.parquet", compression="zstd", engine="pyarrow"
+        if self.config.hist_json:
+            # export from the stored output, the bars are only kept in memory without it
+            if self.config.hist_parquet:
+                source = self.config.hist_parquet_path
+            elif self.config.hist_dataset:
+                source = self.config.hist_dataset_path
+            else:
+                source = await asyncio.to_thread(self.historical_data.bars.to_arrow)
+
+            if isinstance(source, str) and not os.path.exists(source):
+                logger.warning(f"No bars stored in {source}, skipping the JSON export")
+                return
+
+            exporter = HistoricalJSONExporter(
+                self.config.hist_json_path,
+                self.config.hist_json_format,
+                max_rows=self.config.hist_json_max_rows,
+            )
+            with self.metrics.time("stage_seconds", stage="export"):
+                await asyncio.to_thread(exporter.export, source)
+            logger.info(
+                f"Exported {exporter.rows_written} bars to {self.config.hist_json_path}"
             )
@@ -0,0 +1,198 @@
+from array import array
+from itertools import chain, repeat
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from data_gathering.models.mappings import historical_data_typecodes
+from data_gathering.models.symbol_registry import SymbolRegistry
+from data_gathering.utils.json_decoding import JSONDecoder, get_decoder
+
+
+class BarBuffer:
+    """
+    Collects bars straight into typed per-column buffers instead of a dict per bar.
+
+    The symbol column is dictionary encoded, each row only stores the ID of its
+    symbol in the registry. Timestamps are parsed a page at a time into UTC epoch
+    nanoseconds, which take 8 bytes per row instead of about 77 as strings.
+
+    Attributes:
+        registry (SymbolRegistry): The registry of the symbol IDs. Buffers that share
+            one use the same codes.
+        symbol_codes (array): The registry ID of the symbol of every row.
+        timestamps (array): The timestamp of every row in UTC epoch nanoseconds.
+        columns (Dict[str, array]): The numeric columns by name.
+        received_symbols (set): The symbols that received at least one bar.
+    """
+
+    def __init__(self, registry: Optional[SymbolRegistry] = None) -> None:
+        self.registry = registry or SymbolRegistry()
+        self.received_symbols = set()
+        self.clear()
+
+    def clear(self):
+        # the registry is kept so codes stay the same between flushes
+        self.symbol_codes = array("i")
+        self.timestamps = array("q")
+        self.columns: Dict[str, array] = {
+            name: array(typecode)
+            for name, typecode in historical_data_typecodes.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.symbol_codes)
+
+    @property
+    def symbols(self) -> List[str]:
+        return self.registry.tickers
+
+    def symbol_code(self, symbol: str) -> int:
+        return self.registry.id(symbol)
+
+    def append(self, symbol: str, bars: List[Dict[str, Any]]):
+        """
+        Appends the raw bars of one symbol column by column.
+
+        Args:
+            symbol (str): The symbol the bars belong to.
+            bars (List[Dict[str, Any]]): The bars as returned by the bars endpoint.
+        """
+        if bars:
+            self.append_columns(symbol, JSONDecoder.bars_to_columns(bars))
+
+    def append_columns(self, symbol: str, columns: Mapping[str, Sequence[Any]]):
+        """
+        Appends the bars of one symbol that were already decoded into columns.
+
+        Args:
+            symbol (str): The symbol the bars belong to.
+            columns (Mapping[str, Sequence[Any]]): The timestamp and numeric columns
+                as returned by JSONDecoder.decode_bars.
+        """
+        self.append_page({symbol: columns})
+
+    def append_page(self, page: Mapping[str, Mapping[str, Sequence[Any]]]):
+        """
+        Appends the columns of every symbol of a decoded page, parsing the timestamps
+        of the whole page in one call.
+        """
+        page = {
+            symbol: columns for symbol, columns in page.items() if columns["timestamp"]
+        }
+        if not page:
+            return
+
+        self.timestamps.frombytes(
+            parse_timestamps(
+                list(chain.from_iterable(c["timestamp"] for c in page.values()))
+            ).tobytes()
+        )
+        for symbol, columns in page.items():
+            self.symbol_codes.extend(
+                repeat(self.symbol_code(symbol), len(columns["timestamp"]))
+            )
+            for name, column in self.columns.items():
+                column.extend(columns[name])
+            self.received_symbols.add(symbol)
+
+    def extend(self, other: "BarBuffer"):
+        """
+        Appends the rows of another buffer, e.g. a page decoded in a worker process.
+
+        The other buffer's symbol codes are translated into this buffer's registry
+        unless they share it, the columns are copied as whole arrays.
+        """
+        if not len(other):
+            return
+
+        if other.registry is self.registry:
+            self.symbol_codes.extend(other.symbol_codes)
+        else:
+            code_map = self.registry.ids(other.symbols)
+            other_codes = np.frombuffer(other.symbol_codes, dtype=np.int32)
+            self.symbol_codes.frombytes(code_map[other_codes].tobytes())
+        self.timestamps.extend(other.timestamps)
+        for name, column in self.columns.items():
+            column.extend(other.columns[name])
+        self.received_symbols.update(other.received_symbols)
+
+    @property
+    def nbytes(self) -> int:
+        # the memory held by the column buffers
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.symbol_codes, self.timestamps, *self.columns.values())
+        )
+
+    def to_arrow(self) -> pa.Table:
+        """
+        Converts the buffer into an arrow table.
+
+        Returns:
+            pa.Table: The bars with a dictionary encoded symbol column and UTC timestamps.
+        """
+        codes = np.frombuffer(self.symbol_codes, dtype=np.int32)
+        # the dictionary holds the symbols of this buffer in the order of their IDs,
+        # unused entries would be stored in every row group and widen its statistics
+        present = np.zeros(len(self.registry), dtype=bool)
+        present[codes] = True
+        indices = (np.cumsum(present, dtype=np.int32) - 1)[codes]
+        symbol = pa.DictionaryArray.from_arrays(
+            pa.array(indices),
+            pa.array(self.symbols, pa.string()).take(np.flatnonzero(present)),
+        )
+        timestamp = pa.array(np.array(self.timestamps, dtype=np.int64)).cast(
+            pa.timestamp("ns", tz="UTC")
+        )
+        arrays = {"symbol": symbol, "timestamp": timestamp}
+        for name, column in self.columns.items():
+            # copied so the buffers can keep growing after the conversion
+            arrays[name] = pa.array(np.array(column, dtype=np.dtype(column.typecode)))
+        return pa.table(arrays)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Converts the buffer into a DataFrame indexed by symbol and timestamp.
+
+        Returns:
+            pd.DataFrame: The bars with a categorical symbol index level.
+        """
+        df = self.to_arrow().to_pandas()
+        return df.set_index(["symbol", "timestamp"])
+
+
+def parse_timestamps(timestamps: Sequence[str]) -> np.ndarray:
+    """
+    Parses RFC 3339 timestamps, e.g. "2023-01-03T05:00:00Z", into UTC epoch
+    nanoseconds with arrow's vectorized parser.
+    """
+    parsed = pa.array(timestamps, pa.string()).cast(pa.timestamp("ns", tz="UTC"))
+    return parsed.to_numpy(zero_copy_only=False).view(np.int64)
+
+
+def decode_bars_page(
+    body: bytes, decoder_name: str = "auto"
+) -> Optional[Dict[str, Any]]:
+    """
+    Decodes a page of the bars endpoint into a column buffer. Defined at module level
+    so it can run in a TransformExecutor process pool.
+
+    Args:
+        body (bytes): The response body.
+        decoder_name (str, optional): The JSON decoder to use. Defaults to "auto".
+
+    Returns:
+        Dict[str, Any]: The page with the bars as a BarBuffer under "bars" and
+            "next_page_token".
+        None: If the body is not a page of bars.
+    """
+    page = get_decoder(decoder_name).decode_bars(body)
+    if page is None:
+        return None
+
+    bars = BarBuffer()
+    bars.append_page(page["bars"])
+    return {"bars": bars, "next_page_token": page["next_page_token"]}
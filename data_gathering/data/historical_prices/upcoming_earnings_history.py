@@ -1,14 +1,26 @@
 import asyncio
 import asyncio.staggered
-import json
 
-import aiohttp
 import pandas as pd
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, Iterable, List, Any
 from data_gathering.config.api_keys import APIKeys
 from data_gathering.models.mappings import historical_data_mapping
+from data_gathering.models.symbol_registry import symbol_registry
+from data_gathering.utils.cache.high_water_marks import HighWaterMarkCache
+from data_gathering.utils.cache.response_cache import OfflineCacheMiss
+from data_gathering.utils.http_sessions import RETRYABLE_ERRORS
+from data_gathering.utils.json_decoding import JSONDecoder, get_decoder
+from data_gathering.utils.logging import get_logger
+from data_gathering.utils.metrics import Metrics, NullMetrics
+from data_gathering.utils.transform_executor import TransformExecutor
 from collections import defaultdict
 
+from .bar_buffer import BarBuffer, decode_bars_page
+
+logger = get_logger(__name__)
+
+BARS_URL = "https://data.alpaca.markets/v2/stocks/bars"
+
 
 class HistoricalData:
     def __init__(
@@ -18,19 +30,35 @@ class HistoricalData:
         to_date,
         cache,
         data_fetcher,
+        high_water_marks: HighWaterMarkCache = None,
+        decoder: JSONDecoder = None,
+        executor: TransformExecutor = None,
+        base_url: str = BARS_URL,
+        metrics: Metrics = None,
     ) -> None:
         self.apca_key_id = api_keys.__getattribute__("apca_key_id")
         self.apca_api_secret_key = api_keys.__getattribute__("apca_api_secret_key")
         self.from_date = "1983-01-01"
         self.to_date = to_date
         self.cache = cache
-        self.base_url = "https://data.alpaca.markets/v2/stocks/bars"
-        self.rest_of_link = f"&timeframe=1Day&start={self.from_date}&end={self.to_date}&limit=10000&adjustment=raw&feed=sip&sort=asc"
-        self.data_by_symbol = defaultdict(list)
+        self.base_url = base_url
+        self.rest_of_link = f"&timeframe=1Day&end={self.to_date}&limit=10000&adjustment=raw&feed=sip&sort=asc"
+        # bar codes are the IDs of the shared registry
+        self.bars = BarBuffer(symbol_registry)
         self.session = None
         self.mapping = historical_data_mapping
         self.data_fetcher = data_fetcher
-        self.rate_limit_limit = 200
+        # last stored bar of each symbol, only the bars after it are requested
+        self.high_water_marks = high_water_marks
+        self.provider = "alpaca"
+        self.max_retries = 3
+        # decodes the pages straight into columns
+        self.decoder = decoder or get_decoder()
+        # the pages are decoded in the executor's pool, off the event loop
+        self.executor = executor or TransformExecutor("inline")
+        self.metrics = metrics or NullMetrics()
+        # symbols whose bars could not be fetched, they are fetched again on resume
+        self.failed_symbols = set()
 
     def get_headers(self):
         return {
@@ -44,81 +72,190 @@ class HistoricalData:
 
     async def get_session(self):
         if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.get_headers())
+            # the connection pool is shared with every other alpaca request
+            self.session = self.data_fetcher.http.session(
+                self.provider, headers=self.get_headers()
+            )
         return self.session
 
-    # TODO: use response headers to determine sleep time
+    def start_date(self, symbol: str) -> str:
+        if self.high_water_marks is None:
+            return self.from_date
+        return self.high_water_marks.start_date(symbol, self.from_date)
+
+    def build_url(self, symbols: Iterable[str], page_token=None, start=None) -> str:
+        # the bars endpoint takes a comma separated list of symbols
+        url = f"{self.base_url}?symbols={','.join(symbols)}&start={start or self.from_date}{self.rest_of_link}"
+        if page_token:
+            url += f"&page_token={page_token}"
+        return url
+
     async def fetch_data(self, symbol):
-        url = f"{self.base_url}?symbols={symbol}{self.rest_of_link}"
+        data = await self.fetch_batch([symbol])
+        return data or None
 
-        session = await self.get_session()
-        async with self.data_fetcher.semaphore:
-            async with session.get(url) as response:
-                data = await response.json()
-
-                # Handle rate limiting
-                rate_limit_remaining = int(
-                    response.headers.get("X-RateLimit-Remaining", 0)
-                )
-                print(f"Rate limit remaining: {rate_limit_remaining}")
-
-                if rate_limit_remaining <= 1:
-                    # Calculate sleep time to reset rate limit
-                    sleep_time = (
-                        60 / self.rate_limit_limit if self.rate_limit_limit > 0 else 1
-                    )
-                    print(
-                        f"Rate limit almost exceeded. Sleeping for {sleep_time} seconds."
+    async def fetch_batch(self, symbols: List[str], start=None) -> BarBuffer:
+        """
+        Fetches every page of bars for several symbols and merges them.
+
+        Args:
+            symbols (List[str]): The symbols to request together.
+            start (str, optional): The first date to fetch. Defaults to from_date.
+
+        Returns:
+            BarBuffer: The bars of every symbol. Symbols that returned no bars are left
+                out and added to the blacklist cache, unless a page failed, then the
+                symbols are added to failed_symbols instead.
+        """
+        bars = BarBuffer()
+        async for page in self.iter_pages(symbols, start):
+            bars.extend(page)
+        return bars
+
+    async def iter_pages(
+        self, symbols: List[str], start=None
+    ) -> AsyncIterator[BarBuffer]:
+        """
+        Yields the bars of each page as soon as the page arrives.
+
+        The limit on the bars endpoint applies to the whole response rather than to
+        each symbol, so the next_page_token is followed until every bar is received.
+        The request for the next page is already in flight while the caller handles
+        the current one.
+
+        Args:
+            symbols (List[str]): The symbols to request together.
+            start (str, optional): The first date to fetch. Defaults to from_date.
+
+        Yields:
+            BarBuffer: The bars of one page.
+        """
+        received_symbols = set()
+        next_page = asyncio.ensure_future(self.fetch_page(symbols, start=start))
+
+        try:
+            while next_page:
+                data = await next_page
+                next_page = None
+                if not data:
+                    # a failed page says nothing about the symbols, don't blacklist them
+                    self.failed_symbols.update(symbols)
+                    return
+
+                if page_token := data.get("next_page_token"):
+                    next_page = asyncio.ensure_future(
+                        self.fetch_page(symbols, page_token, start)
                     )
-                    await asyncio.sleep(sleep_time)
-
-                if "bars" not in data or not data["bars"]:
-                    # Add symbol to the cache if historical data is empty
-                    self.cache.add_symbol(symbol)
-                    return None
-
-                try:
-                    data = data["bars"]
-                    return data
-                except KeyError:
-                    # Add symbol to the cache if historical data retrieval fails
-                    return None
-
-    # TODO: Modify fetch_historical_data to return an Async Generator to use chunks
-    # Json normalize taking way too long
-    async def fetch_historical_data(self, symbol):
-        data = await self.fetch_data(symbol)
-        if data:
-            self.rename_columns(symbol, data)
-            self.format_data(data, self.data_by_symbol)
-
-    def rename_columns(self, symbol, response_data: Dict[str, List[Any]]):
-        # rename all columns using the mapping and add the symbol category
-        new_data = [
-            {
-                historical_data_mapping[key]: val
-                for key, val in bar.items()
-                if key in historical_data_mapping
-            }
-            | {"symbol": symbol}
-            for bar in response_data[symbol]
-        ]
-        response_data[symbol] = new_data
-
-    def format_data(self, response_data, data_by_symbol: defaultdict):
-        # format the data into the defaultdict
-        [
-            (
-                data_by_symbol[symbol].extend(data)
-                if isinstance(data, list)
-                else data_by_symbol.append(data)
+
+                if len(bars := data["bars"]):
+                    received_symbols.update(bars.received_symbols)
+                    yield bars
+        finally:
+            if next_page:
+                next_page.cancel()
+
+        for symbol in symbols:
+            if (
+                symbol not in received_symbols
+                and self.start_date(symbol) == self.from_date
+            ):
+                # Add symbol to the cache if historical data is empty
+                self.cache.add_symbol(symbol, reason="no historical data")
+
+    async def fetch_page(self, symbols: List[str], page_token=None, start=None):
+        url = self.build_url(symbols, page_token, start)
+        rate_limiter = self.data_fetcher.rate_limiter
+        response_cache = self.data_fetcher.response_cache
+
+        # raises OfflineCacheMiss in offline mode if the page was never stored
+        if response_cache and (body := response_cache.get(url)) is not None:
+            return await self.parse_page(body)
+
+        session = await self.get_session()
+        metrics = self.metrics
+        for attempt in range(self.max_retries + 1):
+            waited = await rate_limiter.acquire(self.provider)
+            metrics.increment(
+                "rate_limit_sleep_seconds", waited, provider=self.provider
             )
-            for symbol, data in response_data.items()
-        ]
+            async with self.data_fetcher.http.limit(self.provider):
+                with metrics.time("http_request_seconds", provider=self.provider):
+                    try:
+                        async with session.get(url) as response:
+                            # the rate limiter paces the following requests from the headers
+                            retry_after = rate_limiter.update_from_headers(
+                                self.provider, response.headers, response.status
+                            )
+                            metrics.increment(
+                                "requests",
+                                provider=self.provider,
+                                status=response.status,
+                            )
+                            if retry_after is not None:
+                                continue
+                            if response.status >= 500:
+                                logger.warning(
+                                    f"Bars request returned status {response.status}"
+                                )
+                                rate_limiter.backoff(self.provider, attempt)
+                                continue
+
+                            body = await response.read()
+                    except RETRYABLE_ERRORS as error:
+                        logger.warning(f"Bars request failed: {error!r}")
+                        metrics.increment("request_errors", provider=self.provider)
+                        rate_limiter.backoff(self.provider, attempt)
+                        continue
+            metrics.increment("bytes_downloaded", len(body), provider=self.provider)
+
+            data = await self.parse_page(body)
+            if data is not None and response_cache:
+                response_cache.set(url, body)
+            return data
+
+        return None
+
+    async def parse_page(self, body: bytes):
+        # None if the body is not a page of bars
+        with self.metrics.time("stage_seconds", stage="parse"):
+            return await self.executor.run(decode_bars_page, body, self.decoder.name)
+
+    async def fetch_historical_data(self, symbol):
+        await self.fetch_historical_data_batch([symbol])
+
+    async def fetch_historical_data_batch(self, symbols: List[str]):
+        # each page goes into the column buffers while the next one downloads
+        async for page in self.iter_batch_pages(symbols):
+            self.bars.extend(page)
+
+    async def iter_batch_pages(self, symbols: List[str]) -> AsyncIterator[BarBuffer]:
+        """
+        Yields the pages of bars for a batch of symbols, one request per start date.
+
+        Args:
+            symbols (List[str]): The symbols of the batch.
+
+        Yields:
+            BarBuffer: The bars of one page.
+        """
+        for start, symbols_group in self.group_by_start_date(symbols).items():
+            try:
+                async for page in self.iter_pages(symbols_group, start):
+                    yield page
+            except OfflineCacheMiss as error:
+                # nothing to replay for these symbols, they are not blacklisted
+                logger.warning(f"No cached bars for {symbols_group}: {error}")
+                self.failed_symbols.update(symbols_group)
 
-        return data_by_symbol
+    def group_by_start_date(self, symbols: List[str]) -> Dict[str, List[str]]:
+        # symbols in one request share the start date, up to date symbols are skipped
+        groups = defaultdict(list)
+        for symbol in symbols:
+            if (start := self.start_date(symbol)) <= self.to_date:
+                groups[start].append(symbol)
+        return groups
 
     async def finish(self):
         if self.session:
             await self.session.close()
-        self.cache.save_blacklist_to_pickle()
+        self.cache.flush()
@@ -0,0 +1,158 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.utils import get_logger
+from data_gathering.utils.output_utils.historical_data.historical_features import (
+    HistoricalFeatures,
+)
+from data_gathering.utils.output_utils.historical_data.historical_json_exporter import (
+    HistoricalJSONExporter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_shard_merger import (
+    HistoricalShardMerger,
+)
+from data_gathering.utils.sharding import shard_config
+
+from .gather_all_data import DataFetcher
+
+logger = get_logger(__name__)
+
+
+def run_shard(config: PipelineConfig, api_keys: Optional[APIKeys] = None) -> int:
+    """
+    Runs the fetch pipeline of one shard in its own event loop. Defined at module
+    level so it can run in a process pool, or on its own on another machine.
+
+    Returns:
+        int: The number of bars the shard wrote.
+    """
+    data_fetcher = DataFetcher(config, api_keys)
+    asyncio.run(data_fetcher.fetch_all_data())
+    return max((writer.rows_written for writer in data_fetcher.hist_writers), default=0)
+
+
+def quota_shares(shard_count: int, api_key_sets: int) -> List[float]:
+    # shard i uses key set i % api_key_sets and shares its quota with the other
+    # shards on that key set
+    return [
+        1 / len(range(index % api_key_sets, shard_count, api_key_sets))
+        for index in range(shard_count)
+    ]
+
+
+async def fetch_all_shards(
+    config: PipelineConfig,
+    shard_count: int,
+    api_keys: Optional[Sequence[APIKeys]] = None,
+    processes: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Splits the symbol universe into shard_count shards by a stable hash of the symbol,
+    fetches every shard in its own process and merges their output once all of them
+    finished.
+
+    Args:
+        config (PipelineConfig): The settings of the run, the shards write below
+            config.shard_dir and the merged output goes to the hist_*_path outputs.
+        shard_count (int): The number of shards.
+        api_keys (Sequence[APIKeys], optional): The API key sets the shards take turns
+            with, each set's quota is split among the shards using it. Defaults to the
+            keys of the config file.
+        processes (int, optional): The shards run at once. Defaults to shard_count.
+
+    Returns:
+        Dict[str, int]: The bars written by every shard and the merged output.
+    """
+    key_sets = list(api_keys or [None])
+    shares = quota_shares(shard_count, len(key_sets))
+    configs = [
+        shard_config(config, index, shard_count, shares[index])
+        for index in range(shard_count)
+    ]
+
+    loop = asyncio.get_running_loop()
+    # every shard starts a fresh interpreter, forking a running event loop is unsafe
+    with ProcessPoolExecutor(
+        processes or shard_count, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, run_shard, shard, key_sets[index % len(key_sets)]
+                )
+                for index, shard in enumerate(configs)
+            ),
+            return_exceptions=True,
+        )
+
+    failed = [
+        (shard, result)
+        for shard, result in zip(configs, results)
+        if isinstance(result, BaseException)
+    ]
+    if failed:
+        # the output of a partial universe is not merged, the failed shards keep
+        # their journal and are resumed with config.resume
+        for shard, error in failed:
+            logger.error(f"Shard {shard.shard_index} of {shard_count} failed: {error}")
+        raise ExceptionGroup(
+            f"{len(failed)} of {shard_count} shards failed",
+            [error for _, error in failed if isinstance(error, Exception)]
+            or [RuntimeError("a shard was interrupted")],
+        )
+
+    rows = {f"shard {index}": rows for index, rows in enumerate(results)}
+    rows["merged"] = await asyncio.to_thread(merge_shards, config, shard_count)
+    return rows
+
+
+def merge_shards(config: PipelineConfig, shard_count: int) -> int:
+    """
+    Merges the output of the shards of a run into the outputs of config, exports it
+    to JSON if config.hist_json is set and computes the features if config.features
+    is set.
+
+    Returns:
+        int: The number of bars in the merged output.
+    """
+    configs = [shard_config(config, index, shard_count) for index in range(shard_count)]
+
+    rows = 0
+    if config.hist_parquet:
+        rows = HistoricalShardMerger.merge_parquet(
+            [shard.hist_parquet_path for shard in configs], config.hist_parquet_path
+        )
+        logger.info(f"Merged {rows} bars of {shard_count} shards into a parquet file")
+    if config.hist_dataset:
+        rows = HistoricalShardMerger.merge_datasets(
+            [shard.hist_dataset_path for shard in configs], config.hist_dataset_path
+        )
+        logger.info(f"Merged {rows} bars of {shard_count} shards into a dataset")
+
+    source = (
+        config.hist_parquet_path if config.hist_parquet else config.hist_dataset_path
+    )
+    if config.features and os.path.exists(source):
+        features = HistoricalFeatures.compute(source, config.features_window)
+        HistoricalFeatures.write(features, config.features_path)
+        logger.info(
+            f"Wrote the features of {len(features)} bars to {config.features_path}"
+        )
+
+    if config.hist_json:
+        if os.path.exists(source):
+            exporter = HistoricalJSONExporter(
+                config.hist_json_path,
+                config.hist_json_format,
+                max_rows=config.hist_json_max_rows,
+            )
+            exporter.export(source)
+            logger.info(
+                f"Exported {exporter.rows_written} bars to {config.hist_json_path}"
+            )
+    return rows
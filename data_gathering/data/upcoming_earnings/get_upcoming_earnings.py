@@ -1,33 +1,55 @@
-import asyncio
-
-import fmpsdk
-
 from data_gathering.config.api_keys import APIKeys
-from data_gathering.models.symbols import Symbol
+from data_gathering.data.fmp_client import BASE_URL, FMPClient
+from data_gathering.models.symbol_registry import SymbolRegistry, symbol_registry
 from data_gathering.models.upcoming_earning import UpcomingEarning
+from data_gathering.utils.cache.response_cache import ResponseCache
 from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.json_decoding import JSONDecoder
+from data_gathering.utils.metrics import Metrics
+from data_gathering.utils.rate_limiter import RateLimiter
 
 
 class UpcomingEarnings:
-    def __init__(self, api_keys: APIKeys, cache: BlacklistSymbolCache):
-        self.api_key = api_keys.fmp_api_key
-        self.blacklist = cache.blacklist
+    def __init__(
+        self,
+        api_keys: APIKeys,
+        cache: BlacklistSymbolCache,
+        rate_limiter: RateLimiter = None,
+        response_cache: ResponseCache = None,
+        http: ProviderSessions = None,
+        chunk_days: int = 3,
+        decoder: JSONDecoder = None,
+        registry: SymbolRegistry = None,
+        base_url: str = BASE_URL,
+        metrics: Metrics = None,
+    ):
+        self.cache = cache
+        # interns the symbols and caches which ones are international
+        self.registry = registry or symbol_registry
+        self.client = FMPClient(
+            api_keys.fmp_api_key,
+            http,
+            rate_limiter or RateLimiter.from_api_keys(api_keys),
+            response_cache,
+            base_url=base_url,
+            decoder=decoder,
+            metrics=metrics,
+        )
+        # days of the calendar in each of the concurrent requests
+        self.chunk_days = chunk_days
 
-    async def get_upcoming_earnings(self, from_date, to_date):
-        async def upcoming_earnings_generator():
-            upcoming_earnings_list = await asyncio.to_thread(
-                fmpsdk.earning_calendar,
-                apikey=self.api_key,
-                from_date=from_date,
-                to_date=to_date,
-            )
+    async def fetch_earning_calendar(self, from_date, to_date):
+        return await self.client.earning_calendar(from_date, to_date)
 
+    async def get_upcoming_earnings(self, from_date, to_date):
+        # the earnings of each chunk are yielded as soon as its request finishes
+        async for upcoming_earnings_list in self.client.iter_earning_calendar(
+            from_date, to_date, self.chunk_days
+        ):
             for earning in upcoming_earnings_list:
                 if symbol := earning.get("symbol"):
-                    if not symbol in self.blacklist:
-                        symbol = Symbol.create(symbol)
+                    if not self.cache.is_blacklisted(symbol):
+                        symbol = self.registry.symbol(symbol)
                         if symbol and (earnings_date := earning.get("date")):
                             yield UpcomingEarning(symbol, earnings_date)
-
-        async for earnings in upcoming_earnings_generator():
-            yield earnings
@@ -1,4 +1,5 @@
 from .symbols import Symbol
+from .symbol_registry import SymbolRegistry, symbol_registry
 from .upcoming_earning import UpcomingEarning
 
-__all__ = ["Symbol", "UpcomingEarning"]
+__all__ = ["Symbol", "SymbolRegistry", "UpcomingEarning", "symbol_registry"]
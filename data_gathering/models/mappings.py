@@ -9,4 +9,74 @@ historical_data_mapping: Dict[str, str] = {
     "v": "volume",
     "n": "trade_count",
     "vw": "vwap",
-}
\ No newline at end of file
+}
+
+# array module typecodes of the numeric bar columns, "d" is a double and "q" a signed 64 bit int
+historical_data_typecodes: Dict[str, str] = {
+    "open": "d",
+    "high": "d",
+    "low": "d",
+    "close": "d",
+    "volume": "q",
+    "trade_count": "q",
+    "vwap": "d",
+}
+
+# values used when a bar is missing a field, by typecode
+historical_data_missing_values: Dict[str, float] = {
+    "d": float("nan"),
+    "q": 0,
+}
+
+# columns that identify a report in FMP's bulk fundamentals files, by FMP name
+fundamentals_key_mapping: Dict[str, str] = {
+    "symbol": "symbol",
+    "date": "date",
+    "calendarYear": "calendar_year",
+    "period": "period",
+}
+
+# the FMP bulk endpoints of the fundamentals and the columns taken from each
+fundamentals_mapping: Dict[str, Dict[str, str]] = {
+    "income-statement-bulk": {
+        "revenue": "revenue",
+        "eps": "eps",
+        "epsdiluted": "eps_diluted",
+    },
+    "ratios-bulk": {
+        "netProfitMargin": "net_profit_margin",
+        "priceEarningsRatio": "price_earnings_ratio",
+        "debtEquityRatio": "debt_equity_ratio",
+        "returnOnEquity": "return_on_equity",
+        "dividendYield": "dividend_yield",
+    },
+}
+
+# the FMP endpoints of the analyst estimates and the fields taken from each
+analyst_estimates_mapping: Dict[str, Dict[str, str]] = {
+    "analyst-estimates": {
+        "date": "estimate_date",
+        "estimatedEpsAvg": "eps_avg",
+        "estimatedEpsLow": "eps_low",
+        "estimatedEpsHigh": "eps_high",
+        "numberAnalystsEstimatedEps": "eps_analysts",
+        "estimatedRevenueAvg": "revenue_avg",
+        "estimatedRevenueLow": "revenue_low",
+        "estimatedRevenueHigh": "revenue_high",
+        "numberAnalystEstimatedRevenue": "revenue_analysts",
+    },
+    "price-target-consensus": {
+        "targetConsensus": "target_consensus",
+        "targetMedian": "target_median",
+        "targetHigh": "target_high",
+        "targetLow": "target_low",
+    },
+    "upgrades-downgrades-consensus": {
+        "strongBuy": "strong_buy",
+        "buy": "buy",
+        "hold": "hold",
+        "sell": "sell",
+        "strongSell": "strong_sell",
+        "consensus": "consensus",
+    },
+}
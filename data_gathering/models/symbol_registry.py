@@ -0,0 +1,74 @@
+# models/symbol_registry.py
+import sys
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .symbols import Symbol
+
+
+class SymbolRegistry:
+    """
+    Interns symbols and assigns each one a stable integer ID in order of registration.
+
+    The IDs stand in for the symbol strings wherever there is one value per row: they
+    are the symbol codes of the bar buffers and decide the order of the symbol
+    dictionary in the parquet output. Each symbol string and Symbol instance exists
+    once, however many calendar rows or bars refer to it, and the international
+    classification is only done once per string.
+
+    Attributes:
+        tickers (List[str]): The symbol of every ID.
+    """
+
+    def __init__(self) -> None:
+        self.tickers: List[str] = []
+        self._ids: Dict[str, int] = {}
+        # the interned Symbol of each string, None for international symbols
+        self._symbols: Dict[str, Optional[Symbol]] = {}
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._ids
+
+    def id(self, ticker: str) -> int:
+        """
+        Returns the ID of a symbol, registering it on first use.
+        """
+        if (symbol_id := self._ids.get(ticker)) is None:
+            ticker = sys.intern(ticker)
+            symbol_id = self._ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+        return symbol_id
+
+    def ids(self, tickers: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.id(ticker) for ticker in tickers), dtype=np.int32)
+
+    def ticker(self, symbol_id: int) -> str:
+        return self.tickers[symbol_id]
+
+    def symbol(self, ticker: str) -> Optional[Symbol]:
+        """
+        Returns the interned Symbol of a string, like Symbol.create.
+
+        Returns:
+            Symbol: The same instance for every call with the same string.
+            None: If the string is the symbol of an international instrument.
+        """
+        try:
+            return self._symbols[ticker]
+        except KeyError:
+            pass
+
+        symbol = None
+        if not Symbol.is_international(ticker):
+            symbol_id = self.id(ticker)
+            symbol = Symbol(self.tickers[symbol_id], symbol_id)
+        self._symbols[ticker] = symbol
+        return symbol
+
+
+# registry shared by the calendar and the bar buffers of a process
+symbol_registry = SymbolRegistry()
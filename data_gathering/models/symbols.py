@@ -1,5 +1,6 @@
 # models/symbol.py
 import re
+from typing import Optional
 
 
 # TODO: maybe associate gathered data types with the Symbol class
@@ -9,18 +10,25 @@ class Symbol:
 
     Attributes:
         symbol (str): The symbol representing a finacial instrument.
+        id (int): The integer ID of the symbol in a SymbolRegistry, None if the symbol
+            was not created by one.
     """
 
+    __slots__ = ("symbol", "id")
+
     INTERNATIONAL_SYMBOL_PATTERN = r"[-.][A-Z]+$"
+    INTERNATIONAL_SYMBOL_REGEX = re.compile(INTERNATIONAL_SYMBOL_PATTERN)
 
-    def __init__(self, symbol: str):
+    def __init__(self, symbol: str, id: Optional[int] = None):
         """
         Initializes the Symbol instance with the provided symbol.
 
         Args:
             symbol (str): The symbol representing a financial instrument.
+            id (int, optional): The integer ID of the symbol in a SymbolRegistry.
         """
         self.symbol: str = symbol
+        self.id: Optional[int] = id
 
     def __str__(self) -> str:
         """
@@ -43,6 +51,13 @@ class Symbol:
             Symbol: An instance of the Symbol class if the string does not match the international symbol pattern.
             None: If the string matches the international symbol pattern.
         """
-        if not re.search(cls.INTERNATIONAL_SYMBOL_PATTERN, symbol_str):
+        if not cls.is_international(symbol_str):
             return cls(symbol_str)
         return None
+
+    @classmethod
+    def is_international(cls, symbol_str: str) -> bool:
+        """
+        Returns whether the string is the symbol of an instrument on an international exchange.
+        """
+        return cls.INTERNATIONAL_SYMBOL_REGEX.search(symbol_str) is not None
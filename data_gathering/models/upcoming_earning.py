@@ -2,6 +2,8 @@ from .symbols import Symbol
 
 
 class UpcomingEarning:
+    __slots__ = ("symbol", "earnings_date")
+
     def __init__(self, symbol: Symbol, earnings_date: str):
         self.symbol = symbol
         self.earnings_date = earnings_date
@@ -0,0 +1,14 @@
+import pytest
+
+from data_gathering.config.api_keys import APIKeys
+
+
+@pytest.fixture
+def api_keys():
+    return APIKeys(
+        fmp_api_key="test_fmp_key",
+        finnhub_api_key=None,
+        alpha_vantage_api_key=None,
+        apca_key_id="test_key_id",
+        apca_api_secret_key="test_secret_key",
+    )
@@ -0,0 +1,114 @@
+"""
+Stand-ins for the aiohttp sessions and the earnings calendar shared by the tests.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs, urlparse
+
+from data_gathering.models.upcoming_earning import UpcomingEarning
+
+
+def make_bar(timestamp, close=150.0):
+    return {
+        "c": close,
+        "h": 155.0,
+        "l": 145.0,
+        "n": 10000,
+        "o": 148.0,
+        "t": timestamp,
+        "v": 20000,
+        "vw": 151.0,
+    }
+
+
+class FakeResponse:
+    """A response with a JSON payload, optionally delayed."""
+
+    def __init__(self, payload, status=200, headers=None, delay=0.0):
+        self.payload = payload
+        self.status = status
+        self.headers = {"X-RateLimit-Remaining": "100"} if headers is None else headers
+        self.delay = delay
+
+    async def read(self):
+        return json.dumps(self.payload).encode()
+
+    async def __aenter__(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    """Returns the queued payloads in order, raises the queued errors."""
+
+    def __init__(self, *payloads):
+        self.payloads = list(payloads)
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        payload = self.payloads.pop(0)
+        if isinstance(payload, Exception):
+            raise payload
+        if isinstance(payload, FakeResponse):
+            return payload
+        return FakeResponse(payload)
+
+    async def close(self):
+        pass
+
+
+class FakeBarsSession:
+    """Answers every request with one bar per requested symbol, except EMPTY."""
+
+    def __init__(self, fail_on=None, error_on=None):
+        self.urls = []
+        self.fail_on = fail_on
+        self.error_on = error_on
+
+    def get(self, url):
+        self.urls.append(url)
+        symbols = parse_qs(urlparse(url).query)["symbols"][0].split(",")
+        if self.fail_on in symbols:
+            raise RuntimeError(f"request for {self.fail_on} failed")
+        if self.error_on in symbols:
+            return FakeResponse({"message": "internal server error"})
+        return FakeResponse(
+            {
+                "bars": {
+                    symbol: [
+                        {
+                            "t": "2023-01-03T05:00:00Z",
+                            "o": 1.0,
+                            "h": 2.0,
+                            "l": 0.5,
+                            "c": 1.5,
+                            "v": 100,
+                            "n": 10,
+                            "vw": 1.2,
+                        }
+                    ]
+                    for symbol in symbols
+                    if symbol != "EMPTY"
+                },
+                "next_page_token": None,
+            }
+        )
+
+    async def close(self):
+        pass
+
+
+class FakeUpcomingEarnings:
+    def __init__(self, symbols, earnings_date="2023-02-01"):
+        self.symbols = symbols
+        self.earnings_date = earnings_date
+
+    async def get_upcoming_earnings(self, from_date, to_date):
+        for symbol in self.symbols:
+            yield UpcomingEarning(symbol, self.earnings_date)
@@ -0,0 +1,162 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pyarrow as pa
+import pytest
+
+from benchmarks.mock_server import MockAPIServer
+from data_gathering.data.analyst_estimates.get_analyst_estimates import (
+    AnalystEstimates,
+    analyst_estimates_schema,
+    reported_period,
+)
+from data_gathering.test.fakes import FakeUpcomingEarnings
+from data_gathering.test.test_gather_all_data import make_data_fetcher
+from data_gathering.utils.cache.analyst_estimates_cache import AnalystEstimatesCache
+from data_gathering.utils.output_utils.analyst_estimates.analyst_estimates_writer import (
+    AnalystEstimatesWriter,
+)
+
+DAY = 24 * 3600
+NOW = 1_700_000_000  # 2023-11-14
+
+
+def test_reported_period_is_the_last_one_before_the_earnings():
+    estimates = [{"date": "2024-03-31"}, {"date": "2023-12-31"}, {"date": "2023-09-30"}]
+
+    assert reported_period(estimates, "2024-01-25") == {"date": "2023-12-31"}
+    assert reported_period(estimates, "2023-01-01") is None
+
+
+def test_due_puts_near_earnings_symbols_first(tmp_path, api_keys):
+    cache = AnalystEstimatesCache(cache_dir=str(tmp_path), ttl=DAY)
+    cache.record({"FRESH": "f", "NEAR": "n"}, now=NOW - 3600 * 7)
+    cache.record({"OLD": "o"}, now=NOW - 3 * DAY)
+    cache.record({"STALE": "s"}, now=NOW - 2 * DAY)
+    analyst_estimates = AnalystEstimates(
+        api_keys, cache, near_earnings_days=3, near_earnings_ttl=6 * 3600
+    )
+
+    due = analyst_estimates.due(
+        {
+            "FRESH": "2023-11-30",
+            "STALE": "2023-11-30",
+            "OLD": "2023-11-30",
+            "NEW": "2023-11-30",
+            "NEAR": "2023-11-16",
+            "SOONER": "2023-11-15",
+        },
+        now=NOW,
+    )
+
+    # FRESH was fetched within its TTL and is not near its earnings
+    assert due == ["SOONER", "NEAR", "NEW", "OLD", "STALE"]
+
+
+def test_writer_latest_returns_the_current_estimates(tmp_path):
+    root = str(tmp_path / "analyst_estimates")
+    writer = AnalystEstimatesWriter(root)
+    schema = analyst_estimates_schema()
+    first = {
+        "fetched_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "target_consensus": 10.0,
+    }
+    second = {
+        "fetched_at": datetime(2024, 1, 2, tzinfo=timezone.utc),
+        "target_consensus": None,
+    }
+    writer.write(
+        pa.Table.from_pylist(
+            [{"symbol": "AAPL", **first}, {"symbol": "MSFT", **first}], schema=schema
+        )
+    )
+    writer.write(pa.Table.from_pylist([{"symbol": "AAPL", **second}], schema=schema))
+
+    latest = AnalystEstimatesWriter.latest(root).sort_by("symbol").to_pylist()
+    assert latest[0]["symbol"] == "AAPL" and latest[0]["target_consensus"] is None
+    assert latest[1]["target_consensus"] == 10.0
+    assert AnalystEstimatesWriter.dataset(root).count_rows() == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_only_stores_changed_estimates(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    root = str(tmp_path / "analyst_estimates")
+    earnings_date = (date.today() + timedelta(days=10)).isoformat()
+
+    async def run(server):
+        data_fetcher = make_data_fetcher(
+            tmp_path,
+            api_keys,
+            symbols,
+            fmp_base_url=server.fmp_base_url,
+            fmp_bulk_base_url=server.fmp_bulk_base_url,
+            analyst_estimates=True,
+            estimates_path=root,
+        )
+        data_fetcher.upcoming_earnings = FakeUpcomingEarnings(symbols, earnings_date)
+        server.requests.clear()
+        await data_fetcher.fetch_all_data()
+        return data_fetcher.analyst_estimates.cache
+
+    async with MockAPIServer(symbols=1, latency=0) as server:
+        await run(server)
+        # three endpoints per symbol
+        assert sum(server.requests.values()) == 3 * len(symbols)
+        assert AnalystEstimatesWriter.dataset(root).count_rows() == len(symbols)
+
+        # fresh estimates are not asked for again
+        cache = await run(server)
+        assert sum(server.requests.values()) == 0
+
+        # once stale only the revised estimates are stored
+        cache.connection.execute(
+            "UPDATE estimates SET fetched_at = fetched_at - ?", (DAY,)
+        )
+        server.estimate_revisions["MSFT"] += 1
+        cache = await run(server)
+        assert sum(server.requests.values()) == 3 * len(symbols)
+
+    stored = AnalystEstimatesWriter.dataset(root).to_table()
+    assert sorted(stored.column("symbol").to_pylist()) == sorted([*symbols, "MSFT"])
+    latest = AnalystEstimatesWriter.latest(root, ["AAPL"]).to_pylist()[0]
+    # the estimates of the quarter that ended before the earnings
+    assert date.today() - timedelta(days=92) < latest["estimate_date"] <= date.today()
+    # unchanged estimates stay fresh longer
+    entries = cache.entries()
+    assert entries["AAPL"].ttl == 2 * entries["MSFT"].ttl
+
+
+@pytest.mark.asyncio
+async def test_failed_write_leaves_the_estimates_due(tmp_path, api_keys, monkeypatch):
+    symbols = ["AAPL", "MSFT"]
+    root = str(tmp_path / "analyst_estimates")
+    earnings_date = (date.today() + timedelta(days=10)).isoformat()
+
+    def fail(self, table):
+        raise OSError("disk full")
+
+    async with MockAPIServer(symbols=1, latency=0) as server:
+        data_fetcher = make_data_fetcher(
+            tmp_path,
+            api_keys,
+            symbols,
+            fmp_base_url=server.fmp_base_url,
+            fmp_bulk_base_url=server.fmp_bulk_base_url,
+            analyst_estimates=True,
+            estimates_path=root,
+        )
+        data_fetcher.upcoming_earnings = FakeUpcomingEarnings(symbols, earnings_date)
+        with monkeypatch.context() as patch:
+            patch.setattr(AnalystEstimatesWriter, "write", fail)
+            with pytest.raises(ExceptionGroup):
+                await data_fetcher.fetch_all_data()
+
+        estimates = data_fetcher.analyst_estimates
+        assert estimates.cache.entries() == {}
+        assert estimates.due({symbol: earnings_date for symbol in symbols}) == symbols
+
+        changed, digests = await estimates.fetch(
+            {symbol: earnings_date for symbol in symbols}
+        )
+        assert sorted(changed.column("symbol").to_pylist()) == symbols
+        assert set(digests) == set(symbols)
@@ -0,0 +1,35 @@
+from data_gathering.utils.cache.analyst_estimates_cache import AnalystEstimatesCache
+
+
+def test_record_reports_new_and_changed_symbols(tmp_path):
+    cache = AnalystEstimatesCache(cache_dir=str(tmp_path), ttl=100, max_ttl=350)
+
+    assert cache.record({"AAPL": "a", "MSFT": "m"}, now=1) == {"AAPL", "MSFT"}
+    assert cache.record({"AAPL": "a", "MSFT": "m2"}, now=2) == {"MSFT"}
+
+    entries = AnalystEstimatesCache(cache_dir=str(tmp_path)).entries()
+    assert entries["AAPL"] == ("a", 2, 200)
+    assert entries["MSFT"] == ("m2", 2, 100)
+
+
+def test_changed_does_not_record(tmp_path):
+    cache = AnalystEstimatesCache(cache_dir=str(tmp_path))
+    cache.record({"AAPL": "a"}, now=1)
+
+    assert cache.changed({"AAPL": "a", "MSFT": "m"}) == {"MSFT"}
+    assert cache.changed({"AAPL": "b"}) == {"AAPL"}
+    assert set(cache.entries()) == {"AAPL"}
+
+
+def test_ttl_doubles_while_unchanged_up_to_max_ttl(tmp_path):
+    cache = AnalystEstimatesCache(cache_dir=str(tmp_path), ttl=100, max_ttl=350)
+
+    ttls = []
+    for now in range(5):
+        cache.record({"AAPL": "a"}, now=now)
+        ttls.append(cache.entries()["AAPL"].ttl)
+    assert ttls == [100, 200, 350, 350, 350]
+
+    # a change resets it
+    cache.record({"AAPL": "b"}, now=5)
+    assert cache.entries()["AAPL"].ttl == 100
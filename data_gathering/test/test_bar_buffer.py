@@ -0,0 +1,126 @@
+import json
+import pickle
+
+import pandas as pd
+import pyarrow as pa
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer, decode_bars_page
+from data_gathering.models.symbol_registry import SymbolRegistry
+from data_gathering.test.fakes import make_bar
+from data_gathering.utils.json_decoding import JSONDecoder
+
+
+def test_append_page_fills_columns():
+    buffer = BarBuffer()
+    buffer.append_page(
+        {
+            "AAPL": JSONDecoder.bars_to_columns(
+                [
+                    make_bar("2023-01-03T05:00:00Z"),
+                    make_bar("2023-01-04T05:00:00Z"),
+                ]
+            ),
+            "MSFT": JSONDecoder.bars_to_columns(
+                [make_bar("2023-01-03T05:00:00Z", close=300.0)]
+            ),
+        }
+    )
+    assert len(buffer) == 3
+    assert buffer.symbols == ["AAPL", "MSFT"]
+    assert list(buffer.symbol_codes) == [0, 0, 1]
+    assert list(buffer.columns["close"]) == [150.0, 150.0, 300.0]
+    assert buffer.received_symbols == {"AAPL", "MSFT"}
+
+
+def test_to_arrow_schema():
+    buffer = BarBuffer()
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")])
+    table = buffer.to_arrow()
+    assert table.schema.field("symbol").type == pa.dictionary(pa.int32(), pa.string())
+    assert table.schema.field("timestamp").type == pa.timestamp("ns", tz="UTC")
+    assert table.schema.field("volume").type == pa.int64()
+    assert table.column("symbol").to_pylist() == ["AAPL"]
+
+
+def test_to_dataframe_index():
+    buffer = BarBuffer()
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")])
+    df = buffer.to_dataframe()
+    assert list(df.index.names) == ["symbol", "timestamp"]
+    assert isinstance(df.index.levels[0].dtype, pd.CategoricalDtype)
+    assert df.index[0] == ("AAPL", pd.Timestamp("2023-01-03 05:00", tz="UTC"))
+    assert df.loc["AAPL", "trade_count"].tolist() == [10000]
+
+
+def test_missing_field_is_nan():
+    buffer = BarBuffer()
+    bar = make_bar("2023-01-03T05:00:00Z")
+    del bar["vw"]
+    buffer.append("AAPL", [bar])
+    assert buffer.to_dataframe()["vwap"].isna().all()
+
+
+def test_clear_keeps_symbol_codes():
+    buffer = BarBuffer()
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")])
+    buffer.clear()
+    buffer.append("MSFT", [make_bar("2023-01-03T05:00:00Z")])
+    buffer.append("AAPL", [make_bar("2023-01-04T05:00:00Z")])
+    assert len(buffer) == 2
+    assert list(buffer.symbol_codes) == [1, 0]
+    assert buffer.to_arrow().column("symbol").to_pylist() == ["MSFT", "AAPL"]
+
+
+def test_extend_translates_symbol_codes():
+    buffer = BarBuffer()
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")])
+    page = BarBuffer()
+    page.append("MSFT", [make_bar("2023-01-03T05:00:00Z", close=300.0)])
+    page.append("AAPL", [make_bar("2023-01-04T05:00:00Z", close=151.0)])
+
+    buffer.extend(page)
+    assert buffer.symbols == ["AAPL", "MSFT"]
+    assert list(buffer.symbol_codes) == [0, 1, 0]
+    assert list(buffer.columns["close"]) == [150.0, 300.0, 151.0]
+    assert buffer.received_symbols == {"AAPL", "MSFT"}
+
+
+def test_nbytes_counts_parsed_timestamps():
+    buffer = BarBuffer()
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")] * 10)
+
+    # a 4 byte symbol code, an 8 byte timestamp and 7 numeric columns of 8 bytes
+    assert buffer.nbytes == 10 * (4 + 8 + 7 * 8)
+    assert buffer.timestamps[0] == pd.Timestamp("2023-01-03T05:00:00Z").value
+
+
+def test_decode_bars_page_returns_column_buffer():
+    body = json.dumps(
+        {"bars": {"AAPL": [make_bar("2023-01-03T05:00:00Z")]}, "next_page_token": "t"}
+    ).encode()
+
+    page = decode_bars_page(body, "json")
+    assert page["next_page_token"] == "t"
+    assert page["bars"].symbols == ["AAPL"]
+    assert list(page["bars"].columns["close"]) == [150.0]
+    # the buffer survives the round trip to a worker process
+    restored = pickle.loads(pickle.dumps(page["bars"]))
+    assert restored.to_arrow().column("timestamp").to_pylist() == [
+        pd.Timestamp("2023-01-03T05:00:00Z")
+    ]
+    assert decode_bars_page(b'{"message": "forbidden"}') is None
+
+
+def test_shared_registry_drives_codes_and_dictionary():
+    registry = SymbolRegistry()
+    registry.id("NVDA")
+    buffer = BarBuffer(registry)
+    buffer.append("MSFT", [make_bar("2023-01-03T05:00:00Z")])
+    buffer.append("AAPL", [make_bar("2023-01-03T05:00:00Z")])
+    # the codes are the registry IDs
+    assert list(buffer.symbol_codes) == [1, 2]
+
+    symbol = buffer.to_arrow().column("symbol").chunk(0)
+    # only symbols with bars are in the dictionary, in the order of their IDs
+    assert symbol.dictionary.to_pylist() == ["MSFT", "AAPL"]
+    assert symbol.to_pylist() == ["MSFT", "AAPL"]
@@ -0,0 +1,182 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from data_gathering.data.fmp_client import FMPClient
+from data_gathering.data.upcoming_earnings.get_upcoming_earnings import (
+    UpcomingEarnings,
+)
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.test.fakes import FakeResponse
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.rate_limiter import RateLimiter
+
+
+class FakeCalendarSession:
+    """Answers calendar requests from a dict keyed by the from date."""
+
+    closed = False
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append((url, params))
+        response = self.responses[params["from"]]
+        if isinstance(response, list):
+            response = response.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def close(self):
+        self.closed = True
+
+
+def make_client(session, response_cache=None):
+    http = ProviderSessions()
+    http.sessions["fmp"] = session
+    return FMPClient(
+        "secret", http, RateLimiter({"fmp": 300}), response_cache, "https://fmp.test"
+    )
+
+
+def test_date_chunks_cover_range():
+    assert FMPClient.date_chunks("2024-05-01", "2024-05-08", 3) == [
+        ("2024-05-01", "2024-05-03"),
+        ("2024-05-04", "2024-05-06"),
+        ("2024-05-07", "2024-05-08"),
+    ]
+    assert FMPClient.date_chunks("2024-05-01", "2024-05-01", 3) == [
+        ("2024-05-01", "2024-05-01")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_yielded_as_they_arrive():
+    session = FakeCalendarSession(
+        {
+            "2024-05-01": FakeResponse([{"symbol": "SLOW"}], delay=0.05),
+            "2024-05-04": FakeResponse([{"symbol": "FAST"}]),
+        }
+    )
+    client = make_client(session)
+
+    chunks = [
+        chunk
+        async for chunk in client.iter_earning_calendar("2024-05-01", "2024-05-06", 3)
+    ]
+    assert chunks == [[{"symbol": "FAST"}], [{"symbol": "SLOW"}]]
+    # the key is sent with the request
+    assert all(params["apikey"] == "secret" for _, params in session.requests)
+
+
+@pytest.mark.asyncio
+async def test_get_retries_after_429():
+    session = FakeCalendarSession(
+        {
+            "2024-05-01": [
+                FakeResponse({}, status=429, headers={"Retry-After": "0"}),
+                FakeResponse([{"symbol": "AAPL"}]),
+            ]
+        }
+    )
+    client = make_client(session)
+
+    assert await client.earning_calendar("2024-05-01", "2024-05-01") == [
+        {"symbol": "AAPL"}
+    ]
+    assert len(session.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_retries_after_timeout_and_server_error():
+    session = FakeCalendarSession(
+        {
+            "2024-05-01": [
+                asyncio.TimeoutError(),
+                FakeResponse({}, status=502),
+                FakeResponse([{"symbol": "AAPL"}]),
+            ]
+        }
+    )
+    client = make_client(session)
+    client.rate_limiter = RateLimiter({"fmp": 60000}, headroom=0)
+
+    assert await client.earning_calendar("2024-05-01", "2024-05-01") == [
+        {"symbol": "AAPL"}
+    ]
+    assert len(session.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_returns_none_after_retries():
+    session = FakeCalendarSession(
+        {"2024-05-01": [aiohttp.ClientConnectionError("reset")] * 4}
+    )
+    client = make_client(session)
+    client.rate_limiter = RateLimiter({"fmp": 60000}, headroom=0)
+
+    assert await client.get("earning_calendar", {"from": "2024-05-01"}) is None
+    assert len(session.requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_error_message_returns_empty_calendar():
+    session = FakeCalendarSession(
+        {"2024-05-01": FakeResponse({"Error Message": "Invalid API KEY."})}
+    )
+    client = make_client(session)
+
+    assert await client.earning_calendar("2024-05-01", "2024-05-02") == []
+
+
+@pytest.mark.asyncio
+async def test_responses_are_cached_without_api_key(tmp_path):
+    response_cache = ResponseCache(cache_dir=str(tmp_path))
+    session = FakeCalendarSession({"2024-05-01": FakeResponse([{"symbol": "AAPL"}])})
+    client = make_client(session, response_cache)
+
+    await client.earning_calendar("2024-05-01", "2024-05-02")
+    # the second call is served from disk
+    assert await client.earning_calendar("2024-05-01", "2024-05-02") == [
+        {"symbol": "AAPL"}
+    ]
+    assert len(session.requests) == 1
+    for meta_path in tmp_path.glob("http/*/*.json"):
+        assert "secret" not in meta_path.read_text()
+
+
+@pytest.mark.asyncio
+async def test_upcoming_earnings_skips_blacklisted_and_international(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    cache.add_symbol("MSFT")
+    api_keys = APIKeys("secret", None, None, None, None)
+    upcoming_earnings = UpcomingEarnings(api_keys, cache, chunk_days=14)
+    upcoming_earnings.client = make_client(
+        FakeCalendarSession(
+            {
+                "2024-05-01": FakeResponse(
+                    [
+                        {"symbol": "AAPL", "date": "2024-05-02"},
+                        {"symbol": "MSFT", "date": "2024-05-03"},
+                        {"symbol": "SHOP.TO", "date": "2024-05-03"},
+                        {"symbol": "NVDA"},
+                    ]
+                )
+            }
+        )
+    )
+
+    earnings = [
+        earning
+        async for earning in upcoming_earnings.get_upcoming_earnings(
+            "2024-05-01", "2024-05-14"
+        )
+    ]
+    assert [str(earning.symbol) for earning in earnings] == ["AAPL"]
+    assert earnings[0].earnings_date == "2024-05-02"
@@ -0,0 +1,184 @@
+from datetime import date
+
+import pyarrow as pa
+import pytest
+
+from benchmarks.mock_server import MockAPIServer
+from data_gathering.data.fundamentals.get_fundamentals import (
+    Fundamentals,
+    combine_fundamentals,
+    fundamentals_schema,
+    parse_bulk_csv,
+)
+from data_gathering.models.mappings import fundamentals_mapping
+from data_gathering.test.test_gather_all_data import make_data_fetcher
+from data_gathering.utils.output_utils.fundamentals.fundamentals_dataset_writer import (
+    FundamentalsDatasetWriter,
+)
+
+INCOME = b"""date,symbol,reportedCurrency,calendarYear,period,revenue,eps,epsdiluted
+2022-03-31,AAPL,USD,2022,Q1,100.0,1.0,0.9
+2023-03-31,AAPL,USD,2023,Q1,120.0,1.2,1.1
+2023-03-31,MSFT,USD,2023,Q1,50.0,,2.0
+"""
+RATIOS = b"""symbol,date,calendarYear,period,netProfitMargin,priceEarningsRatio
+AAPL,2023-03-31,2023,Q1,0.25,30.5
+"""
+
+
+def parse(endpoint, body):
+    return parse_bulk_csv(body, fundamentals_mapping[endpoint])
+
+
+def test_parse_bulk_csv_keeps_only_the_mapped_columns():
+    table = parse("income-statement-bulk", INCOME)
+
+    assert table.column_names == [
+        "symbol",
+        "date",
+        "calendar_year",
+        "period",
+        "revenue",
+        "eps",
+        "eps_diluted",
+    ]
+    assert table.schema.field("date").type == pa.date32()
+    assert table.column("eps").to_pylist() == [1.0, 1.2, None]
+
+
+def test_parse_bulk_csv_fills_missing_columns_with_nulls():
+    table = parse("ratios-bulk", RATIOS)
+
+    assert table.column("dividend_yield").type == pa.float64()
+    assert table.column("dividend_yield").to_pylist() == [None]
+
+
+def test_parse_bulk_csv_rejects_error_messages():
+    assert parse("ratios-bulk", b'{"Error Message": "Limit Reach."}') is None
+
+
+def test_combine_fundamentals_joins_endpoints_and_computes_growth():
+    table = combine_fundamentals(
+        {
+            "income-statement-bulk": parse("income-statement-bulk", INCOME),
+            "ratios-bulk": parse("ratios-bulk", RATIOS),
+        },
+        [2023],
+    )
+
+    assert table.schema == fundamentals_schema()
+    rows = table.to_pylist()
+    # the year before only feeds the growth
+    assert [row["symbol"] for row in rows] == ["AAPL", "MSFT"]
+    assert rows[0]["date"] == date(2023, 3, 31)
+    assert rows[0]["revenue_growth"] == pytest.approx(0.2)
+    assert rows[0]["price_earnings_ratio"] == 30.5
+    # MSFT has no report a year before and no ratios
+    assert rows[1]["revenue_growth"] is None
+    assert rows[1]["net_profit_margin"] is None
+
+
+def test_combine_fundamentals_without_an_endpoint():
+    table = combine_fundamentals(
+        {"income-statement-bulk": parse("income-statement-bulk", INCOME)}, [2023]
+    )
+
+    assert table.schema == fundamentals_schema()
+    assert table.column("return_on_equity").null_count == 2
+    assert combine_fundamentals({}, [2023]).num_rows == 0
+
+
+def test_writer_replaces_the_refreshed_years(tmp_path):
+    root = str(tmp_path / "fundamentals")
+    income = parse("income-statement-bulk", INCOME)
+    table = combine_fundamentals({"income-statement-bulk": income}, [2022, 2023])
+    FundamentalsDatasetWriter(root).write(table)
+
+    # a later refresh of 2023 only, with a restated report
+    restated = combine_fundamentals(
+        {
+            "income-statement-bulk": parse(
+                "income-statement-bulk",
+                INCOME.replace(b"2023,Q1,120.0", b"2023,Q1,130.0"),
+            )
+        },
+        [2023],
+    )
+    FundamentalsDatasetWriter(root).write(restated)
+
+    stored = FundamentalsDatasetWriter.read(root).sort_by(
+        [("calendar_year", "ascending"), ("symbol", "ascending")]
+    )
+    assert stored.column("calendar_year").to_pylist() == [2022, 2023, 2023]
+    assert stored.column("revenue").to_pylist() == [100.0, 130.0, 50.0]
+
+    aapl = FundamentalsDatasetWriter.read(root, symbols=["AAPL"], columns=["revenue"])
+    assert aapl.column("revenue").to_pylist() == [100.0, 130.0]
+
+
+@pytest.mark.asyncio
+async def test_fetch_leaves_out_years_with_a_failed_endpoint(tmp_path, api_keys):
+    root = str(tmp_path / "fundamentals")
+    stored = combine_fundamentals(
+        {
+            "income-statement-bulk": parse("income-statement-bulk", INCOME),
+            "ratios-bulk": parse("ratios-bulk", RATIOS),
+        },
+        [2022, 2023],
+    )
+    FundamentalsDatasetWriter(root).write(stored)
+
+    async def bulk(endpoint, year, period):
+        if endpoint == "ratios-bulk":
+            # 2023 of the ratios fails
+            return None if year == 2023 else RATIOS.splitlines(keepends=True)[0]
+        header, *lines = INCOME.splitlines(keepends=True)
+        rows = [line.replace(b"120.0", b"130.0") for line in lines]
+        return header + b"".join(row for row in rows if f",{year},".encode() in row)
+
+    fundamentals = Fundamentals(api_keys)
+    fundamentals.client.bulk = bulk
+    table = await fundamentals.fetch([2022, 2023])
+
+    assert set(table.column("calendar_year").to_pylist()) == {2022}
+    FundamentalsDatasetWriter(root).write(table)
+    aapl = FundamentalsDatasetWriter.read(
+        root, symbols=["AAPL"], columns=["revenue", "net_profit_margin"]
+    ).sort_by("revenue")
+    assert aapl.column("revenue").to_pylist() == [100.0, 120.0]
+    assert aapl.column("net_profit_margin").to_pylist() == [None, 0.25]
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_refreshes_fundamentals_in_bulk(tmp_path, api_keys):
+    async with MockAPIServer(symbols=40, latency=0) as server:
+        data_fetcher = make_data_fetcher(
+            tmp_path,
+            api_keys,
+            [],
+            fmp_bulk_base_url=server.fmp_bulk_base_url,
+            fundamentals=True,
+            fundamentals_path=str(tmp_path / "fundamentals"),
+            fundamentals_years=2,
+        )
+        await data_fetcher.fetch_all_data()
+
+    # two endpoints for the two years and the year before, whatever the universe
+    assert sum(server.requests.values()) == 6
+    assert set(server.requests) == {
+        ("income-statement-bulk", 200),
+        ("ratios-bulk", 200),
+    }
+
+    stored = FundamentalsDatasetWriter.read(str(tmp_path / "fundamentals"))
+    this_year = date.today().year
+    assert set(stored.column("calendar_year").to_pylist()) == {
+        this_year - 1,
+        this_year,
+    }
+    assert len(set(stored.column("symbol").to_pylist())) == 40
+    assert stored.num_rows == 40 * 4 * 2
+    # the mock's revenue grows 10% a year
+    assert stored.column("revenue_growth").to_pylist() == pytest.approx(
+        [0.1] * stored.num_rows
+    )
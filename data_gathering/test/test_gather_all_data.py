@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pyarrow.parquet as pq
+import pytest
+
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.data.gather_all_data import DONE, DataFetcher
+from data_gathering.test.fakes import FakeBarsSession, FakeUpcomingEarnings
+
+
+def make_data_fetcher(tmp_path, api_keys, symbols, session=None, **config):
+    config = PipelineConfig(
+        **{
+            "cache_dir": str(tmp_path / "cache"),
+            "hist_parquet_path": str(tmp_path / "historical_data.parquet"),
+            "hist_batch_size": 2,
+            "transform_executor": "inline",
+            **config,
+        }
+    )
+    data_fetcher = DataFetcher(config, api_keys)
+    data_fetcher.upcoming_earnings = FakeUpcomingEarnings(symbols)
+    data_fetcher.historical_data.session = session or FakeBarsSession()
+    return data_fetcher
+
+
+def requested_symbols(urls):
+    return sorted(parse_qs(urlparse(url).query)["symbols"][0] for url in urls)
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_writes_every_symbol(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "EMPTY", "AMD"]
+    data_fetcher = make_data_fetcher(tmp_path, api_keys, symbols, hist_workers=2)
+    data_fetcher.cache.add_symbol("AMD")
+
+    await data_fetcher.fetch_all_data()
+
+    table = pq.read_table(data_fetcher.config.hist_parquet_path)
+    assert sorted(table.column("symbol").to_pylist()) == ["AAPL", "MSFT", "NVDA"]
+    # blacklisted symbols are never requested
+    assert requested_symbols(data_fetcher.historical_data.session.urls) == [
+        "AAPL,MSFT",
+        "NVDA,EMPTY",
+    ]
+    assert data_fetcher.cache.is_blacklisted("EMPTY")
+    assert set(data_fetcher.high_water_marks.marks) == {"AAPL", "MSFT", "NVDA"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("hist_parquet", [True, False])
+async def test_fetch_all_data_exports_json(tmp_path, api_keys, hist_parquet):
+    symbols = ["MSFT", "AAPL"]
+    json_path = tmp_path / "historical_data.ndjson"
+    data_fetcher = make_data_fetcher(
+        tmp_path,
+        api_keys,
+        symbols,
+        hist_json=True,
+        hist_json_path=str(json_path),
+        hist_parquet=hist_parquet,
+    )
+
+    await data_fetcher.fetch_all_data()
+
+    rows = [json.loads(line) for line in json_path.read_text().splitlines()]
+    assert [row["symbol"] for row in rows] == ["AAPL", "MSFT"]
+    assert rows[0]["vwap"] == 1.2
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_reports_metrics(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA"]
+    metrics_path = tmp_path / "metrics.json"
+    data_fetcher = make_data_fetcher(
+        tmp_path,
+        api_keys,
+        symbols,
+        metrics="json",
+        metrics_path=str(metrics_path),
+        metrics_interval=0.01,
+    )
+
+    await data_fetcher.fetch_all_data()
+
+    summary = json.loads(metrics_path.read_text())
+    assert summary["counters"]["symbols"] == 3
+    assert summary["counters"]['rows{stage="write"}'] == 3
+    assert summary["counters"]['requests{provider="alpaca",status="200"}'] == 2
+    for stage in ("buffer", "combine", "parse", "write"):
+        assert any(
+            key.startswith(f'stage_seconds{{stage="{stage}"')
+            for key in summary["histograms"]
+        )
+    assert 'queue_depth{queue="pages"}' in summary["gauges"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_flushes_past_memory_limit(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    data_fetcher = make_data_fetcher(tmp_path, api_keys, symbols, hist_memory_limit=1)
+
+    await data_fetcher.fetch_all_data()
+
+    parquet_file = pq.ParquetFile(data_fetcher.config.hist_parquet_path)
+    # every page is flushed on its own
+    assert parquet_file.metadata.num_row_groups == 2
+    assert parquet_file.metadata.num_rows == 4
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_decodes_in_process_pool(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA"]
+    data_fetcher = make_data_fetcher(
+        tmp_path, api_keys, symbols, transform_executor="process", transform_workers=2
+    )
+
+    await data_fetcher.fetch_all_data()
+
+    table = pq.read_table(data_fetcher.config.hist_parquet_path)
+    assert sorted(table.column("symbol").to_pylist()) == symbols
+    assert table.column("close").to_pylist() == [1.5] * 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_stops_at_max_symbols(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    data_fetcher = make_data_fetcher(tmp_path, api_keys, symbols, max_symbols=3)
+
+    await data_fetcher.fetch_all_data()
+
+    table = pq.read_table(data_fetcher.config.hist_parquet_path)
+    assert sorted(table.column("symbol").to_pylist()) == ["AAPL", "MSFT", "NVDA"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_aborts_writers_on_error(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    data_fetcher = make_data_fetcher(
+        tmp_path,
+        api_keys,
+        symbols,
+        session=FakeBarsSession(fail_on="NVDA"),
+        hist_memory_limit=1,
+        journal=False,
+    )
+
+    with pytest.raises(ExceptionGroup):
+        await data_fetcher.fetch_all_data()
+
+    path = data_fetcher.config.hist_parquet_path
+    assert not os.path.exists(path)
+    assert not os.path.exists(f"{path}.tmp")
+    assert data_fetcher.high_water_marks.marks == {}
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_resumes_after_error(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    # one worker, so the first batch is fetched before the second one fails
+    data_fetcher = make_data_fetcher(
+        tmp_path,
+        api_keys,
+        symbols,
+        session=FakeBarsSession(fail_on="NVDA"),
+        hist_workers=1,
+    )
+
+    with pytest.raises(ExceptionGroup):
+        await data_fetcher.fetch_all_data()
+
+    path = data_fetcher.config.hist_parquet_path
+    table = pq.read_table(path)
+    assert sorted(table.column("symbol").to_pylist()) == ["AAPL", "MSFT"]
+    assert data_fetcher.journal.symbols("written") == {"AAPL", "MSFT"}
+    assert set(data_fetcher.high_water_marks.marks) == {"AAPL", "MSFT"}
+
+    resumed = make_data_fetcher(tmp_path, api_keys, symbols, resume=True)
+    await resumed.fetch_all_data()
+
+    assert resumed.journal.run_id == data_fetcher.journal.run_id
+    assert requested_symbols(resumed.historical_data.session.urls) == ["NVDA,AMD"]
+    table = pq.read_table(path)
+    assert sorted(table.column("symbol").to_pylist()) == sorted(symbols)
+    assert resumed.journal.symbols("written") == set(symbols)
+
+    # a finished run is not resumed again
+    again = make_data_fetcher(tmp_path, api_keys, symbols, resume=True)
+    await again.fetch_all_data()
+    assert again.journal.run_id != data_fetcher.journal.run_id
+    assert len(again.historical_data.session.urls) == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_journals_failed_pages(tmp_path, api_keys):
+    symbols = ["AAPL", "MSFT", "NVDA", "AMD"]
+    data_fetcher = make_data_fetcher(
+        tmp_path, api_keys, symbols, session=FakeBarsSession(error_on="NVDA")
+    )
+
+    await data_fetcher.fetch_all_data()
+
+    journal = data_fetcher.journal
+    assert journal.symbols("failed") == {"NVDA", "AMD"}
+    assert journal.symbols("written") == {"AAPL", "MSFT"}
+    # a failed page says nothing about its symbols
+    assert not data_fetcher.cache.is_blacklisted("NVDA")
+
+
+@pytest.mark.asyncio
+async def test_batch_symbols_sends_partial_batch_after_timeout(tmp_path, api_keys):
+    data_fetcher = make_data_fetcher(
+        tmp_path, api_keys, [], hist_batch_size=10, hist_batch_timeout=0.01
+    )
+    symbol_queue = asyncio.Queue()
+    batch_queue = asyncio.Queue()
+    batcher = asyncio.create_task(data_fetcher.batch_symbols(symbol_queue, batch_queue))
+
+    await symbol_queue.put("AAPL")
+    # the producer stalls, the batch goes out without waiting for more symbols
+    assert await asyncio.wait_for(batch_queue.get(), 1) == ["AAPL"]
+
+    await symbol_queue.put("MSFT")
+    await symbol_queue.put(DONE)
+    await batcher
+    assert batch_queue.get_nowait() == ["MSFT"]
+    assert batch_queue.get_nowait() is DONE
+
+
+def test_response_cache_is_off_unless_asked_for(tmp_path, api_keys):
+    assert make_data_fetcher(tmp_path, api_keys, []).response_cache is None
+    for config in ({"response_cache": True}, {"offline": True}):
+        data_fetcher = make_data_fetcher(tmp_path, api_keys, [], **config)
+        assert data_fetcher.response_cache is not None
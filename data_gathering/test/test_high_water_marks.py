@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from data_gathering.utils.cache.high_water_marks import HighWaterMarkCache
+
+
+def test_start_date_defaults_without_mark(tmp_path):
+    marks = HighWaterMarkCache(cache_dir=str(tmp_path))
+    assert marks.start_date("AAPL", "1983-01-01") == "1983-01-01"
+
+
+def test_start_date_is_day_after_mark(tmp_path):
+    marks = HighWaterMarkCache(cache_dir=str(tmp_path))
+    marks.update({"AAPL": datetime(2024, 5, 30, 4, tzinfo=timezone.utc)})
+    assert marks.start_date("AAPL", "1983-01-01") == "2024-05-31"
+
+
+def test_update_only_moves_forward(tmp_path):
+    marks = HighWaterMarkCache(cache_dir=str(tmp_path))
+    marks.update({"AAPL": datetime(2024, 5, 30)})
+    marks.update({"AAPL": datetime(2024, 1, 2), "MSFT": datetime(2024, 1, 2)})
+    assert marks.get("AAPL") == datetime(2024, 5, 30)
+    assert marks.get("MSFT") == datetime(2024, 1, 2)
+
+
+def test_save_and_load(tmp_path):
+    marks = HighWaterMarkCache(cache_dir=str(tmp_path))
+    marks.update({"AAPL": datetime(2024, 5, 30)})
+    marks.save_marks_to_pickle()
+
+    loaded = HighWaterMarkCache(cache_dir=str(tmp_path))
+    assert loaded.marks == {"AAPL": datetime(2024, 5, 30)}
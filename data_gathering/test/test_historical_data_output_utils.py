@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer
+from data_gathering.utils.output_utils.historical_data.historical_data_output_utils import (
+    HistoricalDataOutputUtils,
+)
+from data_gathering.utils.output_utils.historical_data.historical_parquet_writer import (
+    HistoricalParquetWriter,
+)
+
+
+def make_buffer(close=130.28, volume=1_000):
+    buffer = BarBuffer()
+    for symbol in ("AAPL", "MSFT"):
+        buffer.append(
+            symbol,
+            [
+                {
+                    "t": f"2023-01-0{day}T05:00:00Z",
+                    "o": 130.1234,
+                    "h": 131.0,
+                    "l": 129.5,
+                    "c": close,
+                    "v": volume,
+                    "n": 30,
+                    "vw": 130.5,
+                }
+                for day in (3, 4)
+            ],
+        )
+    return buffer
+
+
+def test_combine_dataframes_indexes_by_symbol_and_time():
+    df = HistoricalDataOutputUtils.combine_dataframes(make_buffer())
+
+    assert df["close"].dtype == np.float64
+    assert isinstance(df.index.levels[0].dtype, pd.CategoricalDtype)
+    assert str(df.index.levels[1].dtype) == "datetime64[ns, UTC]"
+    assert len(df) == 4
+
+
+def test_read_parquet_indexes_by_symbol_and_time(tmp_path):
+    path = str(tmp_path / "bars.parquet")
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_buffer().to_arrow())
+    writer.close()
+
+    df = HistoricalDataOutputUtils.read_parquet(path)
+    assert df.index.names == ["symbol", "timestamp"]
+    assert df["vwap"].dtype == np.float64
@@ -0,0 +1,103 @@
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer
+from data_gathering.utils.output_utils.historical_data.historical_dataset_writer import (
+    HistoricalDatasetWriter,
+)
+
+
+def make_table(bars_by_symbol):
+    buffer = BarBuffer()
+    for symbol, timestamps in bars_by_symbol.items():
+        buffer.append(
+            symbol,
+            [
+                {"t": t, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 10, "n": 3}
+                for t in timestamps
+            ],
+        )
+    return buffer.to_arrow()
+
+
+def test_writes_symbol_year_partitions(tmp_path):
+    writer = HistoricalDatasetWriter(str(tmp_path))
+    writer.write(
+        make_table(
+            {
+                "AAPL": ["2023-12-29T05:00:00Z", "2024-01-02T05:00:00Z"],
+                "MSFT": ["2024-01-02T05:00:00Z"],
+            }
+        )
+    )
+    writer.close()
+
+    assert sorted(os.listdir(tmp_path / "symbol=AAPL")) == ["year=2023", "year=2024"]
+    assert os.listdir(tmp_path / "symbol=MSFT") == ["year=2024"]
+    assert pq.read_metadata(tmp_path / "_metadata").num_row_groups == 3
+    assert writer.rows_written == 3
+
+
+def test_writes_more_partitions_than_arrow_allows_at_once(tmp_path):
+    # 60 symbols with 35 years of bars make 2100 partitions in a single flush
+    years = [f"{year}-06-01T04:00:00Z" for year in range(1990, 2025)]
+    table = make_table({f"S{index:02d}": years for index in range(60)})
+    writer = HistoricalDatasetWriter(str(tmp_path))
+    writer.write(table)
+    writer.close()
+
+    assert len(os.listdir(tmp_path / "symbol=S00")) == 35
+    assert pq.read_metadata(tmp_path / "_metadata").num_row_groups == 2100
+    bars = HistoricalDatasetWriter.read_symbol(str(tmp_path), "S59")
+    assert bars.num_rows == 35
+    assert [t.year for t in bars.column("timestamp").to_pylist()] == list(
+        range(1990, 2025)
+    )
+
+
+def test_read_symbol_prunes_other_symbols(tmp_path):
+    writer = HistoricalDatasetWriter(str(tmp_path))
+    writer.write(make_table({"AAPL": ["2024-01-03T05:00:00Z"]}))
+    writer.write(
+        make_table(
+            {
+                "AAPL": ["2024-01-02T05:00:00Z", "2023-01-03T05:00:00Z"],
+                "MSFT": ["2024-01-02T05:00:00Z"],
+            }
+        )
+    )
+    writer.close()
+
+    table = HistoricalDatasetWriter.read_symbol(str(tmp_path), "AAPL")
+    assert table.column("symbol").to_pylist() == ["AAPL"] * 3
+    assert table.column("timestamp").to_pylist() == sorted(
+        table.column("timestamp").to_pylist()
+    )
+
+    table = HistoricalDatasetWriter.read_symbol(
+        str(tmp_path), "AAPL", columns=["timestamp"], start=datetime(2024, 1, 1)
+    )
+    assert table.num_rows == 2
+
+
+def test_close_appends_to_existing_metadata(tmp_path):
+    for timestamp in ["2024-01-02T05:00:00Z", "2024-01-03T05:00:00Z"]:
+        writer = HistoricalDatasetWriter(str(tmp_path))
+        writer._run_id = timestamp[:10]
+        writer.write(make_table({"AAPL": [timestamp]}))
+        writer.close()
+
+    assert pq.read_metadata(tmp_path / "_metadata").num_row_groups == 2
+    assert HistoricalDatasetWriter.dataset(str(tmp_path)).count_rows() == 2
+
+
+def test_abort_removes_written_files(tmp_path):
+    writer = HistoricalDatasetWriter(str(tmp_path))
+    writer.write(make_table({"AAPL": ["2024-01-02T05:00:00Z"]}))
+    writer.abort()
+
+    assert os.listdir(tmp_path / "symbol=AAPL" / "year=2024") == []
+    assert not os.path.exists(tmp_path / "_metadata")
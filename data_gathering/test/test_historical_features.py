@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from data_gathering.test.test_gather_all_data import make_data_fetcher
+from data_gathering.utils.output_utils.historical_data.historical_dataset_writer import (
+    HistoricalDatasetWriter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_features import (
+    FEATURE_COLUMNS,
+    HistoricalFeatures,
+)
+
+
+def make_bars(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for symbol, length in lengths.items():
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        open_ = close * np.exp(rng.normal(0, 0.01, length))
+        frames.append(
+            pd.DataFrame(
+                {
+                    "symbol": symbol,
+                    "timestamp": pd.date_range(
+                        "2024-01-01", periods=length, tz="UTC", unit="ns"
+                    ),
+                    "open": open_,
+                    "high": np.maximum(open_, close) * 1.01,
+                    "low": np.minimum(open_, close) * 0.99,
+                    "close": close,
+                    "volume": rng.integers(1_000, 100_000, length).astype(np.uint32),
+                }
+            )
+        )
+    # the stored bars are not sorted by symbol
+    return pd.concat(frames).sample(frac=1, random_state=seed)
+
+
+def reference_features(bars, window):
+    # the same features with a rolling window per symbol
+    frames = []
+    for _, group in bars.sort_values(["symbol", "timestamp"]).groupby("symbol"):
+        previous_close = group["close"].shift()
+        log_return = np.log(group["close"] / previous_close)
+        true_range = np.fmax(group["high"], previous_close) - np.fmin(
+            group["low"], previous_close
+        )
+        high_low = np.log(group["high"] / group["low"]) ** 2
+        close_open = np.log(group["close"] / group["open"]) ** 2
+        volume = group["volume"].astype(float)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "log_return": log_return,
+                    "realized_volatility": np.sqrt(
+                        252 * (log_return**2).rolling(window).mean()
+                    ),
+                    "atr": true_range.rolling(window).mean(),
+                    "parkinson_volatility": np.sqrt(
+                        252 * high_low.rolling(window).mean() / (4 * np.log(2))
+                    ),
+                    "garman_klass_volatility": np.sqrt(
+                        252
+                        * (0.5 * high_low - (2 * np.log(2) - 1) * close_open)
+                        .rolling(window)
+                        .mean()
+                    ),
+                    "volume_zscore": (volume - volume.rolling(window).mean())
+                    / volume.rolling(window).std(),
+                }
+            )
+        )
+    return pd.concat(frames).reset_index(drop=True)
+
+
+def test_compute_matches_a_window_per_symbol():
+    bars = make_bars({"MSFT": 40, "AAPL": 25, "NVDA": 3})
+    features = HistoricalFeatures.compute(pa.Table.from_pandas(bars), window=5)
+
+    assert list(features["symbol"].unique()) == ["AAPL", "MSFT", "NVDA"]
+    assert features.groupby("symbol", observed=True)[
+        "timestamp"
+    ].is_monotonic_increasing.all()
+    pd.testing.assert_frame_equal(
+        features[FEATURE_COLUMNS], reference_features(bars, 5), check_exact=False
+    )
+
+
+def test_windows_do_not_reach_into_the_previous_symbol():
+    features = HistoricalFeatures.compute(
+        pa.Table.from_pandas(make_bars({"AAPL": 10, "MSFT": 10})), window=5
+    )
+    msft = features[features["symbol"] == "MSFT"]
+
+    assert msft["atr"].isna().tolist() == [True] * 4 + [False] * 6
+    # returns start with the second bar
+    assert msft["realized_volatility"].isna().sum() == 5
+
+
+def test_compute_reads_stored_bars(tmp_path):
+    bars = pa.Table.from_pandas(
+        make_bars({"AAPL": 30, "MSFT": 30}), preserve_index=False
+    )
+    writer = HistoricalDatasetWriter(str(tmp_path / "dataset"))
+    writer.write(bars)
+    writer.close()
+
+    features = HistoricalFeatures.compute(str(tmp_path / "dataset"))
+    expected = HistoricalFeatures.compute(bars)
+    pd.testing.assert_frame_equal(features[FEATURE_COLUMNS], expected[FEATURE_COLUMNS])
+
+    path = str(tmp_path / "features.parquet")
+    HistoricalFeatures.write(features, path)
+    assert len(pd.read_parquet(path)) == 60
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_computes_features(tmp_path, api_keys):
+    path = str(tmp_path / "features.parquet")
+    data_fetcher = make_data_fetcher(
+        tmp_path, api_keys, ["AAPL", "MSFT", "NVDA"], features=True, features_path=path
+    )
+    await data_fetcher.fetch_all_data()
+
+    features = pd.read_parquet(path)
+    # one bar each, too few for a window
+    assert sorted(features["symbol"]) == ["AAPL", "MSFT", "NVDA"]
+    assert features["atr"].isna().all()
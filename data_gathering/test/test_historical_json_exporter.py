@@ -0,0 +1,174 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer
+from data_gathering.utils.output_utils.historical_data.historical_data_output_utils import (
+    HistoricalDataOutputUtils,
+)
+from data_gathering.utils.output_utils.historical_data.historical_dataset_writer import (
+    HistoricalDatasetWriter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_json_exporter import (
+    HistoricalJSONExporter,
+)
+from data_gathering.utils.output_utils.historical_data.historical_parquet_writer import (
+    HistoricalParquetWriter,
+)
+
+
+def make_table(bars_by_symbol):
+    buffer = BarBuffer()
+    for symbol, timestamps in bars_by_symbol.items():
+        buffer.append(
+            symbol,
+            [
+                {"t": t, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 10, "n": 3}
+                for t in timestamps
+            ],
+        )
+    return buffer.to_arrow()
+
+
+BARS = {
+    "MSFT": ["2024-01-02T05:00:00Z"],
+    "AAPL": ["2024-01-03T05:00:00Z", "2024-01-02T05:00:00Z"],
+}
+
+
+def read_lines(path, compression=None):
+    with pa.input_stream(str(path), compression=compression) as stream:
+        return [json.loads(line) for line in stream.read().splitlines()]
+
+
+def test_exports_ndjson_sorted_by_symbol_and_time(tmp_path):
+    path = tmp_path / "bars.ndjson"
+    exporter = HistoricalJSONExporter(str(path))
+
+    assert exporter.export(make_table(BARS)) == 3
+    rows = read_lines(path)
+    assert [(row["symbol"], row["timestamp"]) for row in rows] == [
+        ("AAPL", "2024-01-02T05:00:00Z"),
+        ("AAPL", "2024-01-03T05:00:00Z"),
+        ("MSFT", "2024-01-02T05:00:00Z"),
+    ]
+    assert rows[0]["close"] == 1.5
+    assert rows[0]["volume"] == 10
+    assert not (tmp_path / "bars.ndjson.tmp").exists()
+
+
+def test_exports_json_nested_by_symbol_and_time(tmp_path):
+    path = tmp_path / "bars.json"
+    HistoricalJSONExporter(str(path), "json", max_rows=1).export(make_table(BARS))
+
+    data = json.loads(path.read_text())
+    assert list(data) == ["AAPL", "MSFT"]
+    assert list(data["AAPL"]) == ["2024-01-02T05:00:00Z", "2024-01-03T05:00:00Z"]
+    assert data["MSFT"]["2024-01-02T05:00:00Z"]["open"] == 1.0
+
+
+@pytest.mark.parametrize("extension, codec", [(".gz", "gzip"), (".zst", "zstd")])
+def test_detects_compression_from_extension(tmp_path, extension, codec):
+    path = tmp_path / f"bars.ndjson{extension}"
+    HistoricalJSONExporter(str(path)).export(make_table(BARS))
+
+    assert len(read_lines(path, codec)) == 3
+
+
+def test_groups_symbols_up_to_max_rows():
+    exporter = HistoricalJSONExporter("bars.ndjson", max_rows=3)
+    counts = {"MSFT": 1, "AAPL": 2, "GOOG": 2, "TSLA": 5}
+
+    assert list(exporter.symbol_groups(counts)) == [
+        ["AAPL"],
+        ["GOOG", "MSFT"],
+        ["TSLA"],
+    ]
+
+
+def test_exports_from_stored_outputs(tmp_path):
+    parquet_writer = HistoricalParquetWriter(str(tmp_path / "bars.parquet"))
+    dataset_writer = HistoricalDatasetWriter(str(tmp_path / "bars"))
+    for writer in (parquet_writer, dataset_writer):
+        writer.write(make_table(BARS))
+        writer.close()
+
+    for source in ("bars.parquet", "bars"):
+        path = tmp_path / f"{source}.ndjson"
+        HistoricalJSONExporter(str(path), max_rows=2).export(str(tmp_path / source))
+        assert [row["symbol"] for row in read_lines(path)] == ["AAPL", "AAPL", "MSFT"]
+        assert "year" not in read_lines(path)[0]
+
+
+def test_scans_the_source_once_for_many_groups(tmp_path, monkeypatch):
+    # every flush adds a row group with all symbols, so no group is contiguous
+    writer = HistoricalParquetWriter(str(tmp_path / "bars.parquet"))
+    for day in ("02", "03"):
+        writer.write(make_table({s: [f"2024-01-{day}T05:00:00Z"] for s in "CBA"}))
+    writer.close()
+
+    scans = []
+    open_source = HistoricalJSONExporter.open_source
+
+    class CountingDataset:
+        def __init__(self, dataset):
+            self.dataset = dataset
+
+        def __getattr__(self, name):
+            return getattr(self.dataset, name)
+
+        def to_batches(self, columns=None, **kwargs):
+            if columns != ["symbol"]:
+                scans.append(columns)
+            return self.dataset.to_batches(columns=columns, **kwargs)
+
+        def to_table(self, *args, **kwargs):
+            scans.append(kwargs.get("columns"))
+            return self.dataset.to_table(*args, **kwargs)
+
+    monkeypatch.setattr(
+        HistoricalJSONExporter,
+        "open_source",
+        staticmethod(lambda source: CountingDataset(open_source(source))),
+    )
+    path = tmp_path / "bars.ndjson"
+    exporter = HistoricalJSONExporter(str(path), max_rows=2)
+
+    assert exporter.export(str(tmp_path / "bars.parquet")) == 6
+    assert len(scans) == 1
+    rows = read_lines(path)
+    assert [row["symbol"] for row in rows] == ["A", "A", "B", "B", "C", "C"]
+    assert rows[0]["timestamp"] < rows[1]["timestamp"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bars.ndjson", "bars.parquet"]
+
+
+def test_json_after_an_empty_group_has_no_leading_separator(tmp_path, monkeypatch):
+    iter_groups = HistoricalJSONExporter.iter_groups
+
+    def with_empty_group(self, dataset, tmp_dir):
+        groups = list(iter_groups(self, dataset, tmp_dir))
+        yield groups[0].iloc[:0]
+        yield from groups
+
+    monkeypatch.setattr(HistoricalJSONExporter, "iter_groups", with_empty_group)
+    path = tmp_path / "bars.json"
+    HistoricalJSONExporter(str(path), "json").export(make_table(BARS))
+
+    assert list(json.loads(path.read_text())) == ["AAPL", "MSFT"]
+
+
+def test_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        HistoricalJSONExporter("bars.csv", "csv")
+
+
+def test_output_combined_symbol_df_to_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    buffer = BarBuffer()
+    buffer.append("AAPL", [{"t": "2024-01-02T05:00:00Z", "o": 1.0, "c": 1.5}])
+    df = HistoricalDataOutputUtils.combine_dataframes(buffer)
+
+    assert HistoricalDataOutputUtils.output_combined_symbol_df_to_json(df, "out.json")
+    data = json.loads((tmp_path / "output" / "out.json").read_text())
+    assert data["AAPL"]["2024-01-02T05:00:00Z"]["close"] == 1.5
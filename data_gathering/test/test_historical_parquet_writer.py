@@ -0,0 +1,73 @@
+import os
+
+import pyarrow.parquet as pq
+
+from data_gathering.data.historical_prices.bar_buffer import BarBuffer
+from data_gathering.utils.output_utils.historical_data.historical_parquet_writer import (
+    HistoricalParquetWriter,
+)
+
+
+def make_table(symbol, timestamps):
+    buffer = BarBuffer()
+    buffer.append(
+        symbol,
+        [
+            {"t": t, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 10, "n": 3, "vw": 1.2}
+            for t in timestamps
+        ],
+    )
+    return buffer.to_arrow()
+
+
+def test_writes_row_group_per_flush(tmp_path):
+    path = os.path.join(tmp_path, "out", "historical_data.parquet")
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_table("AAPL", ["2023-01-03T05:00:00Z"]))
+    writer.write(make_table("MSFT", ["2023-01-03T05:00:00Z", "2023-01-04T05:00:00Z"]))
+    # nothing is visible until the writer is closed
+    assert not os.path.exists(path)
+    writer.close()
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.metadata.num_row_groups == 2
+    assert parquet_file.read().column("symbol").to_pylist() == ["AAPL", "MSFT", "MSFT"]
+    assert writer.rows_written == 3
+
+
+def test_append_keeps_stored_bars(tmp_path):
+    path = os.path.join(tmp_path, "historical_data.parquet")
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_table("AAPL", ["2023-01-03T05:00:00Z"]))
+    writer.close()
+
+    writer = HistoricalParquetWriter(path, append=True)
+    writer.write(make_table("AAPL", ["2023-01-04T05:00:00Z"]))
+    writer.close()
+
+    table = pq.read_table(path)
+    assert table.num_rows == 2
+    assert writer.rows_written == 1
+
+
+def test_close_without_bars_keeps_file(tmp_path):
+    path = os.path.join(tmp_path, "historical_data.parquet")
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_table("AAPL", ["2023-01-03T05:00:00Z"]))
+    writer.close()
+
+    HistoricalParquetWriter(path).close()
+    assert pq.read_table(path).num_rows == 1
+
+
+def test_abort_leaves_stored_file(tmp_path):
+    path = os.path.join(tmp_path, "historical_data.parquet")
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_table("AAPL", ["2023-01-03T05:00:00Z"]))
+    writer.close()
+
+    writer = HistoricalParquetWriter(path)
+    writer.write(make_table("MSFT", ["2023-01-03T05:00:00Z"]))
+    writer.abort()
+    assert pq.read_table(path).column("symbol").to_pylist() == ["AAPL"]
+    assert not os.path.exists(writer.tmp_path)
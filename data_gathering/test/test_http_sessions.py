@@ -0,0 +1,57 @@
+import aiohttp
+import pytest
+
+from data_gathering.utils.http_sessions import DEFAULT_CONCURRENCY, ProviderSessions
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared_per_provider():
+    http = ProviderSessions()
+    alpaca = http.session("alpaca", headers={"APCA-API-KEY-ID": "key"})
+
+    assert http.session("alpaca") is alpaca
+    assert http.session("fmp") is not alpaca
+    assert alpaca.headers["APCA-API-KEY-ID"] == "key"
+    await http.close()
+    assert alpaca.closed
+
+
+@pytest.mark.asyncio
+async def test_connector_is_tuned():
+    http = ProviderSessions({"alpaca": 3}, keepalive_timeout=15, ttl_dns_cache=120)
+    connector = http.session("alpaca").connector
+
+    assert connector.limit == 6
+    assert connector.limit_per_host == 6
+    assert connector.use_dns_cache
+    await http.close()
+
+
+@pytest.mark.asyncio
+async def test_session_is_recreated_after_close():
+    http = ProviderSessions()
+    session = http.session("fmp")
+    await http.close()
+
+    assert http.session("fmp") is not session
+    await http.close()
+
+
+def test_concurrency_budget_per_provider():
+    http = ProviderSessions({"alpaca": 8})
+
+    assert http.budget("alpaca") == 8
+    assert http.budget("fmp") == DEFAULT_CONCURRENCY["fmp"]
+    # unknown providers get a single request at a time
+    assert http.budget("other") == 1
+    assert http.limit("alpaca") is http.limit("alpaca")
+    assert http.limit("alpaca") is not http.limit("fmp")
+
+
+@pytest.mark.asyncio
+async def test_sessions_get_the_trace_configs():
+    trace = aiohttp.TraceConfig()
+    http = ProviderSessions(trace_configs=[trace])
+
+    assert http.session("alpaca").trace_configs == [trace]
+    await http.close()
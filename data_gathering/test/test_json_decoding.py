@@ -0,0 +1,86 @@
+import json
+import math
+
+import pytest
+
+from data_gathering.test.fakes import make_bar
+from data_gathering.utils.json_decoding import (
+    JSONDecoder,
+    available_decoders,
+    get_decoder,
+)
+
+
+@pytest.fixture(params=available_decoders())
+def decoder(request):
+    return get_decoder(request.param)
+
+
+def test_decode_bars_into_columns(decoder):
+    body = json.dumps(
+        {
+            "bars": {
+                "AAPL": [
+                    make_bar("2023-01-03T05:00:00Z"),
+                    make_bar("2023-01-04T05:00:00Z", close=151.5),
+                ],
+                "MSFT": [],
+            },
+            "next_page_token": "token",
+        }
+    ).encode()
+
+    page = decoder.decode_bars(body)
+    assert page["next_page_token"] == "token"
+    # symbols without bars are left out
+    assert list(page["bars"]) == ["AAPL"]
+    columns = page["bars"]["AAPL"]
+    assert columns["timestamp"] == ["2023-01-03T05:00:00Z", "2023-01-04T05:00:00Z"]
+    assert columns["close"] == [150.0, 151.5]
+    assert columns["volume"] == [20000, 20000]
+    assert set(columns) == {
+        "timestamp",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "trade_count",
+        "vwap",
+    }
+
+
+def test_decode_bars_fills_missing_fields(decoder):
+    bar = make_bar("2023-01-03T05:00:00Z")
+    del bar["vw"], bar["n"]
+
+    columns = decoder.decode_bars(json.dumps({"bars": {"AAPL": [bar]}}).encode())[
+        "bars"
+    ]["AAPL"]
+    assert math.isnan(columns["vwap"][0])
+    assert columns["trade_count"] == [0]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b'{"message": "forbidden"}', b"not json", b"[]", b'{"bars": null}'],
+)
+def test_decode_bars_rejects_other_bodies(decoder, body):
+    page = decoder.decode_bars(body)
+    if body == b'{"bars": null}':
+        assert page == {"bars": {}, "next_page_token": None}
+    else:
+        assert page is None
+
+
+def test_loads_raises_value_error(decoder):
+    assert decoder.loads(b'[{"symbol": "AAPL"}]') == [{"symbol": "AAPL"}]
+    with pytest.raises(ValueError):
+        decoder.loads(b"not json")
+
+
+def test_get_decoder():
+    assert get_decoder().name == available_decoders()[0]
+    assert isinstance(get_decoder("json"), JSONDecoder)
+    with pytest.raises(ValueError):
+        get_decoder("simdjson")
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from data_gathering.utils.metrics import Histogram, Metrics, NullMetrics
+
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.05, 0.5, 3.0):
+        histogram.observe(seconds)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    # past the last bucket the largest observation is the best bound
+    assert histogram.quantile(0.99) == 3.0
+    assert histogram.summary()["mean"] == pytest.approx(0.9)
+
+
+def test_metrics_are_kept_per_name_and_labels():
+    metrics = Metrics()
+    metrics.increment("bytes_downloaded", 100, provider="alpaca")
+    metrics.increment("bytes_downloaded", 50, provider="alpaca")
+    metrics.increment("bytes_downloaded", 10, provider="fmp")
+    with metrics.time("stage_seconds", stage="parse"):
+        pass
+    metrics.set_gauge("queue_depth", 3, queue="pages")
+    metrics.set_gauge("queue_depth", 1, queue="pages")
+
+    summary = metrics.summary()
+    assert summary["counters"] == {
+        'bytes_downloaded{provider="alpaca"}': 150,
+        'bytes_downloaded{provider="fmp"}': 10,
+    }
+    assert summary["histograms"]['stage_seconds{stage="parse"}']["count"] == 1
+    assert summary["gauges"]['queue_depth{queue="pages"}'] == {
+        "last": 1,
+        "max": 3,
+        "mean": 2.0,
+    }
+
+
+def test_prometheus_format():
+    metrics = Metrics()
+    metrics.observe("stage_seconds", 0.2, stage="write")
+    metrics.increment("rows", 10, stage="write")
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE data_gathering_stage_seconds histogram" in lines
+    assert 'data_gathering_stage_seconds_bucket{stage="write",le="0.1"} 0' in lines
+    assert 'data_gathering_stage_seconds_bucket{stage="write",le="0.25"} 1' in lines
+    assert 'data_gathering_stage_seconds_bucket{stage="write",le="+Inf"} 1' in lines
+    assert 'data_gathering_stage_seconds_count{stage="write"} 1' in lines
+    assert 'data_gathering_rows_total{stage="write"} 10' in lines
+
+
+def test_report_writes_json(tmp_path):
+    metrics = Metrics()
+    metrics.increment("symbols", 2)
+    path = tmp_path / "metrics" / "run.json"
+
+    metrics.report("json", str(path))
+    assert json.loads(path.read_text())["counters"] == {"symbols": 2}
+
+    with pytest.raises(ValueError):
+        metrics.report("csv", str(path))
+
+
+def test_null_metrics_record_nothing():
+    metrics = NullMetrics()
+    metrics.increment("symbols")
+    metrics.observe("stage_seconds", 1.0, stage="parse")
+    with metrics.time("stage_seconds", stage="write"):
+        pass
+
+    assert not metrics.enabled
+    assert metrics.summary()["counters"] == {}
+    assert metrics.summary()["histograms"] == {}
@@ -0,0 +1,75 @@
+import aiohttp
+import pytest
+
+from benchmarks.load_test import run_load_test
+from benchmarks.mock_server import MockAPIServer
+
+
+async def get_json(url, **params):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, params=params) as response:
+            return response.status, response.headers, await response.json()
+
+
+@pytest.mark.asyncio
+async def test_bars_are_paginated_across_symbols():
+    async with MockAPIServer(symbols=3, bars_per_symbol=5, latency=0) as server:
+        pages, page_token = [], None
+        while True:
+            params = {"symbols": "AAAB,AAAA", "start": "2020-01-01", "limit": "3"}
+            if page_token:
+                params["page_token"] = page_token
+            status, _, page = await get_json(server.alpaca_base_url, **params)
+            assert status == 200
+            pages.append(page["bars"])
+            if not (page_token := page["next_page_token"]):
+                break
+
+    assert [sum(map(len, page.values())) for page in pages] == [3, 3, 3, 1]
+    assert list(pages[1]) == ["AAAA", "AAAB"]
+    bars = [bar["t"] for page in pages for bar in page.get("AAAA", [])]
+    assert bars == sorted(bars) and len(bars) == 5
+
+
+@pytest.mark.asyncio
+async def test_requests_over_quota_are_rate_limited():
+    async with MockAPIServer(symbols=1, latency=0, rate_limit=2) as server:
+        statuses = []
+        for _ in range(3):
+            status, headers, _ = await get_json(
+                server.fmp_base_url + "/earning_calendar",
+                **{"from": "2024-01-01", "to": "2024-01-14"},
+            )
+            statuses.append((status, headers["X-RateLimit-Remaining"]))
+
+    assert statuses == [(200, "1"), (200, "0"), (429, "0")]
+    assert "Retry-After" in headers
+
+
+@pytest.mark.asyncio
+async def test_calendar_lists_every_symbol_once_per_period():
+    async with MockAPIServer(symbols=30, latency=0) as server:
+        _, _, earnings = await get_json(
+            server.fmp_base_url + "/earning_calendar",
+            **{"from": "2024-01-01", "to": "2024-01-15"},
+        )
+
+    assert len(earnings) == 30
+    assert len({earning["symbol"] for earning in earnings}) == 30
+
+
+@pytest.mark.asyncio
+async def test_load_test_runs_the_pipeline(tmp_path):
+    server = MockAPIServer(
+        symbols=40, bars_per_symbol=10, page_limit=50, latency=0, international_rate=0
+    )
+
+    report = await run_load_test(
+        server, str(tmp_path), hist_batch_size=8, transform_executor="inline"
+    )
+
+    assert report["symbols"] == 40
+    assert report["bars"] == 400
+    assert report["blacklisted"] == 0
+    assert report["latency"]["bars"]["requests"] == server.requests["bars", 200]
+    assert report["latency"]["earning_calendar"]["p99_ms"] > 0
@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.utils.rate_limiter import DEFAULT_QUOTAS, RateLimiter, TokenBucket
+
+
+def test_bucket_leaves_headroom():
+    bucket = TokenBucket(200, headroom=0.05)
+    assert bucket.capacity == 190
+    assert bucket.delay() == 0
+
+
+def test_bucket_delay_when_empty():
+    bucket = TokenBucket(60, period=60, headroom=0)
+    bucket.tokens = 0
+    bucket.updated = time.monotonic()
+    # one token refills every second
+    assert 0.9 < bucket.delay() <= 1
+
+
+def test_update_from_headers_lowers_tokens():
+    limiter = RateLimiter({"alpaca": 200})
+    limiter.update_from_headers(
+        "alpaca", {"X-RateLimit-Limit": "200", "X-RateLimit-Remaining": "50"}
+    )
+    assert limiter.bucket("alpaca").tokens == pytest.approx(40, abs=0.1)
+
+
+def test_update_from_headers_blocks_until_reset():
+    limiter = RateLimiter({"alpaca": 200})
+    limiter.update_from_headers(
+        "alpaca",
+        {
+            "X-RateLimit-Limit": "200",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(time.time() + 30),
+        },
+    )
+    assert 29 < limiter.bucket("alpaca").delay() <= 30
+
+
+def test_update_from_headers_adopts_new_limit():
+    limiter = RateLimiter({"fmp": 300})
+    limiter.update_from_headers("fmp", {"X-RateLimit-Limit": "750"})
+    assert limiter.bucket("fmp").limit == 750
+
+
+def test_retry_after_on_429():
+    limiter = RateLimiter({"fmp": 300})
+    retry_after = limiter.update_from_headers("fmp", {"Retry-After": "5"}, status=429)
+    assert retry_after == 5
+    assert 4.9 < limiter.bucket("fmp").delay() <= 5
+
+
+def test_no_retry_without_429():
+    limiter = RateLimiter({"fmp": 300})
+    assert limiter.update_from_headers("fmp", {"Retry-After": "5"}) is None
+
+
+def test_backoff_doubles_up_to_a_period():
+    limiter = RateLimiter({"fmp": 300}, headroom=0)
+    assert limiter.backoff("fmp", 0) == pytest.approx(0.2)
+    assert limiter.backoff("fmp", 2) == pytest.approx(0.8)
+    assert limiter.backoff("fmp", 20) == 60
+    assert 59.9 < limiter.bucket("fmp").delay() <= 60
+
+
+def test_from_api_keys_only_configured_providers():
+    api_keys = APIKeys(
+        fmp_api_key="fmp",
+        finnhub_api_key=None,
+        alpha_vantage_api_key=None,
+        apca_key_id="alpaca",
+        apca_api_secret_key="secret",
+    )
+    limiter = RateLimiter.from_api_keys(api_keys, quotas={"fmp": 750})
+    assert set(limiter.buckets) == {"alpaca", "fmp"}
+    assert limiter.buckets["fmp"].limit == 750
+
+
+def test_from_api_keys_without_keys_has_no_buckets():
+    api_keys = APIKeys(
+        fmp_api_key=None,
+        finnhub_api_key=None,
+        alpha_vantage_api_key=None,
+        apca_key_id=None,
+        apca_api_secret_key=None,
+    )
+    # an empty mapping is not replaced by DEFAULT_QUOTAS
+    assert RateLimiter.from_api_keys(api_keys).buckets == {}
+    assert RateLimiter({}).bucket("fmp").limit == DEFAULT_QUOTAS["fmp"]
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_refill():
+    bucket = TokenBucket(600, period=60, headroom=0)
+    bucket.tokens = 0
+    bucket.updated = time.monotonic()
+    waited = await bucket.acquire()
+    assert waited > 0
+    assert bucket.tokens < 1
+
+
+def test_bucket_share_survives_header_updates():
+    limiter = RateLimiter({"alpaca": 200}, share=0.5)
+    bucket = limiter.bucket("alpaca")
+    assert bucket.capacity == 95
+
+    # the headers report the quota and the requests left of every process
+    limiter.update_from_headers(
+        "alpaca", {"X-RateLimit-Limit": "200", "X-RateLimit-Remaining": "50"}
+    )
+    assert bucket.capacity == 95
+    assert bucket.tokens == pytest.approx(20, abs=0.1)
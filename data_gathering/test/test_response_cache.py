@@ -0,0 +1,76 @@
+import json
+import os
+import time
+
+import pytest
+
+from data_gathering.utils.cache.response_cache import OfflineCacheMiss, ResponseCache
+
+
+def test_normalize_url_sorts_params_and_drops_secrets():
+    normalized = ResponseCache.normalize_url(
+        "HTTPS://Example.com/api?to=2024-01-31&apikey=secret&from=2024-01-01"
+    )
+    assert normalized == "https://example.com/api?from=2024-01-01&to=2024-01-31"
+
+
+def test_key_ignores_param_order():
+    cache = ResponseCache.__new__(ResponseCache)
+    assert cache.key("https://example.com/api?a=1&b=2") == cache.key(
+        "https://example.com/api", {"b": "2", "a": "1"}
+    )
+
+
+def test_set_and_get(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    url = "https://data.alpaca.markets/v2/stocks/bars?symbols=AAPL"
+    assert cache.get(url) is None
+
+    cache.set(url, b'{"bars": {}}')
+    assert cache.get(url) == b'{"bars": {}}'
+    key = cache.key(url)
+    assert os.path.exists(os.path.join(tmp_path, "http", key[:2], f"{key}.body"))
+
+
+def test_expired_response_is_refetched(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttls={}, default_ttl=-1)
+    cache.set("https://example.com/api", b"[]")
+    assert cache.get("https://example.com/api") is None
+
+
+def test_opening_prunes_expired_responses(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttls={"https://example.com/old": 10})
+    cache.set("https://example.com/old", b"[]")
+    cache.set("https://example.com/new", b"[]")
+    assert cache.prune(now=time.time() + 20) == 1
+
+    # the stale copy is gone for offline runs too, the fresh one stays
+    offline_cache = ResponseCache(cache_dir=str(tmp_path), offline=True)
+    with pytest.raises(OfflineCacheMiss):
+        offline_cache.get("https://example.com/old")
+    assert offline_cache.get("https://example.com/new") == b"[]"
+
+    expired = ResponseCache(cache_dir=str(tmp_path), ttls={}, default_ttl=-1)
+    assert expired.prune() == 0
+    assert not any(files for _, _, files in os.walk(tmp_path / "http"))
+
+
+def test_ttl_longest_prefix():
+    cache = ResponseCache.__new__(ResponseCache)
+    cache.ttls = {"https://example.com/": 10, "https://example.com/api/v3/": 20}
+    cache.default_ttl = 5
+    assert cache.ttl("https://example.com/api/v3/quote") == 20
+    assert cache.ttl("https://example.com/other") == 10
+    assert cache.ttl("https://other.com/") == 5
+
+
+def test_offline_serves_expired_and_raises_on_miss(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttls={}, default_ttl=-1)
+    cache.set("https://example.com/api", json.dumps([1]).encode())
+
+    offline_cache = ResponseCache(
+        cache_dir=str(tmp_path), ttls={}, default_ttl=-1, offline=True
+    )
+    assert offline_cache.get("https://example.com/api") == b"[1]"
+    with pytest.raises(OfflineCacheMiss):
+        offline_cache.get("https://example.com/missing")
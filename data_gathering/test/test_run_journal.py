@@ -0,0 +1,51 @@
+import pytest
+
+from data_gathering.utils.cache.run_journal import RunJournal
+
+
+def test_set_status_is_visible_to_other_connections(tmp_path):
+    journal = RunJournal(cache_dir=str(tmp_path))
+    run_id = journal.start_run()
+    journal.set_status(["AAPL", "MSFT"], "fetched")
+    journal.set_status(["AAPL"], "written")
+
+    other = RunJournal(cache_dir=str(tmp_path))
+    other.start_run(resume=True)
+    assert other.run_id == run_id
+    assert other.status("AAPL") == "written"
+    assert other.status("MSFT") == "fetched"
+    assert other.status("NVDA") is None
+    assert other.symbols("written") == {"AAPL"}
+    assert other.counts() == {"written": 1, "fetched": 1}
+
+
+def test_only_unfinished_runs_are_resumed(tmp_path):
+    journal = RunJournal(cache_dir=str(tmp_path))
+    first = journal.start_run()
+    journal.finish_run("failed")
+
+    assert journal.start_run(resume=True) == first
+    assert journal.resumed
+    journal.finish_run()
+
+    second = journal.start_run(resume=True)
+    assert second != first
+    assert not journal.resumed
+    assert journal.symbols("written") == set()
+
+
+def test_start_run_without_resume_starts_a_new_run(tmp_path):
+    journal = RunJournal(cache_dir=str(tmp_path))
+    first = journal.start_run()
+    journal.set_status(["AAPL"], "written")
+    journal.finish_run("failed")
+
+    assert journal.start_run() != first
+    assert journal.status("AAPL") is None
+
+
+def test_unknown_status_is_rejected(tmp_path):
+    journal = RunJournal(cache_dir=str(tmp_path))
+    journal.start_run()
+    with pytest.raises(ValueError):
+        journal.set_status(["AAPL"], "done")
@@ -0,0 +1,131 @@
+import os
+from collections import Counter
+
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.mock_server import MockAPIServer
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.data.gather_all_data import DataFetcher
+from data_gathering.data.shard_coordinator import (
+    fetch_all_shards,
+    merge_shards,
+    quota_shares,
+)
+from data_gathering.test.fakes import FakeBarsSession, FakeUpcomingEarnings
+from data_gathering.test.test_gather_all_data import requested_symbols
+from data_gathering.utils.output_utils.historical_data.historical_dataset_writer import (
+    HistoricalDatasetWriter,
+)
+from data_gathering.utils.sharding import shard_config, shard_of
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMD", "TSLA", "GOOG", "META", "AMZN"]
+
+
+def make_config(tmp_path, **config):
+    return PipelineConfig(
+        **{
+            "cache_dir": str(tmp_path / "cache"),
+            "hist_parquet_path": str(tmp_path / "historical_data.parquet"),
+            "hist_dataset_path": str(tmp_path / "historical_data"),
+            "shard_dir": str(tmp_path / "shards"),
+            "hist_batch_size": 2,
+            "transform_executor": "inline",
+            **config,
+        }
+    )
+
+
+def test_shard_of_is_stable():
+    # the same in every process, hash() of a str is not
+    assert [shard_of(symbol, 4) for symbol in SYMBOLS] == [0, 2, 0, 0, 2, 0, 2, 3]
+    assert all(shard_of(symbol, 1) == 0 for symbol in SYMBOLS)
+
+
+def test_shard_config_separates_the_output(tmp_path):
+    config = make_config(tmp_path, hist_json=True, fundamentals=True)
+    shards = [shard_config(config, index, 2) for index in range(2)]
+
+    assert shards[0].hist_parquet_path != shards[1].hist_parquet_path
+    assert shards[0].hist_parquet_path.startswith(str(tmp_path / "shards"))
+    assert shards[1].quota_share == 0.5
+    assert not shards[0].hist_json
+    # the bulk fundamentals cover every symbol, one shard refreshes them
+    assert [shard.fundamentals for shard in shards] == [True, False]
+    # the features are computed from the merged bars
+    assert not shards[0].features
+    # the config of the whole run is left as it was
+    assert config.hist_parquet_path == str(tmp_path / "historical_data.parquet")
+    assert config.hist_json and not config.sharded
+
+    with pytest.raises(ValueError):
+        shard_config(config, 2, 2)
+
+
+def test_quota_shares_split_each_key_set():
+    assert quota_shares(4, 1) == [0.25] * 4
+    assert quota_shares(3, 2) == [0.5, 1.0, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_shards_fetch_disjoint_symbols_and_merge(tmp_path, api_keys):
+    config = make_config(
+        tmp_path,
+        hist_dataset=True,
+        features=True,
+        features_path=str(tmp_path / "features.parquet"),
+    )
+    sessions = []
+    for index in range(2):
+        data_fetcher = DataFetcher(shard_config(config, index, 2), api_keys)
+        data_fetcher.upcoming_earnings = FakeUpcomingEarnings(SYMBOLS)
+        data_fetcher.historical_data.session = FakeBarsSession()
+        await data_fetcher.fetch_all_data()
+        sessions.append(data_fetcher.historical_data.session)
+
+    for index, session in enumerate(sessions):
+        requested = {
+            symbol
+            for symbols in requested_symbols(session.urls)
+            for symbol in symbols.split(",")
+        }
+        assert requested == {
+            symbol for symbol in SYMBOLS if shard_of(symbol, 2) == index
+        }
+
+    assert merge_shards(config, 2) == len(SYMBOLS)
+    table = pq.read_table(config.hist_parquet_path)
+    assert Counter(table.column("symbol").to_pylist()) == Counter(SYMBOLS)
+    dataset = HistoricalDatasetWriter.dataset(config.hist_dataset_path)
+    assert sorted(dataset.to_table().column("symbol").to_pylist()) == sorted(SYMBOLS)
+    # computed once from the merged bars
+    features = pq.read_table(config.features_path)
+    assert sorted(features.column("symbol").to_pylist()) == sorted(SYMBOLS)
+
+    # each shard keeps its own marks
+    cache_dir = tmp_path / "cache"
+    assert len(list(cache_dir.glob("high_water_marks_shard-*.pkl"))) == 2
+
+    # merging again rebuilds the output instead of appending to it
+    assert merge_shards(config, 2) == len(SYMBOLS)
+    assert pq.read_metadata(config.hist_parquet_path).num_rows == len(SYMBOLS)
+    assert not os.path.exists(f"{config.hist_dataset_path}.tmp")
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_shards_in_processes(tmp_path, api_keys):
+    async with MockAPIServer(symbols=40, bars_per_symbol=5, latency=0) as server:
+        config = make_config(
+            tmp_path,
+            alpaca_base_url=server.alpaca_base_url,
+            fmp_base_url=server.fmp_base_url,
+            hist_incremental=False,
+            hist_batch_size=10,
+        )
+        rows = await fetch_all_shards(config, 3, [api_keys])
+
+    symbols = pq.read_table(config.hist_parquet_path).column("symbol").to_pylist()
+    assert rows["merged"] == len(symbols) == sum(rows[f"shard {i}"] for i in range(3))
+    assert set(symbols) == server.requested_symbols
+    # every symbol was fetched by exactly one shard
+    assert all(count == 5 for count in Counter(symbols).values())
@@ -0,0 +1,40 @@
+import pytest
+
+from data_gathering.models.symbol_registry import SymbolRegistry
+from data_gathering.models.symbols import Symbol
+from data_gathering.models.upcoming_earning import UpcomingEarning
+
+
+def test_ids_are_assigned_in_order():
+    registry = SymbolRegistry()
+    assert registry.id("AAPL") == 0
+    assert registry.id("MSFT") == 1
+    assert registry.id("AAPL") == 0
+    assert registry.ticker(1) == "MSFT"
+    assert registry.ids(["MSFT", "NVDA", "AAPL"]).tolist() == [1, 2, 0]
+    assert len(registry) == 3
+    assert "NVDA" in registry
+
+
+def test_symbol_is_interned():
+    registry = SymbolRegistry()
+    symbol = registry.symbol("AAPL")
+    assert symbol is registry.symbol("".join(["AA", "PL"]))
+    assert symbol.id == registry.id("AAPL")
+    assert str(symbol) == "AAPL"
+
+
+def test_international_symbols_get_no_id():
+    registry = SymbolRegistry()
+    assert registry.symbol("KONT.ST") is None
+    assert registry.symbol("KONT.ST") is None
+    assert "KONT.ST" not in registry
+
+
+def test_models_have_no_instance_dict():
+    symbol = Symbol("AAPL")
+    earning = UpcomingEarning(symbol, "2024-05-30")
+    for instance in (symbol, earning):
+        assert not hasattr(instance, "__dict__")
+        with pytest.raises(AttributeError):
+            instance.other = 1
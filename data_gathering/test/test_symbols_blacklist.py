@@ -0,0 +1,68 @@
+import os
+import pickle
+import time
+
+from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+
+
+def test_add_symbol_is_blacklisted_before_flush(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    cache.add_symbol("AAPL", reason="no historical data")
+    assert cache.is_blacklisted("AAPL")
+    assert "AAPL" in cache
+    assert not cache.is_blacklisted("MSFT")
+
+
+def test_flush_is_visible_to_other_connections(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    cache.add_symbol("AAPL")
+    cache.add_symbol("MSFT", reason="no historical data")
+
+    other = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    assert not other.is_blacklisted("AAPL")
+
+    cache.flush()
+    assert other.is_blacklisted("AAPL")
+    assert other.reason("MSFT") == "no historical data"
+
+
+def test_batches_are_written_during_the_run(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path), batch_size=2)
+    cache.add_symbol("AAPL")
+    cache.add_symbol("MSFT")
+    assert cache.new_symbols == {}
+    assert BlacklistSymbolCache(cache_dir=str(tmp_path)).is_blacklisted("MSFT")
+
+
+def test_ttl_expires_entries(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    cache.add_symbol("AAPL", ttl=-1)
+    cache.add_symbol("MSFT", ttl=3600)
+    cache.flush()
+    assert not cache.is_blacklisted("AAPL")
+    assert cache.is_blacklisted("MSFT")
+    assert cache.purge_expired() == 1
+
+
+def test_default_ttl(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path), default_ttl=3600)
+    cache.add_symbol("AAPL")
+    reason, expires_at = cache.new_symbols["AAPL"]
+    assert expires_at > time.time() + 3500
+
+
+def test_filter_blacklisted_symbols(tmp_path):
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path), blacklist_symbols=["AAPL"])
+    cache.add_symbol("MSFT")
+    assert cache.filter_blacklisted_symbols({"AAPL", "MSFT", "NVDA"}) == {"NVDA"}
+
+
+def test_migrates_pickled_blacklist(tmp_path):
+    pickle_file = os.path.join(tmp_path, "blacklist.pkl")
+    with open(pickle_file, "wb") as file:
+        pickle.dump(frozenset({"AAPL", "MSFT"}), file)
+
+    cache = BlacklistSymbolCache(cache_dir=str(tmp_path))
+    assert cache.is_blacklisted("AAPL")
+    assert cache.reason("MSFT") == "migrated"
+    assert not os.path.exists(pickle_file)
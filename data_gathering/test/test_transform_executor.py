@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from data_gathering.utils.transform_executor import TransformExecutor
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+async def test_run_returns_result(mode):
+    executor = TransformExecutor(mode, max_workers=1)
+    try:
+        assert await executor.run(os.path.join, "a", "b") == os.path.join("a", "b")
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_mode_runs_in_another_process():
+    executor = TransformExecutor("process", max_workers=1)
+    try:
+        assert await executor.run(os.getpid) != os.getpid()
+    finally:
+        executor.shutdown()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        TransformExecutor("gpu")
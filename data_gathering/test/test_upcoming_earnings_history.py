@@ -1,106 +1,272 @@
+import pandas as pd
 import pytest
-import aiohttp
+import pytest_asyncio
 import asyncio
-from unittest.mock import AsyncMock, patch
+import aiohttp
 from datetime import datetime
-from data_gathering.config.api_keys import APIKeys
+from urllib.parse import parse_qs, urlparse
 from data_gathering.data.historical_prices.upcoming_earnings_history import (
     HistoricalData,
 )
-
-
-@pytest.fixture
-def api_keys():
-    return APIKeys(
-        apca_key_id="test_key_id",
-        apca_api_secret_key="test_secret_key",
-        fmp_api_key=None,
-        finnhub_api_key=None,
-        alpha_vantage_api_key=None,
-    )
+from data_gathering.test.fakes import FakeResponse, FakeSession, make_bar
+from data_gathering.utils.cache.high_water_marks import HighWaterMarkCache
+from data_gathering.utils.cache.response_cache import ResponseCache
+from data_gathering.utils.cache.symbols_blacklist import BlacklistSymbolCache
+from data_gathering.utils.http_sessions import ProviderSessions
+from data_gathering.utils.rate_limiter import RateLimiter
 
 
 @pytest.fixture
 def data_fetcher():
     class DataFetcher:
-        semaphore = asyncio.Semaphore(10)
+        http = ProviderSessions({"alpaca": 10})
+        rate_limiter = RateLimiter({"alpaca": 200})
+        response_cache = None
 
     return DataFetcher()
 
 
 @pytest.fixture
-async def historical_data(api_keys, data_fetcher):
-    hd = HistoricalData(api_keys, "2023-01-01", "2023-01-01", data_fetcher)
+def cache(tmp_path):
+    return BlacklistSymbolCache(cache_dir=str(tmp_path))
+
+
+@pytest.fixture
+def high_water_marks(tmp_path):
+    return HighWaterMarkCache(cache_dir=str(tmp_path))
+
+
+@pytest_asyncio.fixture
+async def historical_data(api_keys, cache, data_fetcher, high_water_marks):
+    hd = HistoricalData(
+        api_keys, "2023-01-01", "2023-01-31", cache, data_fetcher, high_water_marks
+    )
     yield hd
     await hd.close()
 
 
+def requested_symbols(url):
+    return parse_qs(urlparse(url).query)["symbols"][0].split(",")
+
+
+def requested_start(url):
+    return parse_qs(urlparse(url).query)["start"][0]
+
+
 @pytest.mark.asyncio
 async def test_fetch_historical(historical_data):
     symbol = "AAPL"
+    historical_data.session = FakeSession(
+        {"bars": {symbol: [make_bar("2023-01-01T00:00:00Z")]}}
+    )
 
-    mock_response = {
-        "bars": [
-            {
-                "c": 150.0,
-                "h": 155.0,
-                "l": 145.0,
-                "n": 10000,
-                "o": 148.0,
-                "t": "2023-01-01T00:00:00Z",
-                "v": 20000,
-                "vw": 151.0,
-            }
-        ]
-    }
+    await historical_data.fetch_historical_data(symbol)
+    df = historical_data.bars.to_dataframe()
+    assert len(df) == 1
+    assert df.index[0] == (symbol, pd.Timestamp("2023-01-01", tz="UTC"))
+    assert df["close"].iloc[0] == 150.0
 
-    with patch("aiohttp.ClientSession.get", new=AsyncMock()) as mock_get:
-        mock_get.return_value.__aenter__.return_value.json = AsyncMock(
-            return_value=mock_response
-        )
 
-        data = await historical_data.fetch_historical_data(symbol)
-        assert data is not None
-        assert symbol in historical_data.historical_data_by_symbol
-        df = historical_data.historical_data_by_symbol[symbol]
-        assert not df.empty
-        assert df.index[0] == datetime(2023, 1, 1)
+@pytest.mark.asyncio
+async def test_fetch_historical_data_no_bars(historical_data, cache):
+    symbol = "AAPL"
+    historical_data.session = FakeSession({"bars": {}})
+
+    await historical_data.fetch_historical_data(symbol)
+    assert symbol not in historical_data.bars.received_symbols
+    assert cache.is_blacklisted(symbol)
 
 
 @pytest.mark.asyncio
-async def test_fetch_historical_data_no_bars(historical_data):
+async def test_fetch_historical_data_with_error(historical_data, cache):
     symbol = "AAPL"
+    historical_data.session = FakeSession({"message": "some error"})
+
+    data = await historical_data.fetch_data(symbol)
+    assert data is None
+    assert not cache.is_blacklisted(symbol)
+
+
+@pytest.mark.asyncio
+async def test_fetch_batch_splits_response_by_symbol(historical_data, cache):
+    historical_data.session = FakeSession(
+        {
+            "bars": {
+                "AAPL": [make_bar("2023-01-01T00:00:00Z")],
+                "MSFT": [make_bar("2023-01-01T00:00:00Z", close=300.0)],
+            }
+        }
+    )
+
+    await historical_data.fetch_historical_data_batch(["AAPL", "MSFT", "EMPTY"])
+    assert requested_symbols(historical_data.session.urls[0]) == [
+        "AAPL",
+        "MSFT",
+        "EMPTY",
+    ]
+    df = historical_data.bars.to_dataframe()
+    assert df.loc["MSFT", "close"].tolist() == [300.0]
+    assert df.loc["AAPL", "close"].tolist() == [150.0]
+    assert historical_data.bars.received_symbols == {"AAPL", "MSFT"}
+    assert set(cache.new_symbols) == {"EMPTY"}
+    assert cache.reason("EMPTY") == "no historical data"
 
-    mock_response = {"bars": []}
 
-    with patch("aiohttp.ClientSession.get", new=AsyncMock()) as mock_get:
-        mock_get.return_value.__aenter__.return_value.json = AsyncMock(
-            return_value=mock_response
-        )
+@pytest.mark.asyncio
+async def test_fetch_batch_follows_page_token(historical_data):
+    historical_data.session = FakeSession(
+        {
+            "bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]},
+            "next_page_token": "token",
+        },
+        {
+            "bars": {
+                "AAPL": [make_bar("2023-01-02T00:00:00Z")],
+                "MSFT": [make_bar("2023-01-01T00:00:00Z")],
+            },
+            "next_page_token": None,
+        },
+    )
 
-        data = await historical_data.fetch_historical_data(symbol)
-        assert data is not None
-        assert symbol in historical_data.symbols_without_historical_data
+    data = await historical_data.fetch_batch(["AAPL", "MSFT"])
+    df = data.to_dataframe()
+    assert df.loc["AAPL"].index.tolist() == [
+        pd.Timestamp("2023-01-01", tz="UTC"),
+        pd.Timestamp("2023-01-02", tz="UTC"),
+    ]
+    assert df.loc["MSFT", "close"].tolist() == [150.0]
+    assert "page_token=token" in historical_data.session.urls[1]
 
 
 @pytest.mark.asyncio
-async def test_fetch_historical_data_with_error(historical_data):
-    symbol = "AAPL"
+async def test_iter_pages_yields_each_page(historical_data, cache):
+    historical_data.session = FakeSession(
+        {
+            "bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]},
+            "next_page_token": "token",
+        },
+        {
+            "bars": {"AAPL": [make_bar("2023-01-02T00:00:00Z")]},
+            "next_page_token": None,
+        },
+    )
 
-    with patch("aiohttp.ClientSession.get", new=AsyncMock()) as mock_get:
-        mock_get.return_value.__aenter__.return_value.json = AsyncMock(
-            return_value={"error": "some error"}
-        )
+    pages = [page async for page in historical_data.iter_pages(["AAPL", "MSFT"])]
+    assert len(pages) == 2
+    assert pages[1].symbols == ["AAPL"]
+    assert pages[1].to_arrow().column("timestamp").to_pylist() == [
+        pd.Timestamp("2023-01-02", tz="UTC")
+    ]
+    assert set(cache.new_symbols) == {"MSFT"}
+
+
+@pytest.mark.asyncio
+async def test_failed_page_does_not_blacklist_the_batch(historical_data, cache):
+    historical_data.session = FakeSession(
+        {
+            "bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]},
+            "next_page_token": "token",
+        },
+        {"message": "some error"},
+    )
+
+    await historical_data.fetch_historical_data_batch(["AAPL", "MSFT", "NVDA"])
+    # the bars of the first page are kept
+    assert historical_data.bars.received_symbols == {"AAPL"}
+    # MSFT and NVDA may have had bars on the failed page
+    assert not cache.new_symbols
+    assert historical_data.failed_symbols == {"AAPL", "MSFT", "NVDA"}
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_retries_after_429(historical_data):
+    historical_data.session = FakeSession(
+        FakeResponse({}, headers={"Retry-After": "0"}, status=429),
+        {"bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]}},
+    )
+
+    data = await historical_data.fetch_page(["AAPL"])
+    assert data["bars"].received_symbols == {"AAPL"}
+    assert len(data["bars"]) == 1
+    assert len(historical_data.session.urls) == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_retries_after_network_and_server_errors(historical_data):
+    historical_data.data_fetcher.rate_limiter = RateLimiter(
+        {"alpaca": 60000}, headroom=0
+    )
+    historical_data.session = FakeSession(
+        aiohttp.ClientConnectionError("reset"),
+        FakeResponse({"message": "bad gateway"}, status=502),
+        {"bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]}},
+    )
+
+    data = await historical_data.fetch_page(["AAPL"])
+    assert data["bars"].received_symbols == {"AAPL"}
+    assert len(historical_data.session.urls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failing_requests_leave_symbols_failed_after_retries(
+    historical_data, cache
+):
+    historical_data.data_fetcher.rate_limiter = RateLimiter(
+        {"alpaca": 60000}, headroom=0
+    )
+    historical_data.session = FakeSession(*[asyncio.TimeoutError()] * 4)
+
+    await historical_data.fetch_historical_data_batch(["AAPL", "MSFT"])
+    assert len(historical_data.session.urls) == 4
+    assert historical_data.failed_symbols == {"AAPL", "MSFT"}
+    assert not cache.new_symbols
+
+
+@pytest.mark.asyncio
+async def test_fetch_starts_after_high_water_mark(
+    historical_data, high_water_marks, cache
+):
+    high_water_marks.update(
+        {"AAPL": datetime(2023, 1, 10), "MSFT": datetime(2023, 1, 31)}
+    )
+    historical_data.session = FakeSession(
+        {"bars": {"NVDA": [make_bar("2023-01-01T00:00:00Z")]}},
+        {"bars": {}},
+    )
+
+    await historical_data.fetch_historical_data_batch(["NVDA", "AAPL", "MSFT"])
+    urls = historical_data.session.urls
+    # MSFT is up to date so it is not requested at all
+    assert len(urls) == 2
+    assert requested_symbols(urls[0]) == ["NVDA"]
+    assert requested_start(urls[0]) == "1983-01-01"
+    assert requested_symbols(urls[1]) == ["AAPL"]
+    assert requested_start(urls[1]) == "2023-01-11"
+    # no new bars for a symbol with stored bars does not blacklist it
+    assert not cache.is_blacklisted("AAPL")
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_uses_response_cache(historical_data, data_fetcher, tmp_path):
+    data_fetcher.response_cache = ResponseCache(cache_dir=str(tmp_path))
+    historical_data.session = FakeSession(
+        {"bars": {"AAPL": [make_bar("2023-01-01T00:00:00Z")]}}
+    )
 
-        data = await historical_data.fetch_historical_data(symbol)
-        assert data is None
-        assert symbol in historical_data.symbols_without_historical_data
+    first = await historical_data.fetch_page(["AAPL"])
+    # the second call is served from disk, the session has nothing left to return
+    second = await historical_data.fetch_page(["AAPL"])
+    assert first["bars"].timestamps == second["bars"].timestamps
+    assert len(historical_data.session.urls) == 1
 
 
 @pytest.mark.asyncio
-async def test_cache_load_and_save(historical_data):
-    historical_data.symbols_without_historical_data = {"AAPL", "MSFT"}
-    historical_data.save_cache_to_file()
+async def test_offline_miss_does_not_blacklist(
+    historical_data, data_fetcher, cache, tmp_path
+):
+    data_fetcher.response_cache = ResponseCache(cache_dir=str(tmp_path), offline=True)
+    historical_data.session = FakeSession()
 
-    loaded_cache = historical_data.load_cache_from_file()
-    assert loaded_cache == {"AAPL", "MSFT"}
+    await historical_data.fetch_historical_data_batch(["AAPL"])
+    assert historical_data.session.urls == []
+    assert not cache.is_blacklisted("AAPL")
@@ -2,4 +2,5 @@
 from .date_utils import DateUtils
 from .logging import get_logger
 from .output import OutputUtils
+from .rate_limiter import RateLimiter
 from .cache import cache
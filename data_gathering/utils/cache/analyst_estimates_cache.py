@@ -0,0 +1,109 @@
+import time
+from typing import Dict, Mapping, NamedTuple, Optional, Set
+
+from .cache import Cache
+
+
+class EstimatesEntry(NamedTuple):
+    digest: str
+    fetched_at: float
+    ttl: float
+
+
+class AnalystEstimatesCache(Cache):
+    """
+    Keeps when the analyst estimates of each symbol were last fetched, a digest of
+    them and how long they stay fresh, in a SQLite database in the cache directory.
+
+    A symbol's TTL starts at ttl and doubles every time a refetch finds its estimates
+    unchanged, up to max_ttl, so the symbols whose estimates rarely move are asked for
+    less and less often. A change resets it.
+
+    Attributes:
+        ttl (float): Seconds the estimates of a symbol stay fresh after a change.
+        max_ttl (float): The most seconds unchanged estimates stay fresh.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        db_file="analyst_estimates.sqlite3",
+        ttl: float = 24 * 3600,
+        max_ttl: float = 7 * 24 * 3600,
+    ) -> None:
+        super().__init__(cache_dir=cache_dir)
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+
+        self.connection = self.connect(db_file)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS estimates (
+                symbol TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                ttl REAL NOT NULL
+            ) WITHOUT ROWID
+            """)
+
+    def entries(self) -> Dict[str, EstimatesEntry]:
+        return {
+            row[0]: EstimatesEntry(*row[1:])
+            for row in self.connection.execute(
+                "SELECT symbol, digest, fetched_at, ttl FROM estimates"
+            )
+        }
+
+    def changed(self, digests: Mapping[str, str]) -> Set[str]:
+        """
+        Returns the symbols whose estimates are new or changed, without recording them.
+        """
+        entries = self.entries()
+        return {
+            symbol
+            for symbol, digest in digests.items()
+            if symbol not in entries or entries[symbol].digest != digest
+        }
+
+    def record(
+        self, digests: Mapping[str, str], now: Optional[float] = None
+    ) -> Set[str]:
+        """
+        Records the digests of freshly fetched estimates in one transaction.
+
+        Args:
+            digests (Mapping[str, str]): The digest of every fetched symbol's estimates.
+            now (float, optional): The time they were fetched. Defaults to now.
+
+        Returns:
+            Set[str]: The symbols whose estimates are new or changed.
+        """
+        now = time.time() if now is None else now
+        entries = self.entries()
+        changed = set()
+        rows = []
+        for symbol, digest in digests.items():
+            entry = entries.get(symbol)
+            if entry is None or entry.digest != digest:
+                changed.add(symbol)
+                ttl = self.ttl
+            else:
+                ttl = min(entry.ttl * 2, self.max_ttl)
+            rows.append((symbol, digest, now, ttl))
+
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                """
+                INSERT INTO estimates (symbol, digest, fetched_at, ttl)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (symbol) DO UPDATE SET
+                    digest = excluded.digest,
+                    fetched_at = excluded.fetched_at,
+                    ttl = excluded.ttl
+                """,
+                rows,
+            )
+        return changed
+
+    def close(self):
+        self.connection.close()
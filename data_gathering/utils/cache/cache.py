@@ -1,11 +1,11 @@
 import pickle
 import os
+import sqlite3
 
 # shelve in the future if we need
 
 
 class Cache:
-    # future sqlite integration for actual caching
     def __init__(self, cache_dir=None, blacklist_symbols=None) -> None:
         self.cache_dir = cache_dir or os.path.join(self._get_root_directory(), ".cache")
         if not os.path.exists(self.cache_dir):
@@ -19,6 +19,25 @@ class Cache:
         root_dir = os.path.dirname(script_dir)
         return root_dir
 
+    def connect(self, db_file, timeout=30.0) -> sqlite3.Connection:
+        """
+        Opens a SQLite database in the cache directory that several processes can share.
+
+        Args:
+            db_file (str): The name of the database file in the cache directory.
+            timeout (float, optional): Seconds to wait for another writer. Defaults to 30.
+
+        Returns:
+            sqlite3.Connection: A connection in autocommit mode with WAL journaling.
+        """
+        connection = sqlite3.connect(
+            os.path.join(self.cache_dir, db_file), timeout=timeout, isolation_level=None
+        )
+        # WAL lets readers carry on while another process writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
     def save_to_pickle(self, file_path):
         with open(file_path, "wb") as file:
             pickle.dump(self, file)
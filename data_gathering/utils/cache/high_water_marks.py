@@ -0,0 +1,61 @@
+import os
+import pickle
+from datetime import datetime, timedelta
+from typing import Dict, Mapping, Optional
+
+from .cache import Cache
+
+
+class HighWaterMarkCache(Cache):
+    """
+    Keeps the timestamp of the last stored bar of each symbol so that later runs
+    only request the bars after it.
+
+    Attributes:
+        marks (Dict[str, datetime]): The timestamp of the last stored bar by symbol.
+    """
+
+    def __init__(self, cache_dir=None, pickle_file=None) -> None:
+        super().__init__(cache_dir=cache_dir)
+        self.default_pickle_file = os.path.join(self.cache_dir, "high_water_marks.pkl")
+        self.pickle_file = pickle_file or self.default_pickle_file
+        self.marks: Dict[str, datetime] = {}
+
+        if os.path.exists(self.pickle_file):
+            self.load_marks_from_pickle(self.pickle_file)
+
+    def load_marks_from_pickle(self, file_path):
+        with open(file_path, "rb") as file:
+            self.marks = pickle.load(file)
+
+    def save_marks_to_pickle(self, file_path=None):
+        file_path = file_path or self.pickle_file
+        with open(file_path, "wb") as file:
+            pickle.dump(self.marks, file)
+
+    def get(self, symbol: str) -> Optional[datetime]:
+        return self.marks.get(symbol)
+
+    def start_date(self, symbol: str, default: str) -> str:
+        """
+        Returns the first date that still has to be fetched for the symbol.
+
+        Args:
+            symbol (str): The symbol to look up.
+            default (str): The date to start from if nothing is stored for the symbol.
+
+        Returns:
+            str: The day after the last stored bar in YYYY-MM-DD format, or default.
+        """
+        if (mark := self.marks.get(symbol)) is None:
+            return default
+        return (mark + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def update(self, marks: Mapping[str, datetime]):
+        # marks only ever move forward
+        for symbol, mark in marks.items():
+            if (current := self.marks.get(symbol)) is None or mark > current:
+                self.marks[symbol] = mark
+
+    def clear(self):
+        self.marks = {}
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Mapping, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .cache import Cache
+
+# seconds a cached response stays fresh, by url prefix
+DEFAULT_TTLS: Dict[str, float] = {
+    "https://data.alpaca.markets/v2/stocks/bars": 12 * 3600,
+    "https://financialmodelingprep.com/api/v3/earning_calendar": 6 * 3600,
+    # the bulk fundamentals only change when companies report
+    "https://financialmodelingprep.com/api/v4/income-statement-bulk": 24 * 3600,
+    "https://financialmodelingprep.com/api/v4/ratios-bulk": 24 * 3600,
+}
+
+# query parameters that hold credentials and are never part of the key
+SECRET_PARAMS = frozenset({"apikey", "token"})
+
+
+class OfflineCacheMiss(KeyError):
+    """
+    Raised in offline mode when a request has no cached response.
+    """
+
+
+class ResponseCache(Cache):
+    """
+    Stores raw HTTP response bodies on disk, addressed by a hash of the normalized request.
+
+    Opening the cache removes the responses that expired, unless it is offline.
+
+    Attributes:
+        response_dir (str): The directory the responses are stored in.
+        ttls (Dict[str, float]): Seconds a response stays fresh by url prefix.
+        default_ttl (float): Seconds a response stays fresh if no prefix matches.
+        offline (bool): Serve every request from disk regardless of age and never
+            go to the network.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        ttls: Optional[Mapping[str, float]] = None,
+        default_ttl: float = 3600,
+        offline=False,
+    ) -> None:
+        super().__init__(cache_dir=cache_dir)
+        self.response_dir = os.path.join(self.cache_dir, "http")
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.offline = offline
+        if not offline:
+            self.prune()
+
+    @staticmethod
+    def normalize_url(url: str, params: Optional[Mapping[str, str]] = None) -> str:
+        """
+        Returns the url with its query parameters sorted and the credentials left out.
+        """
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        query.extend((params or {}).items())
+        query = sorted(
+            (key, str(value))
+            for key, value in query
+            if key.lower() not in SECRET_PARAMS
+        )
+        return urlunsplit(
+            (
+                parts.scheme.lower(),
+                parts.netloc.lower(),
+                parts.path,
+                urlencode(query),
+                "",
+            )
+        )
+
+    def key(self, url: str, params: Optional[Mapping[str, str]] = None) -> str:
+        normalized_url = self.normalize_url(url, params)
+        return hashlib.sha256(normalized_url.encode()).hexdigest()
+
+    def ttl(self, url: str) -> float:
+        # the longest matching prefix wins
+        prefixes = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        if not prefixes:
+            return self.default_ttl
+        return self.ttls[max(prefixes, key=len)]
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """
+        Removes the responses that are older than their TTL.
+
+        Returns:
+            int: The number of responses removed.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        if not os.path.isdir(self.response_dir):
+            return removed
+
+        for directory, _, filenames in os.walk(self.response_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                meta_path = os.path.join(directory, filename)
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as file:
+                        meta = json.load(file)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                if now - meta["fetched_at"] <= self.ttl(meta["url"]):
+                    continue
+                # another process sharing the cache may be removing it too
+                body_path = f"{os.path.splitext(meta_path)[0]}.body"
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+        return removed
+
+    def _paths(self, key: str):
+        # responses are spread over subdirectories by the first byte of their key
+        path = os.path.join(self.response_dir, key[:2], key)
+        return f"{path}.body", f"{path}.json"
+
+    def get(
+        self, url: str, params: Optional[Mapping[str, str]] = None
+    ) -> Optional[bytes]:
+        """
+        Returns the cached body of a request.
+
+        Args:
+            url (str): The requested url.
+            params (Mapping[str, str], optional): Query parameters not included in url.
+
+        Returns:
+            bytes: The body if it is cached and fresh, or cached at all in offline mode.
+            None: If the request has to go to the network.
+
+        Raises:
+            OfflineCacheMiss: If the request is not cached in offline mode.
+        """
+        body_path, meta_path = self._paths(self.key(url, params))
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            with open(body_path, "rb") as file:
+                body = file.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            if self.offline:
+                raise OfflineCacheMiss(self.normalize_url(url, params))
+            return None
+
+        age = time.time() - meta["fetched_at"]
+        if not self.offline and age > self.ttl(meta["url"]):
+            return None
+        return body
+
+    def set(
+        self,
+        url: str,
+        body: bytes,
+        params: Optional[Mapping[str, str]] = None,
+        status: int = 200,
+    ):
+        """
+        Stores the body of a response, replacing any older copy atomically.
+        """
+        normalized_url = self.normalize_url(url, params)
+        body_path, meta_path = self._paths(self.key(url, params))
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        # processes sharing the cache, e.g. shards, may store the same response at once
+        tmp_suffix = f".{os.getpid()}.tmp"
+
+        with open(f"{body_path}{tmp_suffix}", "wb") as file:
+            file.write(body)
+        os.replace(f"{body_path}{tmp_suffix}", body_path)
+
+        with open(f"{meta_path}{tmp_suffix}", "w", encoding="utf-8") as file:
+            json.dump(
+                {"url": normalized_url, "fetched_at": time.time(), "status": status},
+                file,
+            )
+        os.replace(f"{meta_path}{tmp_suffix}", meta_path)
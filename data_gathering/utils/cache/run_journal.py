@@ -0,0 +1,140 @@
+import time
+from collections import Counter
+from typing import Iterable, Optional, Set
+
+from .cache import Cache
+
+# a symbol is fetched once all of its pages arrived and written once the writers
+# holding its bars were closed, failed symbols are fetched again on resume
+STATUSES = ("fetched", "failed", "written")
+
+
+class RunJournal(Cache):
+    """
+    Records the progress of each run in a SQLite database in the cache directory, so
+    a run that failed midway can be resumed without fetching the stored symbols again.
+
+    Every status change is committed as it happens, a crash loses nothing the journal
+    claims was stored.
+
+    Attributes:
+        run_id (int): The run the statuses are recorded for, None until a run started.
+        resumed (bool): Whether the run continues an earlier one that did not finish.
+    """
+
+    def __init__(self, cache_dir=None, db_file="run_journal.sqlite3") -> None:
+        super().__init__(cache_dir=cache_dir)
+        self.run_id: Optional[int] = None
+        self.resumed = False
+
+        self.connection = self.connect(db_file)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            )
+            """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS symbols (
+                run_id INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, symbol)
+            ) WITHOUT ROWID
+            """)
+
+    def start_run(self, resume: bool = False) -> int:
+        """
+        Starts a new run, or continues the last one if resume is set and it did not
+        finish.
+
+        Returns:
+            int: The ID of the run.
+        """
+        self.resumed = False
+        if resume:
+            row = self.connection.execute(
+                "SELECT run_id, status FROM runs ORDER BY run_id DESC LIMIT 1"
+            ).fetchone()
+            if row is not None and row[1] != "finished":
+                self.run_id, self.resumed = row[0], True
+                self.connection.execute(
+                    "UPDATE runs SET status = 'running', finished_at = NULL "
+                    "WHERE run_id = ?",
+                    (self.run_id,),
+                )
+                return self.run_id
+
+        cursor = self.connection.execute(
+            "INSERT INTO runs (status, started_at) VALUES ('running', ?)",
+            (time.time(),),
+        )
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def finish_run(self, status: str = "finished"):
+        # "failed" runs can be resumed, "finished" ones cannot
+        self.connection.execute(
+            "UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+            (status, time.time(), self.run_id),
+        )
+
+    def set_status(self, symbols: Iterable[str], status: str):
+        """
+        Records the status of several symbols of the current run in one transaction.
+
+        Args:
+            symbols (Iterable[str]): The symbols.
+            status (str): "fetched", "failed" or "written".
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}, choose from {STATUSES}")
+
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                """
+                INSERT INTO symbols (run_id, symbol, status, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (run_id, symbol) DO UPDATE SET
+                    status = excluded.status,
+                    updated_at = excluded.updated_at
+                """,
+                ((self.run_id, symbol, status, now) for symbol in symbols),
+            )
+
+    def status(self, symbol: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT status FROM symbols WHERE run_id = ? AND symbol = ?",
+            (self.run_id, symbol),
+        ).fetchone()
+        return row[0] if row else None
+
+    def symbols(self, status: str) -> Set[str]:
+        # the symbols of the current run with the status
+        return {
+            row[0]
+            for row in self.connection.execute(
+                "SELECT symbol FROM symbols WHERE run_id = ? AND status = ?",
+                (self.run_id, status),
+            )
+        }
+
+    def counts(self) -> Counter:
+        # symbols of the current run by status
+        return Counter(
+            dict(
+                self.connection.execute(
+                    "SELECT status, COUNT(*) FROM symbols WHERE run_id = ? "
+                    "GROUP BY status",
+                    (self.run_id,),
+                ).fetchall()
+            )
+        )
+
+    def close(self):
+        self.connection.close()
@@ -1,52 +1,164 @@
 import os
 import pickle
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
 
 from .cache import Cache
 
 
 class BlacklistSymbolCache(Cache):
+    """
+    Symbols that should not be fetched, stored in a SQLite database in the cache directory.
+
+    Lookups go to the database instead of loading the whole blacklist, and new symbols
+    are written in small batches during the run, so startup and saving do not grow with
+    the blacklist and a crash loses at most one batch. Worker processes can share the
+    database.
+
+    Attributes:
+        default_ttl (float): Seconds a new entry stays blacklisted, None keeps it forever.
+        batch_size (int): The number of new symbols buffered before they are written.
+        new_symbols (Dict[str, Tuple[str, float]]): Symbols not written yet with their
+            reason and expiry time.
+    """
+
     def __init__(
-        self, cache_dir=None, blacklist_symbols=None, pickle_file=None
+        self,
+        cache_dir=None,
+        blacklist_symbols=None,
+        db_file="blacklist.sqlite3",
+        default_ttl: Optional[float] = None,
+        batch_size=100,
     ) -> None:
         super().__init__(cache_dir=cache_dir)
-        self.default_pickle_file = os.path.join(self.cache_dir, "blacklist.pkl")
+        self.default_ttl = default_ttl
+        self.batch_size = batch_size
+        self.new_symbols: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+
+        self.connection = self.connect(db_file)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS blacklist (
+                symbol TEXT PRIMARY KEY,
+                reason TEXT,
+                added_at REAL NOT NULL,
+                expires_at REAL
+            ) WITHOUT ROWID
+            """)
+        self._migrate_pickle(os.path.join(self.cache_dir, "blacklist.pkl"))
 
-        if pickle_file:
-            self.load_blacklist_from_pickle(pickle_file)
-        else:
-            if not os.path.exists(self.default_pickle_file):
-                self._create_default_blacklist()
-            self.load_blacklist_from_pickle(self.default_pickle_file)
+        if blacklist_symbols:
+            for symbol in blacklist_symbols:
+                self.add_symbol(symbol)
+            self.flush()
 
-            if blacklist_symbols:
-                self.blacklist = self.blacklist | frozenset(blacklist_symbols)
+    def _migrate_pickle(self, pickle_file):
+        # import the frozenset the blacklist used to be pickled as
+        if not os.path.exists(pickle_file):
+            return
 
-            self.new_symbols = set()
+        with open(pickle_file, "rb") as file:
+            for symbol in pickle.load(file):
+                self.add_symbol(symbol, reason="migrated")
+        self.flush()
+        os.replace(pickle_file, f"{pickle_file}.migrated")
 
-    def _create_default_blacklist(self):
-        with open(self.default_pickle_file, "wb") as file:
-            pickle.dump(frozenset(), file)
+    def is_blacklisted(self, symbol) -> bool:
+        if symbol in self.new_symbols:
+            return True
+        row = self.connection.execute(
+            "SELECT 1 FROM blacklist WHERE symbol = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (symbol, time.time()),
+        ).fetchone()
+        return row is not None
 
-    def load_blacklist_from_pickle(self, file_path):
-        with open(file_path, "rb") as file:
-            self.blacklist = pickle.load(file)
-        self.new_symbols = set()
+    def __contains__(self, symbol) -> bool:
+        return self.is_blacklisted(symbol)
 
-    def save_blacklist_to_pickle(self, file_path=None):
-        file_path = file_path or self.default_pickle_file
-        with open(file_path, "wb") as file:
-            new_blacklist = self.blacklist | self.new_symbols
-            pickle.dump(new_blacklist, file)
+    def add_symbol(
+        self, symbol, reason: Optional[str] = None, ttl: Optional[float] = None
+    ):
+        """
+        Blacklists a symbol. It is written with the next batch.
 
-    def is_blacklisted(self, symbol):
-        return symbol in self.blacklist
+        Args:
+            symbol (str): The symbol to blacklist.
+            reason (str, optional): Why the symbol is blacklisted.
+            ttl (float, optional): Seconds until the entry expires. Defaults to default_ttl.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.new_symbols[symbol] = (reason, expires_at)
 
-    def add_symbol(self, symbol):
-        if not self.is_blacklisted(symbol):
-            self.new_symbols.add(symbol)
+        if len(self.new_symbols) >= self.batch_size:
+            self.flush()
 
-    def filter_blacklisted_symbols(self, symbols):
+    def flush(self):
+        """
+        Writes the buffered symbols to the database in one transaction.
+        """
+        if not self.new_symbols:
+            return
+
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                """
+                INSERT INTO blacklist (symbol, reason, added_at, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (symbol) DO UPDATE SET
+                    reason = excluded.reason,
+                    added_at = excluded.added_at,
+                    expires_at = excluded.expires_at
+                """,
+                (
+                    (symbol, reason, now, expires_at)
+                    for symbol, (reason, expires_at) in self.new_symbols.items()
+                ),
+            )
+        self.new_symbols = {}
+
+    def filter_blacklisted_symbols(self, symbols: Iterable[str]) -> Set[str]:
         """
         Takes a set of symbols and returns the set's difference with the blacklist.
         """
-        return symbols - self.blacklist
+        symbols = set(symbols)
+        candidates = list(symbols - self.new_symbols.keys())
+        blacklisted = set(self.new_symbols)
+
+        # stay below SQLite's limit on the number of parameters
+        chunk_size = 500
+        now = time.time()
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start : start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            blacklisted.update(
+                row[0]
+                for row in self.connection.execute(
+                    f"SELECT symbol FROM blacklist WHERE symbol IN ({placeholders}) "
+                    "AND (expires_at IS NULL OR expires_at > ?)",
+                    (*chunk, now),
+                )
+            )
+
+        return symbols - blacklisted
+
+    def reason(self, symbol) -> Optional[str]:
+        if symbol in self.new_symbols:
+            return self.new_symbols[symbol][0]
+        row = self.connection.execute(
+            "SELECT reason FROM blacklist WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def purge_expired(self) -> int:
+        # drop entries whose ttl ran out, returns how many were removed
+        cursor = self.connection.execute(
+            "DELETE FROM blacklist WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        return cursor.rowcount
+
+    def close(self):
+        self.flush()
+        self.connection.close()
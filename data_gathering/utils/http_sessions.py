@@ -0,0 +1,104 @@
+import asyncio
+from typing import Dict, List, Mapping, Optional
+
+import aiohttp
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Requests each provider may have in flight at once
+DEFAULT_CONCURRENCY: Dict[str, int] = {
+    "alpaca": 4,
+    "fmp": 4,
+    "finnhub": 2,
+    "alpha_vantage": 1,
+}
+
+# Errors of a single request that are worth retrying, e.g. a reset connection
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class ProviderSessions:
+    """
+    Keeps one aiohttp session per provider on a connector tuned for many small requests
+    to the same host, and a concurrency budget per provider.
+
+    Every provider gets its own connection pool with keep-alive and a DNS cache, so
+    requests reuse open connections instead of paying for DNS, TCP and TLS each time,
+    and a slow provider cannot take the connections or request slots of another.
+
+    Attributes:
+        concurrency (Dict[str, int]): Requests each provider may have in flight at once.
+        keepalive_timeout (float): Seconds an idle connection is kept open.
+        ttl_dns_cache (int): Seconds a resolved host name is cached.
+        timeout (aiohttp.ClientTimeout): The timeout of every request.
+        trace_configs (List[aiohttp.TraceConfig]): Request hooks of every new session,
+            e.g. to measure request latency.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[Mapping[str, int]] = None,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: int = 300,
+        timeout: float = 60.0,
+        trace_configs: Optional[List[aiohttp.TraceConfig]] = None,
+    ) -> None:
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.trace_configs = trace_configs
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def budget(self, provider: str) -> int:
+        return self.concurrency.get(provider, 1)
+
+    def session(
+        self, provider: str, headers: Optional[Mapping[str, str]] = None
+    ) -> aiohttp.ClientSession:
+        """
+        Returns the provider's session, creating it and its connector on first use.
+
+        Args:
+            provider (str): The provider the requests go to.
+            headers (Mapping[str, str], optional): Headers sent with every request of a
+                new session, e.g. the API keys. Ignored once the session exists.
+
+        Returns:
+            aiohttp.ClientSession: The session shared by all requests to the provider.
+        """
+        session = self.sessions.get(provider)
+        if session is None or session.closed:
+            # a few spare connections so a request waiting on its budget finds one open
+            connector = aiohttp.TCPConnector(
+                limit=self.budget(provider) * 2,
+                limit_per_host=self.budget(provider) * 2,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                timeout=self.timeout,
+                trace_configs=self.trace_configs,
+            )
+            self.sessions[provider] = session
+        return session
+
+    def limit(self, provider: str) -> asyncio.Semaphore:
+        """
+        Returns the semaphore that holds the provider's concurrency budget.
+        """
+        if provider not in self.semaphores:
+            self.semaphores[provider] = asyncio.Semaphore(self.budget(provider))
+        return self.semaphores[provider]
+
+    async def close(self):
+        for provider, session in self.sessions.items():
+            if not session.closed:
+                await session.close()
+                logger.debug(f"Closed the {provider} session")
+        self.sessions = {}
@@ -0,0 +1,175 @@
+import functools
+import json
+from typing import Any, Dict, List, Optional
+
+from data_gathering.models.mappings import (
+    historical_data_mapping,
+    historical_data_missing_values,
+    historical_data_typecodes,
+)
+
+# optional faster decoders, the stdlib json module is used without them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BarColumns = Dict[str, List[Any]]
+
+
+class JSONDecoder:
+    """
+    Decodes response bodies with the stdlib json module.
+
+    decode_bars turns a page of the bars endpoint into one list per column, named
+    and ordered like historical_data_mapping, so the bars never exist as a dict per
+    bar outside of the decoder.
+    """
+
+    name = "json"
+
+    def loads(self, body: bytes) -> Any:
+        return json.loads(body)
+
+    def decode_bars(self, body: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Decodes a page of the bars endpoint.
+
+        Args:
+            body (bytes): The response body.
+
+        Returns:
+            Dict[str, Any]: The page with "bars" mapping each symbol that has bars to
+                its columns, and "next_page_token".
+            None: If the body is not a page of bars, e.g. an error message.
+        """
+        try:
+            data = self.loads(body)
+        except ValueError:
+            return None
+
+        if not isinstance(data, dict) or "bars" not in data:
+            # Historical data retrieval failed
+            return None
+
+        return {
+            "bars": {
+                symbol: self.bars_to_columns(bars)
+                for symbol, bars in (data["bars"] or {}).items()
+                if bars
+            },
+            "next_page_token": data.get("next_page_token"),
+        }
+
+    @staticmethod
+    def bars_to_columns(bars: List[Dict[str, Any]]) -> BarColumns:
+        columns = {"timestamp": [bar["t"] for bar in bars]}
+        for key, name in historical_data_mapping.items():
+            if name != "timestamp":
+                missing = historical_data_missing_values[
+                    historical_data_typecodes[name]
+                ]
+                columns[name] = [bar.get(key, missing) for bar in bars]
+        return columns
+
+
+class OrjsonDecoder(JSONDecoder):
+    """
+    Parses with orjson, which builds the same objects as json several times faster.
+    """
+
+    name = "orjson"
+
+    def loads(self, body: bytes) -> Any:
+        return orjson.loads(body)
+
+
+class MsgspecDecoder(JSONDecoder):
+    """
+    Decodes the bars with msgspec into typed structs built from historical_data_mapping,
+    validating the types while parsing and skipping the intermediate dicts.
+    """
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        field_types = {"d": float, "q": int}
+        Bar = msgspec.defstruct(
+            "Bar",
+            [("timestamp", str)]
+            + [
+                (name, field_types[typecode], historical_data_missing_values[typecode])
+                for name, typecode in historical_data_typecodes.items()
+            ],
+            rename={name: key for key, name in historical_data_mapping.items()},
+        )
+        BarsPage = msgspec.defstruct(
+            "BarsPage",
+            [
+                ("bars", Optional[Dict[str, Optional[List[Bar]]]]),
+                ("next_page_token", Optional[str], None),
+            ],
+        )
+        self._page_decoder = msgspec.json.Decoder(BarsPage)
+        self._decoder = msgspec.json.Decoder()
+        self._names = ["timestamp", *historical_data_typecodes]
+
+    def loads(self, body: bytes) -> Any:
+        try:
+            return self._decoder.decode(body)
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from error
+
+    def decode_bars(self, body: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            page = self._page_decoder.decode(body)
+        except msgspec.DecodeError:
+            # also raised when "bars" is missing, e.g. for an error message
+            return None
+
+        return {
+            "bars": {
+                symbol: {
+                    name: [getattr(bar, name) for bar in bars] for name in self._names
+                }
+                for symbol, bars in (page.bars or {}).items()
+                if bars
+            },
+            "next_page_token": page.next_page_token,
+        }
+
+
+DECODERS = {
+    "msgspec": MsgspecDecoder,
+    "orjson": OrjsonDecoder,
+    "json": JSONDecoder,
+}
+
+
+def available_decoders() -> List[str]:
+    # the decoders whose library is installed, fastest first
+    installed = {"msgspec": msgspec, "orjson": orjson, "json": json}
+    return [name for name in DECODERS if installed[name] is not None]
+
+
+@functools.lru_cache(maxsize=None)
+def get_decoder(name: str = "auto") -> JSONDecoder:
+    """
+    Returns a decoder by name, or the fastest installed one for "auto". The decoders
+    hold no state, so each is only built once per process.
+
+    Raises:
+        ValueError: If the decoder is unknown or its library is not installed.
+    """
+    if name == "auto":
+        name = available_decoders()[0]
+    if name not in available_decoders():
+        raise ValueError(
+            f"JSON decoder {name!r} is not available, choose from {available_decoders()}"
+        )
+    return DECODERS[name]()
@@ -0,0 +1,310 @@
+import bisect
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets, the last one is +Inf
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+FORMATS = ("json", "prometheus", "log")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def metric_key(name: str, labels: Dict[str, str]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_key(name: str, labels: Labels) -> str:
+    # name{key="value",...} as in the prometheus text format
+    if not labels:
+        return name
+    return (
+        f"{name}{{{','.join(f'{key}={json.dumps(value)}' for key, value in labels)}}}"
+    )
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, so recording one costs a binary search
+    however many there are.
+
+    Attributes:
+        buckets (Tuple[float, ...]): The upper bounds of the buckets.
+        counts (List[int]): Observations per bucket, the last one past all bounds.
+        count (int): The number of observations.
+        sum (float): The sum of the observations.
+        max (float): The largest observation.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the q-quantile, or the largest
+        observation if it is past the last bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class Gauge:
+    """
+    A sampled value such as a queue depth, keeps the last, largest and mean sample.
+    """
+
+    def __init__(self) -> None:
+        self.last = 0.0
+        self.max = 0.0
+        self.sum = 0.0
+        self.count = 0
+
+    def set(self, value: float):
+        self.last = value
+        self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "last": self.last,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else 0.0,
+        }
+
+
+class Timer:
+    # records the seconds of a with block in a histogram
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    Collects the stage latencies, counters and queue depths of a run.
+
+    Metrics are identified by a name and labels, e.g.
+    metrics.observe("stage_seconds", 0.2, stage="parse"), and exported as a JSON
+    summary, in the prometheus text format or as log lines.
+
+    Attributes:
+        histograms (Dict): Latency histograms by name and labels.
+        counters (Dict): Running totals, e.g. bytes downloaded, by name and labels.
+        gauges (Dict): Sampled values, e.g. queue depths, by name and labels.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], Gauge] = {}
+        self.started = time.perf_counter()
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = metric_key(name, labels)
+        if (histogram := self.histograms.get(key)) is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def time(self, name: str, **labels: str) -> Timer:
+        """
+        Returns a context manager that observes the seconds its block takes.
+        """
+        return Timer(self, name, labels)
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        key = metric_key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        key = metric_key(name, labels)
+        if (gauge := self.gauges.get(key)) is None:
+            gauge = self.gauges[key] = Gauge()
+        gauge.set(value)
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            "elapsed_seconds": time.perf_counter() - self.started,
+            "histograms": {
+                format_key(*key): histogram.summary()
+                for key, histogram in sorted(self.histograms.items())
+            },
+            "counters": {
+                format_key(*key): value for key, value in sorted(self.counters.items())
+            },
+            "gauges": {
+                format_key(*key): gauge.summary()
+                for key, gauge in sorted(self.gauges.items())
+            },
+        }
+
+    def to_prometheus(self, prefix: str = "data_gathering") -> str:
+        """
+        Returns the metrics in the prometheus text exposition format.
+        """
+        lines = []
+        typed = set()
+
+        def declare(metric: str, metric_type: str):
+            # the samples of a metric follow a single TYPE line
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {metric_type}")
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}"
+            declare(metric, "histogram")
+            seen = 0
+            for bound, count in zip(
+                (*histogram.buckets, float("inf")), histogram.counts
+            ):
+                seen += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{format_key(f'{metric}_bucket', (*labels, ('le', le)))} {seen}"
+                )
+            lines.append(f"{format_key(f'{metric}_sum', labels)} {histogram.sum}")
+            lines.append(f"{format_key(f'{metric}_count', labels)} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(f"{prefix}_{name}_total", "counter")
+            lines.append(f"{format_key(f'{prefix}_{name}_total', labels)} {value}")
+        for (name, labels), gauge in sorted(self.gauges.items()):
+            declare(f"{prefix}_{name}", "gauge")
+            lines.append(f"{format_key(f'{prefix}_{name}', labels)} {gauge.last}")
+        for (name, labels), gauge in sorted(self.gauges.items()):
+            declare(f"{prefix}_{name}_max", "gauge")
+            lines.append(f"{format_key(f'{prefix}_{name}_max', labels)} {gauge.max}")
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"Run took {summary['elapsed_seconds']:.2f}s")
+        for key, histogram in summary["histograms"].items():
+            logger.info(
+                f"{key}: {histogram['count']} in {histogram['sum']:.3f}s, "
+                f"p50 <= {histogram['p50']:.3f}s, p99 <= {histogram['p99']:.3f}s, "
+                f"max {histogram['max']:.3f}s"
+            )
+        for key, value in summary["counters"].items():
+            logger.info(f"{key}: {value:g}")
+        for key, gauge in summary["gauges"].items():
+            logger.info(f"{key}: max {gauge['max']:g}, mean {gauge['mean']:.1f}")
+
+    def report(self, format: str, path: Optional[str] = None):
+        """
+        Writes the metrics as a JSON summary or in the prometheus text format to path,
+        or logs them.
+
+        Args:
+            format (str): "json", "prometheus" or "log".
+            path (str, optional): The output file of the json and prometheus formats.
+        """
+        if format not in FORMATS:
+            raise ValueError(
+                f"Unknown metrics format {format!r}, choose from {FORMATS}"
+            )
+        if format == "log":
+            self.log_summary()
+            return
+
+        if format == "json":
+            text = json.dumps(self.summary(), indent=2)
+        else:
+            text = self.to_prometheus()
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as file:
+            file.write(text)
+        logger.info(f"Wrote the run's metrics to {path}")
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics that record nothing, used unless metrics are enabled so the
+    instrumentation costs a no-op call.
+    """
+
+    enabled = False
+    _timer = _NullTimer()
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        pass
+
+    def time(self, name: str, **labels: str) -> _NullTimer:
+        return self._timer
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        pass
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        pass
@@ -0,0 +1,74 @@
+import os
+import time
+import uuid
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+class AnalystEstimatesWriter:
+    """
+    Appends analyst estimates to a parquet dataset, one file per write.
+
+    Only estimates that changed are written, so the dataset is the history of every
+    symbol's estimates and the latest row of a symbol is its current one.
+
+    Attributes:
+        root_path (str): The directory of the dataset.
+        compression (str): The parquet compression codec.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(self, root_path, compression="zstd") -> None:
+        self.root_path = root_path
+        self.compression = compression
+        self.rows_written = 0
+        # files of different runs, shards and writes never share a name
+        self._run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._write_count = 0
+
+    def write(self, table: pa.Table):
+        if not table.num_rows:
+            return
+
+        os.makedirs(self.root_path, exist_ok=True)
+        path = os.path.join(
+            self.root_path, f"part-{self._run_id}-{self._write_count:05d}.parquet"
+        )
+        # readers never see a partial file
+        tmp_path = os.path.join(self.root_path, f".{os.path.basename(path)}.tmp")
+        pq.write_table(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        self._write_count += 1
+        self.rows_written += table.num_rows
+
+    @staticmethod
+    def dataset(root_path: str) -> ds.Dataset:
+        # the hidden tmp files are ignored
+        return ds.dataset(root_path, format="parquet")
+
+    @staticmethod
+    def latest(root_path: str, symbols: Optional[List[str]] = None) -> pa.Table:
+        """
+        Returns the current estimates of every symbol, or of the given symbols.
+        """
+        table = AnalystEstimatesWriter.dataset(root_path).to_table(
+            filter=ds.field("symbol").isin(symbols) if symbols is not None else None
+        )
+        columns = [name for name in table.column_names if name != "symbol"]
+        latest = (
+            table.sort_by("fetched_at").group_by("symbol", use_threads=False)
+            # a field that became null is null in the current estimates
+            .aggregate(
+                [
+                    (name, "last", pc.ScalarAggregateOptions(skip_nulls=False))
+                    for name in columns
+                ]
+            )
+        )
+        return latest.rename_columns(
+            [name.removesuffix("_last") for name in latest.column_names]
+        ).select(table.column_names)
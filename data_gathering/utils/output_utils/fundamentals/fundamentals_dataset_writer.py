@@ -0,0 +1,74 @@
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+class FundamentalsDatasetWriter:
+    """
+    Writes fundamentals as a hive partitioned parquet dataset (calendar_year=...),
+    next to the dataset of the bars.
+
+    A refresh replaces the partitions of the years it fetched and keeps the others,
+    reports are restated and every refresh fetches whole years.
+
+    Attributes:
+        root_path (str): The directory of the dataset.
+        compression (str): The parquet compression codec.
+        rows_written (int): The number of rows written so far.
+    """
+
+    PARTITIONING = ds.partitioning(
+        pa.schema([("calendar_year", pa.int16())]), flavor="hive"
+    )
+
+    def __init__(self, root_path, compression="zstd") -> None:
+        self.root_path = root_path
+        self.compression = compression
+        self.rows_written = 0
+
+    def write(self, table: pa.Table):
+        """
+        Writes fundamentals, replacing the stored ones of their calendar years.
+
+        Args:
+            table (pa.Table): Fundamentals as returned by Fundamentals.fetch.
+        """
+        if not table.num_rows:
+            return
+
+        ds.write_dataset(
+            table,
+            self.root_path,
+            format="parquet",
+            partitioning=self.PARTITIONING,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=self.compression
+            ),
+        )
+        self.rows_written += table.num_rows
+
+    @staticmethod
+    def dataset(root_path: str) -> ds.Dataset:
+        return ds.dataset(
+            root_path,
+            format="parquet",
+            partitioning=FundamentalsDatasetWriter.PARTITIONING,
+        )
+
+    @staticmethod
+    def read(
+        root_path: str,
+        symbols: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pa.Table:
+        """
+        Reads the stored fundamentals, of the given symbols only if any are given.
+        """
+        dataset = FundamentalsDatasetWriter.dataset(root_path)
+        return dataset.to_table(
+            columns=columns,
+            filter=ds.field("symbol").isin(symbols) if symbols is not None else None,
+        )
@@ -1,9 +1,14 @@
 import os
+from data_gathering.utils.logging import get_logger
 from data_gathering.utils.output import OutputUtils
 import pandas as pd
+import pyarrow as pa
 from typing import Dict
-import json
-import itertools
+from datetime import datetime
+
+from .historical_json_exporter import HistoricalJSONExporter
+
+logger = get_logger(__name__)
 
 
 class HistoricalDataOutputUtils(OutputUtils):
@@ -38,46 +43,55 @@ class HistoricalDataOutputUtils(OutputUtils):
         return combined_historical_data_df
 
     @staticmethod
-    def combine_dataframes(historical_data_by_symbols):
-        data_list = list(
-            itertools.chain.from_iterable(historical_data_by_symbols.values())
+    def combine_dataframes(bar_buffer) -> pd.DataFrame:
+        """
+        Builds a single DataFrame from the column buffers of the fetched bars.
+
+        Args:
+            bar_buffer (BarBuffer): The buffer the bars were collected in.
+
+        Returns:
+            pd.DataFrame: The bars with a multi-index of a categorical 'symbol' level
+                and a UTC 'timestamp' level.
+        """
+        return bar_buffer.to_dataframe()
+
+    @staticmethod
+    def last_timestamps(bars: pa.Table) -> Dict[str, datetime]:
+        # timestamp of the last bar of each symbol
+        last_timestamps = bars.group_by("symbol").aggregate([("timestamp", "max")])
+        return dict(
+            zip(
+                last_timestamps.column("symbol").to_pylist(),
+                last_timestamps.column("timestamp_max").to_pylist(),
+            )
         )
-        df = pd.DataFrame(data_list)
-        # set multi-level index
-        # level=0 -symbol
-        # level-1 -timestamp
+
+    @staticmethod
+    def read_parquet(parquet_path) -> pd.DataFrame:
+        # read bars written by HistoricalParquetWriter back with the symbol and timestamp index
+        df = pd.read_parquet(parquet_path, engine="pyarrow")
         if set(["symbol", "timestamp"]).issubset(df.columns):
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
-            df.set_index(["symbol", "timestamp"], inplace=True)
+            df = df.set_index(["symbol", "timestamp"])
         return df
 
-    # TODO: maybe rewrite so it works for any dataframe
     @staticmethod
-    def output_combined_symbol_df_to_json(combined_df: pd.DataFrame, output_filename):
-        # Define a vectorized function within the scope of the current function to process grouped DataFrame
-        # and convert it into a nested dictionary (fastest way by 8 milliseconds)
-        def g(group):
-            return group.groupby("Datetime")["data"].apply(list).to_dict()
+    def output_combined_symbol_df_to_json(
+        combined_df: pd.DataFrame, output_filename, format: str = "json"
+    ) -> int:
+        """
+        Writes combined bars to output/<output_filename> with HistoricalJSONExporter,
+        nested by symbol and timestamp unless format is "ndjson".
 
-        # Creating output file path
-        output_filepath = os.path.join("output", output_filename)
+        Args:
+            combined_df (pd.DataFrame): Bars indexed by 'symbol' and 'timestamp', as
+                returned by combine_dataframes or read_parquet.
+            output_filename (str): The name of the file in the output directory.
+            format (str): "json" or "ndjson".
 
-        # Selecting the columns of interest
-        selected_columns = [
-            "Close",
-            "High",
-            "Low",
-            "Number of Trades",
-            "Open",
-            "Volume",
-            "VWAP",
-        ]
-
-        # Creating a new column 'data' with the relevant data
-        combined_df["data"] = combined_df[selected_columns].to_dict(orient="records")
-
-        # Grouping by 'Symbol' and 'Datetime' and creating nested dictionary directly
-        nested_dict = combined_df.groupby("Symbol").apply(g).to_dict()
-
-        # Converting the final result to JSON with the ISO date format
-        return pd.Series(nested_dict).to_json(output_filepath, date_format="iso")
+        Returns:
+            int: The number of bars written.
+        """
+        output_filepath = os.path.join("output", output_filename)
+        bars = pa.Table.from_pandas(combined_df.reset_index(), preserve_index=False)
+        return HistoricalJSONExporter(output_filepath, format).export(bars)
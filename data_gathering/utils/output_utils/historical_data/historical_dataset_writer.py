@@ -0,0 +1,180 @@
+import os
+import time
+from collections import Counter
+from typing import Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARTITION_COLUMNS = ["symbol", "year"]
+# arrow refuses to write more partitions in one call, each one holds an open file
+MAX_PARTITIONS = 1024
+
+
+class HistoricalDatasetWriter:
+    """
+    Writes bars as a hive partitioned parquet dataset (symbol=.../year=...).
+
+    Every flush adds files sorted by timestamp to the partitions it touches, and closing
+    the writer records all row groups of the dataset in a _metadata file, so readers can
+    prune partitions and row groups without listing or opening every file.
+
+    Attributes:
+        root_path (str): The directory of the dataset.
+        compression (str): The parquet compression codec.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(self, root_path, compression="zstd") -> None:
+        self.root_path = root_path
+        self.metadata_path = os.path.join(root_path, "_metadata")
+        self.compression = compression
+        self.rows_written = 0
+        self.schema: Optional[pa.Schema] = None
+        # files of different runs and flushes never share a name
+        self._run_id = time.strftime("%Y%m%dT%H%M%S")
+        self._flush_count = 0
+        self._metadata_collector: List[pq.FileMetaData] = []
+
+    def write(self, table: pa.Table):
+        """
+        Writes a table of bars into the partitions of its symbols and years.
+
+        Args:
+            table (pa.Table): Bars with the schema of BarBuffer.to_arrow.
+        """
+        if not table.num_rows:
+            return
+
+        # partitioning keeps the row order, so every file ends up sorted by timestamp
+        table = table.sort_by("timestamp")
+        table = table.append_column(
+            "year", pc.year(table.column("timestamp")).cast(pa.int16())
+        )
+        if self.schema is None:
+            # the files do not store the partition columns
+            self.schema = table.drop_columns(PARTITION_COLUMNS).schema
+
+        for symbols_table in self.split_by_symbols(table):
+            pq.write_to_dataset(
+                symbols_table,
+                self.root_path,
+                partition_cols=PARTITION_COLUMNS,
+                basename_template=f"part-{self._run_id}-{self._flush_count:05d}-{{i}}.parquet",
+                metadata_collector=self._metadata_collector,
+                compression=self.compression,
+                max_partitions=MAX_PARTITIONS,
+                max_open_files=MAX_PARTITIONS,
+            )
+        self._flush_count += 1
+        self.rows_written += table.num_rows
+
+    @staticmethod
+    def split_by_symbols(
+        table: pa.Table, max_partitions: int = MAX_PARTITIONS
+    ) -> Iterator[pa.Table]:
+        """
+        Splits a table with a year column into tables of whole symbols that each
+        touch at most max_partitions symbol/year partitions, e.g. a flush of 50
+        symbols with bars back to the 1980s.
+        """
+        partitions = table.group_by(PARTITION_COLUMNS).aggregate([])
+        if partitions.num_rows <= max_partitions:
+            yield table
+            return
+
+        # the years of a symbol are the partitions it adds
+        years = Counter(partitions.column("symbol").to_pylist())
+        group, group_partitions = [], 0
+        for symbol, count in years.items():
+            if group and group_partitions + count > max_partitions:
+                yield table.filter(pc.is_in(table.column("symbol"), pa.array(group)))
+                group, group_partitions = [], 0
+            group.append(symbol)
+            group_partitions += count
+        yield table.filter(pc.is_in(table.column("symbol"), pa.array(group)))
+
+    def close(self):
+        """
+        Adds the row groups written by this writer to the dataset's _metadata file.
+        """
+        if not self._metadata_collector:
+            return
+
+        if os.path.exists(self.metadata_path):
+            metadata = pq.read_metadata(self.metadata_path)
+            for file_metadata in self._metadata_collector:
+                metadata.append_row_groups(file_metadata)
+            tmp_path = f"{self.metadata_path}.tmp"
+            metadata.write_metadata_file(tmp_path)
+            os.replace(tmp_path, self.metadata_path)
+        else:
+            pq.write_metadata(
+                self.schema,
+                self.metadata_path,
+                metadata_collector=self._metadata_collector,
+            )
+            pq.write_metadata(
+                self.schema, os.path.join(self.root_path, "_common_metadata")
+            )
+
+        self._metadata_collector = []
+
+    def abort(self):
+        # remove the files of this run so the next run does not store their bars twice
+        for file_metadata in self._metadata_collector:
+            file_path = file_metadata.row_group(0).column(0).file_path
+            os.remove(os.path.join(self.root_path, file_path))
+        self._metadata_collector = []
+
+    @staticmethod
+    def dataset(root_path) -> ds.Dataset:
+        """
+        Opens the dataset, from its _metadata file when there is one.
+
+        Args:
+            root_path (str): The directory of the dataset.
+
+        Returns:
+            ds.Dataset: The dataset with symbol and year as partition fields.
+        """
+        metadata_path = os.path.join(root_path, "_metadata")
+        if os.path.exists(metadata_path):
+            return ds.parquet_dataset(metadata_path, partitioning="hive")
+        return ds.dataset(root_path, format="parquet", partitioning="hive")
+
+    @staticmethod
+    def read_symbol(root_path, symbol, columns=None, start=None, end=None) -> pa.Table:
+        """
+        Reads the bars of one symbol, only opening the partitions that hold them.
+
+        Args:
+            root_path (str): The directory of the dataset.
+            symbol (str): The symbol to read.
+            columns (List[str], optional): The columns to read. Defaults to all columns.
+            start (datetime, optional): Only read bars from this time on.
+            end (datetime, optional): Only read bars up to this time.
+
+        Returns:
+            pa.Table: The bars of the symbol sorted by timestamp.
+        """
+        expression = ds.field("symbol") == symbol
+        if start is not None:
+            expression &= ds.field("year") >= start.year
+            expression &= ds.field("timestamp") >= pa.scalar(
+                start, pa.timestamp("ns", tz="UTC")
+            )
+        if end is not None:
+            expression &= ds.field("year") <= end.year
+            expression &= ds.field("timestamp") <= pa.scalar(
+                end, pa.timestamp("ns", tz="UTC")
+            )
+
+        table = HistoricalDatasetWriter.dataset(root_path).to_table(
+            columns=columns, filter=expression
+        )
+        if "timestamp" in table.column_names:
+            table = table.sort_by("timestamp")
+        return table
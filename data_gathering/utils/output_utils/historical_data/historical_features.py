@@ -0,0 +1,168 @@
+import os
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .historical_dataset_writer import HistoricalDatasetWriter
+
+# the bar columns the features are computed from
+INPUT_COLUMNS = ["symbol", "timestamp", "open", "high", "low", "close", "volume"]
+
+FEATURE_COLUMNS = [
+    "log_return",
+    "realized_volatility",
+    "atr",
+    "parkinson_volatility",
+    "garman_klass_volatility",
+    "volume_zscore",
+]
+
+
+class HistoricalFeatures:
+    """
+    Computes volatility and volume features of every symbol from the stored daily bars,
+    without any further requests.
+
+    The bars of all symbols are sorted into one contiguous array per column, symbol by
+    symbol, and every rolling window runs once over the whole array. Windows that reach
+    back into the previous symbol are masked, so the result equals a rolling window per
+    symbol without a Python loop over the symbols.
+    """
+
+    @staticmethod
+    def load_bars(source: Union[str, pa.Table]) -> pa.Table:
+        """
+        Reads the columns the features need from a parquet file, a partitioned
+        dataset directory or a table of bars.
+        """
+        if isinstance(source, pa.Table):
+            return source.select(INPUT_COLUMNS)
+        if os.path.isdir(source):
+            return HistoricalDatasetWriter.dataset(source).to_table(
+                columns=INPUT_COLUMNS
+            )
+        return pq.read_table(source, columns=INPUT_COLUMNS)
+
+    @staticmethod
+    def rolling(
+        values: np.ndarray, position: np.ndarray, window: int, stat: str = "mean"
+    ) -> np.ndarray:
+        # a rolling mean or std over the whole array, minus the windows that start
+        # in the symbol before
+        rolling = getattr(pd.Series(values).rolling(window, min_periods=window), stat)
+        result = rolling().to_numpy(copy=True)
+        result[position < window - 1] = np.nan
+        return result
+
+    @staticmethod
+    def compute(
+        source: Union[str, pa.Table], window: int = 20, periods_per_year: int = 252
+    ) -> pd.DataFrame:
+        """
+        Computes the features of every bar over the window of bars ending with it.
+
+        Features:
+            log_return: ln(close / previous close).
+            realized_volatility: sqrt(periods_per_year * mean(log_return^2)).
+            atr: The mean true range, max(high, previous close) - min(low,
+                previous close).
+            parkinson_volatility: sqrt(periods_per_year * mean(ln(high / low)^2)
+                / (4 ln 2)).
+            garman_klass_volatility: sqrt(periods_per_year * mean(ln(high / low)^2
+                / 2 - (2 ln 2 - 1) ln(close / open)^2)).
+            volume_zscore: (volume - mean(volume)) / std(volume).
+
+        A symbol's features are NaN until it has window bars, window + 1 for the ones
+        built on returns.
+
+        Args:
+            source (Union[str, pa.Table]): Bars as stored by the historical writers, see
+                load_bars.
+            window (int, optional): Bars in each window. Defaults to 20.
+            periods_per_year (int, optional): Bars per year the volatilities are
+                annualized with. Defaults to 252 trading days.
+
+        Returns:
+            pd.DataFrame: The symbol, timestamp and features of every bar, sorted by
+                symbol and timestamp.
+        """
+        bars = HistoricalFeatures.load_bars(source)
+        bars = bars.set_column(
+            0, "symbol", pc.cast(bars.column("symbol"), pa.string())
+        ).sort_by([("symbol", "ascending"), ("timestamp", "ascending")])
+
+        symbol = pc.dictionary_encode(bars.column("symbol")).combine_chunks()
+        codes = symbol.indices.to_numpy()
+        rows = np.arange(len(codes))
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        # the index of every bar within its symbol
+        position = rows - np.maximum.accumulate(np.where(first, rows, 0))
+
+        open_, high, low, close, volume = (
+            bars.column(name).to_numpy().astype(np.float64)
+            for name in ("open", "high", "low", "close", "volume")
+        )
+        previous_close = np.empty_like(close)
+        previous_close[1:] = close[:-1]
+        # the first bar of a symbol has no previous close
+        previous_close[first] = np.nan
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_return = np.log(close / previous_close)
+            true_range = np.fmax(high, previous_close) - np.fmin(low, previous_close)
+            high_low = np.log(high / low) ** 2
+            close_open = np.log(close / open_) ** 2
+
+            rolling = HistoricalFeatures.rolling
+            volume_std = rolling(volume, position, window, "std")
+            features = {
+                "log_return": log_return,
+                # the window of a return is NaN while it reaches the first bar
+                "realized_volatility": np.sqrt(
+                    periods_per_year * rolling(log_return**2, position, window)
+                ),
+                "atr": rolling(true_range, position, window),
+                "parkinson_volatility": np.sqrt(
+                    periods_per_year
+                    * rolling(high_low, position, window)
+                    / (4 * np.log(2))
+                ),
+                # negative for some odd bars, their volatility is NaN
+                "garman_klass_volatility": np.sqrt(
+                    periods_per_year
+                    * rolling(
+                        0.5 * high_low - (2 * np.log(2) - 1) * close_open,
+                        position,
+                        window,
+                    )
+                ),
+                "volume_zscore": np.where(
+                    volume_std > 0,
+                    (volume - rolling(volume, position, window)) / volume_std,
+                    np.nan,
+                ),
+            }
+
+        return pd.DataFrame(
+            {
+                "symbol": pd.Categorical.from_codes(
+                    codes, symbol.dictionary.to_pylist()
+                ),
+                "timestamp": bars.column("timestamp").to_pandas(),
+                **features,
+            }
+        )
+
+    @staticmethod
+    def write(features: pd.DataFrame, path: str, compression: str = "zstd"):
+        # replaces the features of the last run only once the new ones are complete
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        features.to_parquet(tmp_path, index=False, compression=compression)
+        os.replace(tmp_path, path)
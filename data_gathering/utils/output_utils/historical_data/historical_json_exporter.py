@@ -0,0 +1,257 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from typing import Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .historical_dataset_writer import PARTITION_COLUMNS, HistoricalDatasetWriter
+
+FORMATS = ("ndjson", "json")
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+class HistoricalJSONExporter:
+    """
+    Exports stored bars to JSON a group of symbols at a time, so memory stays bounded
+    by max_rows however many symbols there are.
+
+    "ndjson" writes one object per bar and line:
+        {"symbol":"AAPL","timestamp":"2023-01-03T05:00:00Z","open":130.28,...}
+    "json" writes a single object nested by symbol and timestamp:
+        {"AAPL":{"2023-01-03T05:00:00Z":{"open":130.28,...},...},...}
+
+    The rows of each group are serialized by pandas' C JSON writer in one call per
+    group (ndjson) or per symbol (json) instead of a Python object per bar. With more
+    than one group the source is scanned once to file every bar under its group in a
+    temporary dataset next to path, so each group is read from its own files.
+
+    Attributes:
+        path (str): The output file.
+        format (str): "ndjson" or "json".
+        compression (str): "gzip", "zstd", None, or "detect" to pick it from the file
+            extension (.gz, .zst).
+        max_rows (int): The most rows held in memory at once, a symbol with more rows
+            is still exported as a whole.
+    """
+
+    def __init__(
+        self,
+        path,
+        format: str = "ndjson",
+        compression: str = "detect",
+        max_rows: int = 1_000_000,
+    ) -> None:
+        if format not in FORMATS:
+            raise ValueError(f"Unknown JSON format {format!r}, choose from {FORMATS}")
+        self.path = path
+        self.format = format
+        self.compression = compression
+        self.max_rows = max_rows
+        self.rows_written = 0
+
+    def codec(self):
+        if self.compression != "detect":
+            return self.compression
+        # the temporary file's extension hides the codec from arrow's own detection
+        for extension, codec in COMPRESSION_EXTENSIONS.items():
+            if self.path.endswith(extension):
+                return codec
+        return None
+
+    @staticmethod
+    def open_source(source: Union[str, pa.Table]) -> ds.Dataset:
+        # a parquet file, a partitioned dataset directory or bars already in memory
+        if isinstance(source, pa.Table):
+            return ds.dataset(source)
+        if os.path.isdir(source):
+            return HistoricalDatasetWriter.dataset(source)
+        return ds.dataset(source, format="parquet")
+
+    @staticmethod
+    def symbol_counts(dataset: ds.Dataset) -> Counter:
+        # rows per symbol, counted batch by batch from the symbol column alone
+        counts = Counter()
+        for batch in dataset.to_batches(columns=["symbol"]):
+            symbols = batch.column("symbol")
+            if pa.types.is_dictionary(symbols.type):
+                index_counts = np.bincount(
+                    symbols.indices.to_numpy(zero_copy_only=False),
+                    minlength=len(symbols.dictionary),
+                )
+                for symbol, count in zip(
+                    symbols.dictionary.to_pylist(), index_counts.tolist()
+                ):
+                    if count:
+                        counts[symbol] += count
+            else:
+                value_counts = pc.value_counts(symbols)
+                counts.update(
+                    dict(
+                        zip(
+                            value_counts.field("values").to_pylist(),
+                            value_counts.field("counts").to_pylist(),
+                        )
+                    )
+                )
+        return counts
+
+    def symbol_groups(self, counts: Counter) -> Iterator[List[str]]:
+        """
+        Yields the symbols in alphabetical order, grouped so each group has at most
+        max_rows rows.
+        """
+        group, group_rows = [], 0
+        for symbol in sorted(counts):
+            if group and group_rows + counts[symbol] > self.max_rows:
+                yield group
+                group, group_rows = [], 0
+            group.append(symbol)
+            group_rows += counts[symbol]
+        if group:
+            yield group
+
+    def iter_groups(self, dataset: ds.Dataset, tmp_dir: str) -> Iterator[pd.DataFrame]:
+        """
+        Yields the bars of each symbol group sorted by symbol and timestamp.
+
+        Args:
+            dataset (ds.Dataset): The bars to export.
+            tmp_dir (str): An empty directory for the bars filed by group.
+        """
+        columns = [
+            name
+            for name in dataset.schema.names
+            if name not in PARTITION_COLUMNS or name == "symbol"
+        ]
+        groups = list(self.symbol_groups(self.symbol_counts(dataset)))
+        if len(groups) <= 1:
+            for _ in groups:
+                yield self.sorted_frame(dataset.to_table(columns=columns))
+            return
+
+        buckets = self.bucket_by_group(dataset, columns, groups, tmp_dir)
+        for index in range(len(groups)):
+            # the filter only matches the group's own directory
+            table = buckets.to_table(columns=columns, filter=ds.field("group") == index)
+            yield self.sorted_frame(table)
+
+    @staticmethod
+    def bucket_by_group(
+        dataset: ds.Dataset, columns: List[str], groups: List[List[str]], path: str
+    ) -> ds.Dataset:
+        # one scan of the source writes every bar to the partition of its group
+        symbols = pa.array([symbol for group in groups for symbol in group])
+        group_ids = pa.array(
+            [index for index, group in enumerate(groups) for _ in group], pa.int32()
+        )
+        schema = pa.schema([dataset.schema.field(name) for name in columns])
+        schema = schema.append(pa.field("group", pa.int32()))
+
+        def batches():
+            for batch in dataset.to_batches(columns=columns):
+                positions = pc.index_in(
+                    batch.column("symbol").cast(pa.string()), value_set=symbols
+                )
+                yield batch.append_column("group", pc.take(group_ids, positions))
+
+        partitioning = ds.partitioning(
+            pa.schema([("group", pa.int32())]), flavor="hive"
+        )
+        ds.write_dataset(
+            pa.RecordBatchReader.from_batches(schema, batches()),
+            path,
+            format="parquet",
+            partitioning=partitioning,
+            max_partitions=len(groups),
+        )
+        return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+    @staticmethod
+    def sorted_frame(table: pa.Table) -> pd.DataFrame:
+        # arrow cannot sort dictionary columns, the strings of one group are cheap
+        table = table.set_column(
+            table.schema.get_field_index("symbol"),
+            "symbol",
+            table.column("symbol").cast(pa.string()),
+        )
+        table = table.sort_by([("symbol", "ascending"), ("timestamp", "ascending")])
+        return table.to_pandas()
+
+    def export(self, source: Union[str, pa.Table]) -> int:
+        """
+        Writes the bars of a parquet file, dataset directory or table to path.
+
+        The file is written next to path and moved into place once complete.
+
+        Returns:
+            int: The number of bars written.
+        """
+        dataset = self.open_source(source)
+        if directory := os.path.dirname(self.path):
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        self.rows_written = 0
+        # the bars filed by group sit next to the output until the export is done
+        groups_dir = tempfile.mkdtemp(
+            prefix=".groups-", dir=os.path.dirname(os.path.abspath(self.path))
+        )
+        try:
+            with pa.output_stream(tmp_path, compression=self.codec()) as stream:
+                if self.format == "json":
+                    stream.write(b"{")
+                first_symbol = True
+                for df in self.iter_groups(dataset, groups_dir):
+                    if self.format == "ndjson":
+                        stream.write(self.to_ndjson(df))
+                    else:
+                        for chunk in self.to_nested_json(df, first_symbol):
+                            stream.write(chunk)
+                            # an empty group writes nothing and needs no separator
+                            first_symbol = False
+                    self.rows_written += len(df)
+                if self.format == "json":
+                    stream.write(b"}")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            shutil.rmtree(groups_dir, ignore_errors=True)
+
+        os.replace(tmp_path, self.path)
+        return self.rows_written
+
+    @staticmethod
+    def to_ndjson(df: pd.DataFrame) -> bytes:
+        if df.empty:
+            return b""
+        text = df.to_json(
+            orient="records", lines=True, date_format="iso", date_unit="s"
+        )
+        return text.encode() if text.endswith("\n") else f"{text}\n".encode()
+
+    @staticmethod
+    def to_nested_json(df: pd.DataFrame, first_symbol: bool) -> Iterator[bytes]:
+        # the rows of a symbol are contiguous after sorting, so slice at the boundaries
+        symbols = df["symbol"].to_numpy()
+        values = df.drop(columns="symbol").set_index("timestamp")
+        boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(df)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if start == end:
+                continue
+            separator = "" if first_symbol else ","
+            first_symbol = False
+            symbol_json = values.iloc[start:end].to_json(
+                orient="index", date_format="iso", date_unit="s"
+            )
+            yield f"{separator}{json.dumps(symbols[start])}:{symbol_json}".encode()
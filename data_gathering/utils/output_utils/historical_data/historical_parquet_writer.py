@@ -0,0 +1,82 @@
+import os
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class HistoricalParquetWriter:
+    """
+    Writes bars to a parquet file one row group at a time while fetching is still going on.
+
+    The file is written next to its destination and only replaces it when closed, so an
+    interrupted run never leaves a truncated file behind.
+
+    Attributes:
+        path (str): The parquet file that is written.
+        append (bool): Whether the row groups already stored in path are kept.
+        compression (str): The parquet compression codec.
+        rows_written (int): The number of new rows written so far.
+    """
+
+    def __init__(self, path, append=False, compression="zstd") -> None:
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.append = append
+        self.compression = compression
+        self.rows_written = 0
+        self.schema: Optional[pa.Schema] = None
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, table: pa.Table):
+        """
+        Writes a table of bars as a row group, opening the file on the first call.
+
+        Args:
+            table (pa.Table): Bars with the schema of BarBuffer.to_arrow.
+        """
+        if not table.num_rows:
+            return
+
+        if self._writer is None:
+            self._open(table.schema)
+
+        self._writer.write_table(table.cast(self.schema))
+        self.rows_written += table.num_rows
+
+    def _open(self, schema: pa.Schema):
+        if directory := os.path.dirname(self.path):
+            os.makedirs(directory, exist_ok=True)
+
+        self.schema = schema
+        self._writer = pq.ParquetWriter(
+            self.tmp_path, schema, compression=self.compression
+        )
+
+        if self.append and os.path.exists(self.path):
+            self._copy_existing()
+
+    def _copy_existing(self):
+        # stream the stored bars over batch by batch so they never sit in memory at once
+        existing_file = pq.ParquetFile(self.path)
+        for batch in existing_file.iter_batches():
+            table = pa.Table.from_batches([batch]).select(self.schema.names)
+            self._writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        """
+        Finishes the file and moves it into place. Does nothing if nothing was written.
+        """
+        if self._writer is None:
+            return
+
+        self._writer.close()
+        self._writer = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        # drop the partial file, the stored file is left untouched
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.remove(self.tmp_path)
@@ -0,0 +1,120 @@
+import os
+import shutil
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .historical_parquet_writer import HistoricalParquetWriter
+
+
+class HistoricalShardMerger:
+    """
+    Merges the bars the shards of a run wrote into one parquet file and one dataset.
+
+    The shards fetch disjoint sets of symbols and each one keeps its complete history,
+    so the merged output is rebuilt from the shards every time and replaces the old one
+    only once it is complete.
+    """
+
+    @staticmethod
+    def merge_parquet(shard_paths: List[str], path: str) -> int:
+        """
+        Copies the row groups of the shards' parquet files into one file.
+
+        Args:
+            shard_paths (List[str]): The parquet files of the shards, missing files are
+                skipped.
+            path (str): The merged file.
+
+        Returns:
+            int: The number of bars in the merged file.
+        """
+        writer = HistoricalParquetWriter(path)
+        try:
+            for shard_path in shard_paths:
+                if not os.path.exists(shard_path):
+                    continue
+                # a row group at a time, so memory does not grow with the shards
+                shard_file = pq.ParquetFile(shard_path)
+                for row_group in range(shard_file.num_row_groups):
+                    writer.write(shard_file.read_row_group(row_group))
+        except BaseException:
+            writer.abort()
+            raise
+
+        writer.close()
+        return writer.rows_written
+
+    @staticmethod
+    def merge_datasets(shard_roots: List[str], root_path: str) -> int:
+        """
+        Links the files of the shards' partitioned datasets into one dataset and
+        combines their _metadata files.
+
+        The symbol partitions of the shards never overlap, so the files keep their
+        paths relative to the dataset root. They are hard linked where the file system
+        allows it and copied otherwise.
+
+        Args:
+            shard_roots (List[str]): The dataset directories of the shards, shards
+                without a _metadata file are skipped.
+            root_path (str): The directory of the merged dataset.
+
+        Returns:
+            int: The number of bars in the merged dataset.
+        """
+        tmp_root = f"{root_path}.tmp"
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        os.makedirs(tmp_root)
+
+        metadata: Optional[pq.FileMetaData] = None
+        schema: Optional[pa.Schema] = None
+        try:
+            for shard_root in shard_roots:
+                metadata_path = os.path.join(shard_root, "_metadata")
+                if not os.path.exists(metadata_path):
+                    continue
+
+                shard_metadata = pq.read_metadata(metadata_path)
+                file_paths = {
+                    shard_metadata.row_group(index).column(0).file_path
+                    for index in range(shard_metadata.num_row_groups)
+                }
+                for file_path in file_paths:
+                    HistoricalShardMerger.link(
+                        os.path.join(shard_root, file_path),
+                        os.path.join(tmp_root, file_path),
+                    )
+
+                if metadata is None:
+                    metadata = shard_metadata
+                    schema = pq.read_schema(metadata_path)
+                else:
+                    metadata.append_row_groups(shard_metadata)
+
+            if metadata is not None:
+                metadata.write_metadata_file(os.path.join(tmp_root, "_metadata"))
+                pq.write_metadata(schema, os.path.join(tmp_root, "_common_metadata"))
+        except BaseException:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            raise
+
+        # swap the directories, the old dataset is only removed once the new one is
+        # in place
+        old_root = f"{root_path}.old"
+        shutil.rmtree(old_root, ignore_errors=True)
+        if os.path.exists(root_path):
+            os.replace(root_path, old_root)
+        os.replace(tmp_root, root_path)
+        shutil.rmtree(old_root, ignore_errors=True)
+        return metadata.num_rows if metadata is not None else 0
+
+    @staticmethod
+    def link(source: str, destination: str):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            os.link(source, destination)
+        except OSError:
+            # e.g. the shards are on another file system
+            shutil.copy2(source, destination)
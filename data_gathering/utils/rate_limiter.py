@@ -0,0 +1,283 @@
+import asyncio
+import math
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from data_gathering.config.api_keys import APIKeys
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Requests per minute allowed on the plans we use
+DEFAULT_QUOTAS: Dict[str, int] = {
+    "alpaca": 200,
+    "fmp": 300,
+    "finnhub": 60,
+    "alpha_vantage": 5,
+}
+
+# APIKeys attribute that has to be set for a provider to be used
+PROVIDER_API_KEYS: Dict[str, str] = {
+    "alpaca": "apca_key_id",
+    "fmp": "fmp_api_key",
+    "finnhub": "finnhub_api_key",
+    "alpha_vantage": "alpha_vantage_api_key",
+}
+
+
+class TokenBucket:
+    """
+    A token bucket that paces requests to stay just under a provider's quota.
+
+    Attributes:
+        limit (int): The number of requests the provider allows per period.
+        period (float): The length of the quota window in seconds.
+        headroom (float): The fraction of the quota that is left unused as a safety margin.
+        share (float): The fraction of the quota this process may use, e.g. 1/4 for
+            one of four shards sharing an API key.
+        tokens (float): The number of requests that can be sent right away.
+        blocked_until (float): Monotonic time before which no request may be sent.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        period: float = 60.0,
+        headroom: float = 0.05,
+        share: float = 1.0,
+    ):
+        self.period = period
+        self.headroom = headroom
+        self.share = share
+        self.set_limit(limit)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def set_limit(self, limit: int):
+        # the provider reports the whole quota, this process only gets its share
+        self.limit = limit
+        self.capacity = max(1, math.floor(limit * self.share * (1 - self.headroom)))
+
+    @property
+    def rate(self) -> float:
+        # tokens added per second
+        return self.capacity / self.period
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """
+        Returns the number of seconds until the next request may be sent.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> float:
+        """
+        Waits until a request may be sent and takes a token for it.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        # the lock makes waiting requests go out in arrival order
+        async with self._lock:
+            while sleep_time := self.delay():
+                await asyncio.sleep(sleep_time)
+                waited += sleep_time
+            self.tokens -= 1
+        return waited
+
+    def update(
+        self,
+        limit: Optional[int] = None,
+        remaining: Optional[int] = None,
+        reset: Optional[float] = None,
+    ):
+        """
+        Adjusts the bucket to the quota state reported by the provider.
+
+        Args:
+            limit (int, optional): The quota for the current window.
+            remaining (int, optional): The requests left in the current window.
+            reset (float, optional): Unix time at which the current window resets.
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        if limit and limit != self.limit:
+            self.set_limit(limit)
+
+        if remaining is None:
+            return
+
+        # requests still in flight are not counted by the provider yet,
+        # so only ever lower the local estimate
+        reserve = self.limit * self.share - self.capacity
+        self.tokens = min(self.tokens, remaining * self.share - reserve)
+
+        if self.tokens < 1 and reset is not None:
+            self.blocked_until = max(self.blocked_until, now + reset - time.time())
+
+    def block(self, seconds: float):
+        """
+        Stops all requests for the given number of seconds, e.g. after a 429.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimiter:
+    """
+    Keeps a token bucket per provider and adapts them to the rate limit headers.
+
+    Attributes:
+        buckets (Dict[str, TokenBucket]): The token bucket of each provider.
+    """
+
+    def __init__(
+        self,
+        quotas: Optional[Mapping[str, int]] = None,
+        period: float = 60.0,
+        headroom: float = 0.05,
+        share: float = 1.0,
+    ):
+        """
+        Initializes a RateLimiter with a bucket for each provider in quotas.
+
+        Args:
+            quotas (Mapping[str, int], optional): Requests allowed per period for each provider.
+                Defaults to DEFAULT_QUOTAS. An empty mapping starts without buckets, they
+                are then created on first use.
+            period (float, optional): The length of the quota window in seconds. Defaults to 60.
+            headroom (float, optional): The fraction of each quota left unused. Defaults to 0.05.
+            share (float, optional): The fraction of each quota this process may use when
+                several processes share the API keys. Defaults to 1.
+        """
+        self.period = period
+        self.headroom = headroom
+        self.share = share
+        self.buckets: Dict[str, TokenBucket] = {
+            provider: TokenBucket(limit, period, headroom, share)
+            for provider, limit in (
+                DEFAULT_QUOTAS if quotas is None else quotas
+            ).items()
+        }
+
+    @classmethod
+    def from_api_keys(
+        cls, api_keys: APIKeys, quotas: Optional[Mapping[str, int]] = None, **kwargs
+    ) -> "RateLimiter":
+        """
+        Creates a RateLimiter with buckets only for the providers that have an API key.
+        """
+        quotas = {**DEFAULT_QUOTAS, **(quotas or {})}
+        return cls(
+            {
+                provider: limit
+                for provider, limit in quotas.items()
+                if getattr(api_keys, PROVIDER_API_KEYS.get(provider, ""), None)
+            },
+            **kwargs,
+        )
+
+    def bucket(self, provider: str) -> TokenBucket:
+        if provider not in self.buckets:
+            self.buckets[provider] = TokenBucket(
+                DEFAULT_QUOTAS.get(provider, 60), self.period, self.headroom, self.share
+            )
+        return self.buckets[provider]
+
+    async def acquire(self, provider: str) -> float:
+        waited = await self.bucket(provider).acquire()
+        if waited:
+            logger.debug(f"Waited {waited:.2f}s for the {provider} rate limit")
+        return waited
+
+    def update_from_headers(
+        self, provider: str, headers: Mapping[str, str], status: int = 200
+    ) -> Optional[float]:
+        """
+        Updates a provider's bucket from the X-RateLimit-* and Retry-After headers.
+
+        Args:
+            provider (str): The provider that sent the response.
+            headers (Mapping[str, str]): The response headers.
+            status (int, optional): The response status code. Defaults to 200.
+
+        Returns:
+            float: The number of seconds to wait before retrying if the request was
+                rate limited (status 429).
+            None: If the request was not rate limited.
+        """
+        bucket = self.bucket(provider)
+        bucket.update(
+            limit=_parse_int(headers.get("X-RateLimit-Limit")),
+            remaining=_parse_int(headers.get("X-RateLimit-Remaining")),
+            reset=_parse_float(headers.get("X-RateLimit-Reset")),
+        )
+
+        if status != 429:
+            return None
+
+        retry_after = _parse_retry_after(headers.get("Retry-After"))
+        if retry_after is None:
+            # fall back to the time a single token takes to refill
+            retry_after = bucket.period / bucket.capacity
+        bucket.block(retry_after)
+        logger.warning(f"Rate limited by {provider}, retrying in {retry_after:.2f}s")
+        return retry_after
+
+    def backoff(self, provider: str, attempt: int) -> float:
+        """
+        Holds back a provider's requests after a failed one, e.g. a timeout or a 5xx.
+
+        Args:
+            provider (str): The provider the request failed against.
+            attempt (int): The number of the failed attempt, starting at 0.
+
+        Returns:
+            float: The number of seconds the provider is blocked for.
+        """
+        bucket = self.bucket(provider)
+        # doubles the time a single token takes to refill, up to a whole period
+        delay = min(bucket.period / bucket.capacity * 2**attempt, bucket.period)
+        bucket.block(delay)
+        return delay
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either a number of seconds or an HTTP date
+    if (seconds := _parse_float(value)) is not None:
+        return max(seconds, 0.0)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
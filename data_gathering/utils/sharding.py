@@ -0,0 +1,70 @@
+import copy
+import hashlib
+import os
+
+from data_gathering.config.pipeline_config import PipelineConfig
+
+
+def shard_of(symbol: str, shard_count: int) -> int:
+    """
+    Returns the shard a symbol belongs to.
+
+    The shard is derived from a hash of the symbol that, unlike hash(), is the same
+    in every process and on every machine, so a symbol always lands in the same shard
+    and its incremental state stays with that shard.
+    """
+    digest = hashlib.blake2b(symbol.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def shard_name(shard_index: int, shard_count: int) -> str:
+    return f"shard-{shard_index:03d}-of-{shard_count:03d}"
+
+
+def shard_config(
+    config: PipelineConfig,
+    shard_index: int,
+    shard_count: int,
+    quota_share: float = None,
+) -> PipelineConfig:
+    """
+    Derives the settings of one shard of a run.
+
+    The shard writes its bars and metrics to its own directory under config.shard_dir
+    and keeps its own high water marks and journal in the shared cache directory. The
+    JSON export and the features are left to the merge step, and the fundamentals of
+    the whole universe are only refreshed by shard 0.
+
+    Args:
+        config (PipelineConfig): The settings of the whole run.
+        shard_index (int): The shard, from 0 to shard_count - 1.
+        shard_count (int): The number of shards.
+        quota_share (float, optional): The fraction of the API quota the shard may
+            use. Defaults to an equal share of one set of API keys.
+
+    Returns:
+        PipelineConfig: The settings of the shard.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard {shard_index} is not one of {shard_count} shards")
+
+    shard = copy.copy(config)
+    shard.shard_index = shard_index
+    shard.shard_count = shard_count
+    shard.quota_share = 1 / shard_count if quota_share is None else quota_share
+
+    directory = os.path.join(config.shard_dir, shard_name(shard_index, shard_count))
+    shard.hist_parquet_path = os.path.join(
+        directory, os.path.basename(config.hist_parquet_path)
+    )
+    shard.hist_dataset_path = os.path.join(
+        directory, os.path.basename(config.hist_dataset_path)
+    )
+    shard.metrics_path = os.path.join(directory, os.path.basename(config.metrics_path))
+    shard.hist_json = False
+    shard.features = False
+    shard.fundamentals = config.fundamentals and shard_index == 0
+    if config.transform_workers is None:
+        # the shards of a machine share its cores
+        shard.transform_workers = max(1, (os.cpu_count() or 1) // shard_count)
+    return shard
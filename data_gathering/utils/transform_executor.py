@@ -0,0 +1,69 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+MODES = ("inline", "thread", "process")
+
+
+class TransformExecutor:
+    """
+    Runs the CPU bound transforms, e.g. decoding pages into column buffers, away from
+    the event loop so responses keep being read while they run.
+
+    "process" spreads the transforms over a process pool and scales with the number of
+    cores. The function and its arguments are pickled, so it has to be defined at module
+    level and should return compact results like array based column buffers. "thread"
+    suits work that releases the GIL such as arrow conversions, and "inline" runs the
+    transforms on the event loop.
+
+    Attributes:
+        mode (str): "inline", "thread", "process" or "auto" for a process pool on
+            machines with more than one core.
+        max_workers (int): The size of the pool. Defaults to the executor's default.
+    """
+
+    def __init__(self, mode: str = "auto", max_workers: Optional[int] = None) -> None:
+        if mode == "auto":
+            mode = "process" if (os.cpu_count() or 1) > 1 else "inline"
+        if mode not in MODES:
+            raise ValueError(
+                f"Unknown transform executor {mode!r}, choose from {MODES}"
+            )
+        self.mode = mode
+        self.max_workers = max_workers
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # forking a process with a running event loop and threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="transform"
+                )
+            logger.debug(f"Started a {self.mode} pool for the transforms")
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Runs func(*args) in the pool and waits for the result without blocking the loop.
+        """
+        if self.mode == "inline":
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_pool(), func, *args
+        )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -1,23 +1,133 @@
-import cProfile
+import argparse
 import asyncio
-from data_gathering.data import fetch_all_data
+import cProfile
 
+from data_gathering.config.api_keys import APIKeys
+from data_gathering.config.pipeline_config import PipelineConfig
+from data_gathering.data import fetch_all_data, fetch_all_shards, merge_shards
+from data_gathering.data import run_shard
+from data_gathering.utils.metrics import FORMATS
+from data_gathering.utils.sharding import shard_config
 
-async def main():
-    await fetch_all_data()
 
+def parse_shard(value: str):
+    # "I/N" is shard I of N
+    index, _, count = value.partition("/")
+    return int(index), int(count)
 
-if __name__ == "__main__":
-    # Create a cProfile object
-    profiler = cProfile.Profile()
-    # Enable profiling
-    profiler.enable()
 
-    # Run the main coroutine
-    asyncio.run(main())
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Gathers the data of upcoming earnings."
+    )
+    parser.add_argument(
+        "--metrics",
+        choices=FORMATS,
+        help="record per stage timings, queue depths, bytes and rows and report them",
+    )
+    parser.add_argument("--metrics-path", help="the file of the json/prometheus report")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile_results.prof",
+        help="run under cProfile and dump the stats, to profile_results.prof by default",
+    )
+    parser.add_argument("--max-symbols", type=int)
+    parser.add_argument(
+        "--offline", action="store_true", help="replay the cached responses"
+    )
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="store the responses on disk and reuse the fresh ones, for development",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the last run if it failed, skipping the symbols it stored",
+    )
+    parser.add_argument(
+        "--fundamentals",
+        action="store_true",
+        help="refresh the fundamentals of every company from FMP's bulk endpoints",
+    )
+    parser.add_argument(
+        "--analyst-estimates",
+        action="store_true",
+        help="refresh the analyst estimates of the upcoming earnings that are stale",
+    )
+    parser.add_argument(
+        "--features",
+        action="store_true",
+        help="compute volatility and volume features from the stored bars",
+    )
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument(
+        "--shards",
+        type=int,
+        help="split the symbols into N shards fetched by N processes, then merge them",
+    )
+    sharding.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="only fetch shard I of N, e.g. on one of N machines",
+    )
+    sharding.add_argument(
+        "--merge-shards",
+        type=int,
+        metavar="N",
+        help="merge the output of N shards that already finished",
+    )
+    parser.add_argument(
+        "--api-keys",
+        nargs="+",
+        metavar="FILE",
+        help="config files of the API key sets the shards take turns with",
+    )
+    parser.add_argument(
+        "--quota-share",
+        type=float,
+        help="fraction of the API quota of --shard, defaults to 1/N",
+    )
+    return parser.parse_args()
+
 
-    # Disable profiling
-    profiler.disable()
+async def main(config: PipelineConfig, args: argparse.Namespace):
+    api_keys = [APIKeys.from_config_file(name) for name in args.api_keys or []]
+    if args.shards:
+        await fetch_all_shards(config, args.shards, api_keys or None)
+    elif args.shard:
+        shard = shard_config(config, *args.shard, args.quota_share)
+        await asyncio.to_thread(run_shard, shard, api_keys[0] if api_keys else None)
+    elif args.merge_shards:
+        await asyncio.to_thread(merge_shards, config, args.merge_shards)
+    else:
+        await fetch_all_data(config)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = PipelineConfig(
+        metrics=args.metrics,
+        metrics_path=args.metrics_path,
+        max_symbols=args.max_symbols,
+        offline=args.offline,
+        response_cache=args.response_cache,
+        resume=args.resume,
+        fundamentals=args.fundamentals,
+        analyst_estimates=args.analyst_estimates,
+        features=args.features,
+    )
 
-    # Save profiling results to a file
-    profiler.dump_stats("profile_results.prof")
+    if not args.profile:
+        asyncio.run(main(config, args))
+    else:
+        # the profiler slows every call down, so it only runs when asked for
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            asyncio.run(main(config, args))
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile)